@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+""" file:   bench_backends.py (pydym benchmarks)
+
+    description: Compare the Observations storage backends
+
+    Run as `python benchmarks/bench_backends.py [n_samples] [n_snapshots]`.
+    For each backend we time writing the snapshots, reading them back one at
+    a time, generating the snapshot matrix and running a dynamic
+    decomposition, and report the space used on disk.
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import shutil
+import tempfile
+import time
+import numpy
+
+import pydym
+from pydym.backends import BACKENDS
+
+
+def disk_usage(location):
+    """ Return the number of bytes used by a file or directory
+    """
+    if location is None or not os.path.exists(location):
+        return 0
+    if os.path.isfile(location):
+        return os.path.getsize(location)
+    total = 0
+    for root, _, files in os.walk(location):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+def run_benchmark(backend, snapshots, tempdir):
+    """ Time the common operations for a backend
+
+        :returns: a dictionary of timings in seconds and disk usage in MB
+    """
+    location = None if backend == 'memory' else os.path.join(tempdir, backend)
+    n_samples = len(snapshots[0])
+    results = {}
+
+    tic = time.time()
+    data = pydym.Observations(location, n_samples=n_samples,
+                              scalar_datasets=('pressure',),
+                              backend=backend)
+    for snapshot in snapshots:
+        data.append(snapshot)
+    results['write'] = time.time() - tic
+
+    tic = time.time()
+    for snapshot in data:
+        pass
+    results['read'] = time.time() - tic
+
+    tic = time.time()
+    data.generate_snapshots()
+    results['snapshots'] = time.time() - tic
+
+    tic = time.time()
+    pydym.dynamic_decomposition(data)
+    results['dmd'] = time.time() - tic
+
+    data.close()
+    results['disk (MB)'] = disk_usage(location) / 1e6
+    return results
+
+
+def main(n_samples=20000, n_snapshots=200):
+    """ Run the benchmarks for each backend and print a table of results
+    """
+    rng = numpy.random.RandomState(0)
+    position = rng.uniform(size=(2, n_samples))
+    snapshots = [pydym.Snapshot(position=position,
+                                velocity=rng.normal(size=(2, n_samples)),
+                                pressure=rng.normal(size=n_samples))
+                 for _ in range(n_snapshots)]
+
+    columns = ('write', 'read', 'snapshots', 'dmd', 'disk (MB)')
+    print('{0} samples, {1} snapshots'.format(n_samples, n_snapshots))
+    print('{0:>8} '.format('backend')
+          + ' '.join('{0:>10}'.format(c) for c in columns))
+    tempdir = tempfile.mkdtemp()
+    try:
+        for backend in sorted(BACKENDS.keys()):
+            results = run_benchmark(backend, snapshots, tempdir)
+            print('{0:>8} '.format(backend)
+                  + ' '.join('{0:>10.3f}'.format(results[c])
+                             for c in columns))
+    finally:
+        shutil.rmtree(tempdir)
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+""" file:   bench_import.py (pydym benchmarks)
+
+    description: Time how long it takes to start up pydym
+
+    Run as `python benchmarks/bench_import.py [n_repeats]`. Each statement
+    is run in a fresh interpreter, so this measures the cost a short-lived
+    worker process pays before it can do anything useful. We also report
+    which heavy dependencies each statement pulls in.
+"""
+
+from __future__ import division, print_function
+
+import sys
+import subprocess
+
+STATEMENTS = (
+    ('python', 'pass'),
+    ('numpy', 'import numpy'),
+    ('pydym', 'import pydym'),
+    ('Observations', 'import pydym; pydym.Observations'),
+    ('dynamic_decomposition', 'import pydym; pydym.dynamic_decomposition'),
+    ('plotting', 'import pydym; pydym.plotting'),
+)
+
+HEAVY_MODULES = ('h5py', 'scipy', 'matplotlib')
+
+TEMPLATE = """
+import sys, time
+tic = time.time()
+{0}
+elapsed = time.time() - tic
+print(elapsed, ','.join(m for m in {1!r} if m in sys.modules))
+"""
+
+
+def time_statement(statement, n_repeats=5):
+    """ Run a statement in fresh interpreters and return the best time and
+        the heavy modules it imported
+    """
+    best, modules = None, ''
+    for _ in range(n_repeats):
+        output = subprocess.check_output(
+            [sys.executable, '-c', TEMPLATE.format(statement, HEAVY_MODULES)])
+        elapsed, _, modules = output.decode('utf-8').strip().partition(' ')
+        elapsed = float(elapsed)
+        best = elapsed if best is None else min(best, elapsed)
+    return best, modules
+
+
+def main():
+    n_repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print('{0:<24}{1:>12}  {2}'.format('statement', 'time (ms)',
+                                        'heavy modules loaded'))
+    for name, statement in STATEMENTS:
+        best, modules = time_statement(statement, n_repeats)
+        print('{0:<24}{1:>12.1f}  {2}'.format(name, 1000 * best,
+                                               modules or '-'))
+
+
+if __name__ == '__main__':
+    main()
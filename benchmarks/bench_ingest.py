@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+""" file:   bench_ingest.py (pydym benchmarks)
+
+    description: Time native Gerris ingest with different numbers of workers
+
+    Run as `python benchmarks/bench_ingest.py [n_files] [max_workers]`. We
+    copy one of the test simulation files into a temporary directory n_files
+    times (so every file has the same cell layout, and the resampling matrix
+    is cached after the first one) and process them with
+    GerrisReader(native=True) using 1, 2, 4, ... worker processes, up to
+    max_workers (the number of CPUs by default). Reading the binary files is
+    CPU-bound Python, so the throughput should grow with the number of
+    workers until we run out of CPUs or the writer becomes the bottleneck.
+"""
+
+from __future__ import division, print_function
+
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from pydym.io.gerris import GerrisReader
+
+RESOURCES = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                         'resources')
+
+
+def make_directory(directory, n_files):
+    """ Fill a directory with copies of a test simulation file
+    """
+    source = os.path.join(RESOURCES, 'simulations',
+                          'simulation_00050.000.gfs')
+    for idx in range(n_files):
+        name = 'simulation_{0:09.3f}.gfs'.format(5 * idx)
+        shutil.copy(source, os.path.join(directory, name))
+
+
+def main(n_files=64, max_workers=None):
+    max_workers = max_workers or multiprocessing.cpu_count()
+    tempdir = tempfile.mkdtemp()
+    try:
+        make_directory(tempdir, n_files)
+        reader = GerrisReader(os.path.join(RESOURCES, 'vertices.csv'),
+                              native=True)
+        output_name = os.path.join(tempdir, 'bench.hdf5')
+
+        # Build the resampling matrices first so we only time the reads
+        reader.process_directory(tempdir, output_name=output_name,
+                                 update=True, show_progress=False)
+        print('{0} files, {1} CPUs'.format(n_files,
+                                           multiprocessing.cpu_count()))
+        print('{0:<10}{1:>10}{2:>10}{3:>9}{4:>12}'.format(
+            'workers', 'seconds', 'files/s', 'speedup', 'bottleneck'))
+        baseline, workers = None, 1
+        while workers <= max_workers:
+            tic = time.time()
+            reader.process_directory(tempdir, output_name=output_name,
+                                     update=True, show_progress=False,
+                                     workers=workers)
+            seconds = time.time() - tic
+            baseline = baseline or seconds
+            bottleneck = max(reader.report,
+                             key=lambda name: reader.report[name]['busy'])
+            print('{0:<10}{1:>10.2f}{2:>10.1f}{3:>8.1f}x{4:>12}'.format(
+                workers, seconds, n_files / seconds, baseline / seconds,
+                bottleneck))
+            workers *= 2
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+""" file:   bench_parser.py (pydym benchmarks)
+
+    description: Compare parsers for Gerris OutputLocation files
+
+    Run as `python benchmarks/bench_parser.py [n_rows]`. We write a
+    synthetic Gerris output file with the same columns as the test
+    simulations and time reading it with numpy.loadtxt on every column
+    (the old parser), with the numpy.fromfile parser used for old numpy
+    versions and with pydym.io.gerris.read_output_file.
+"""
+
+from __future__ import division, print_function
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import time
+import numpy
+
+from pydym.io import gerris
+from pydym.io.gerris import read_output_file
+
+HEADER = ('1:t 2:x 3:y 4:z 5:P 6:Pmac 7:U 8:V 9:T_x 10:T_y 11:T_alpha 12:T')
+
+
+def read_with_loadtxt(output_file):
+    """ The old parser - read everything with loadtxt and pick out columns
+    """
+    regex = re.compile(r'.*:(.*)')
+    with open(output_file, 'r') as fhandle:
+        header = [regex.findall(k)[0]
+                  for k in fhandle.readline().split()[1:]]
+        data = numpy.loadtxt(fhandle)
+    data_columns = {h: data[:, header.index(h)] for h in header}
+    return numpy.vstack([data_columns[k]
+                         for k in ('x', 'y', 'U', 'V', 'P', 'T')])
+
+
+def write_output_file(filename, n_rows, seed=42):
+    """ Write a synthetic Gerris output file
+    """
+    rng = numpy.random.RandomState(seed)
+    values = rng.normal(size=(n_rows, 12))
+    values[:, 0] = 15
+    values[:, 3] = 0
+    numpy.savetxt(filename, values, fmt='%g', header=HEADER)
+
+
+def read_with_fromfile(output_file):
+    """ Read with the parser used for numpy versions before 1.23
+    """
+    fast, gerris.FAST_LOADTXT = gerris.FAST_LOADTXT, False
+    try:
+        return read_output_file(output_file)
+    finally:
+        gerris.FAST_LOADTXT = fast
+
+
+def best_of(func, repeats=3):
+    """ Return the best wall time from a few calls to func
+    """
+    times = []
+    for _ in range(repeats):
+        tic = time.time()
+        func()
+        times.append(time.time() - tic)
+    return min(times)
+
+
+def main(n_rows=200000):
+    tempdir = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(tempdir, 'output_15.dat')
+        write_output_file(filename, n_rows)
+        size = os.path.getsize(filename) / 1e6
+        print('{0} rows, {1:.1f} MB'.format(n_rows, size))
+
+        # Check we get the same answer before timing anything
+        snapshot = read_output_file(filename)
+        expected = read_with_loadtxt(filename)
+        assert numpy.allclose(snapshot.velocity, expected[2:4])
+        assert numpy.allclose(snapshot.tracer, expected[5])
+        assert numpy.allclose(read_with_fromfile(filename).pressure,
+                              expected[4])
+
+        results = [
+            ('numpy.loadtxt', best_of(lambda: read_with_loadtxt(filename))),
+            ('numpy.fromfile', best_of(lambda: read_with_fromfile(filename))),
+            ('read_output_file', best_of(lambda: read_output_file(filename)))]
+        baseline = results[0][1]
+        print('{0:<18}{1:>10}{2:>10}{3:>9}'.format(
+            'parser', 'seconds', 'MB/s', 'speedup'))
+        for name, seconds in results:
+            print('{0:<18}{1:>10.3f}{2:>10.1f}{3:>8.1f}x'.format(
+                name, seconds, size / seconds, baseline / seconds))
+    finally:
+        shutil.rmtree(tempdir)
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+""" file:   bench_vertices.py (pydym benchmarks)
+
+    description: Time vertex generation for refined Gerris grids
+
+    Run as `python benchmarks/bench_vertices.py [levels]`. We refine the
+    boxes from the test simulation `levels` times, one level at a time with
+    the old loop-based generator and with pydym.io.gerris.double_resolution,
+    and then generate the corner vertices for the refined boxes.
+"""
+
+from __future__ import division, print_function
+
+import itertools
+import os
+import sys
+import time
+import numpy
+
+from pydym.io import gerris
+
+GFSFILE = os.path.join(os.path.dirname(__file__), os.pardir, 'tests',
+                       'resources', 'simulations', 'chaos-1.0.64.10.gfs')
+
+
+def old_make_vertex_list(boxes, template=None):
+    """ The old vertex generator - a loop over boxes, then a void-view
+        numpy.unique and a structured sort
+    """
+    if template is None:
+        template = numpy.asarray(list(itertools.product([1, -1], [1, -1])),
+                                 dtype=int)
+    vertex_vectors = lambda level: template / float(2 ** (level + 1))
+    vertices = numpy.empty((4 * len(boxes), 3), dtype=float)
+    for idx, box in enumerate(boxes):
+        vertices[(4 * idx):(4 * idx + 4), :2] = \
+            vertex_vectors(level=box[2]) + box[:2]
+        vertices[(4 * idx):(4 * idx + 4), 2] = box[2] + 1
+    temp = numpy.ascontiguousarray(vertices).view(
+        numpy.dtype((numpy.void, vertices.dtype.itemsize * vertices.shape[1])))
+    _, idx = numpy.unique(temp, return_index=True)
+    vertices = vertices[idx]
+    vertices.view(
+        dtype=[('x', float), ('y', float), ('level', float)]
+    ).sort(order=['y', 'x', 'level'], axis=0)
+    return vertices
+
+
+def old_double_resolution(boxes):
+    double_template = \
+        numpy.asarray(list(itertools.product([0.5, -0.5], [0.5, -0.5])))
+    return old_make_vertex_list(boxes, template=double_template)
+
+
+def timed(func, *args):
+    """ Return the result of a call and the time it took
+    """
+    tic = time.time()
+    result = func(*args)
+    return result, time.time() - tic
+
+
+def main(levels=6):
+    boxes = gerris.boxes_from_gfsfile(GFSFILE)
+    boxes[..., 2] = 1
+
+    def old_refine(boxes):
+        for _ in range(levels):
+            boxes = old_double_resolution(boxes)
+        return boxes
+
+    old_boxes, old_refine_time = timed(old_refine, boxes)
+    new_boxes, new_refine_time = timed(gerris.double_resolution, boxes,
+                                       levels)
+    assert numpy.array_equal(old_boxes, new_boxes)
+    old_vertices, old_vertex_time = timed(old_make_vertex_list, new_boxes)
+    new_vertices, new_vertex_time = timed(gerris.make_vertex_list, new_boxes)
+    assert numpy.array_equal(old_vertices, new_vertices)
+
+    print('{0} boxes, {1} vertices'.format(len(new_boxes), len(new_vertices)))
+    print('{0:<20}{1:>10}{2:>10}{3:>9}'.format('step', 'old (s)', 'new (s)',
+                                               'speedup'))
+    for name, old, new in (('refine', old_refine_time, new_refine_time),
+                           ('vertices', old_vertex_time, new_vertex_time)):
+        print('{0:<20}{1:>10.3f}{2:>10.3f}{3:>8.1f}x'.format(
+            name, old, new, old / new))
+
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
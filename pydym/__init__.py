@@ -4,15 +4,46 @@
     date:   Tuesday 24 June, 2014
 
     description: Imports for pydym
+
+    The core classes only need numpy to import. Subpackages (io, plotting,
+    integrate) are imported on first access, and heavy dependencies (h5py,
+    scipy, matplotlib) are only imported when they're actually used, so
+    that `import pydym` stays cheap for short-lived worker processes.
 """
 
+import sys
+from importlib import import_module
+
 from .dynamic_decomposition import dynamic_decomposition
 from .observations import Observations, load
-from .snapshot import Snapshot
-from . import io, plotting, integrate
+from .snapshot import Snapshot, CompactSnapshot
+from .snapshot_matrix import SnapshotMatrix
 
 # Load git autogenerated version - update with setup.py update_version
 from ._version import __version__
 
+# Subpackages which are imported on first access
+_LAZY_SUBPACKAGES = ('io', 'plotting', 'integrate')
+
 __all__ = ["io", "plotting", "integrate", "dynamic_decomposition",
-           "Observations", "Snapshot", "load", "__version__"]
+           "Observations", "Snapshot", "CompactSnapshot", "SnapshotMatrix",
+           "load",
+           "__version__"]
+
+
+def __getattr__(name):
+    if name in _LAZY_SUBPACKAGES:
+        return import_module('.' + name, __name__)
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(
+        __name__, name))
+
+
+def __dir__():
+    return sorted(set(globals().keys()) | set(_LAZY_SUBPACKAGES))
+
+
+# Module-level __getattr__ needs Python 3.7, so just import everything
+# up front on older versions
+if sys.version_info < (3, 7):
+    for _name in _LAZY_SUBPACKAGES:
+        import_module('.' + _name, __name__)
@@ -0,0 +1,51 @@
+""" file:   __init__.py (pydym.backends)
+
+    description: Storage backends for Observations
+"""
+
+from importlib import import_module
+
+from .base import StorageBackend
+from .memory import MemoryBackend
+from .npy import NpyBackend
+
+# Backend classes by name. Backends with heavy dependencies are given as
+# (module, class name) and only imported the first time they're used
+BACKENDS = {
+    'hdf5': ('.hdf5', 'HDF5Backend'),
+    'memory': MemoryBackend,
+    'npy': NpyBackend
+}
+
+
+def get_backend(backend):
+    """ Return the backend class for the given name
+
+        :param backend: The name of the backend (one of 'hdf5', 'memory' or
+            'npy'), or a StorageBackend subclass
+        :type backend: string or StorageBackend subclass
+    """
+    if isinstance(backend, type) and issubclass(backend, StorageBackend):
+        return backend
+    try:
+        backend_class = BACKENDS[backend]
+    except KeyError:
+        raise ValueError("Unknown backend {0}, should be one of {1}".format(
+            backend, ', '.join(sorted(BACKENDS.keys()))))
+    if isinstance(backend_class, tuple):
+        module_name, class_name = backend_class
+        backend_class = BACKENDS[backend] = \
+            getattr(import_module(module_name, __name__), class_name)
+    return backend_class
+
+
+def __getattr__(name):
+    # Importing HDF5Backend pulls in h5py, so only do it when asked
+    if name == 'HDF5Backend':
+        return get_backend('hdf5')
+    raise AttributeError("module {0!r} has no attribute {1!r}".format(
+        __name__, name))
+
+
+__all__ = ["StorageBackend", "HDF5Backend", "MemoryBackend", "NpyBackend",
+           "BACKENDS", "get_backend"]
@@ -0,0 +1,139 @@
+""" file:   base.py (pydym.backends)
+
+    description: Storage backend interface for Observations
+"""
+
+from __future__ import division
+
+
+class StorageBackend(object):
+
+    """ Base class for Observations storage backends
+
+        A backend stores a tree of groups and n-dimensional datasets, and
+        looks like an h5py.File to the rest of pydym. Groups support
+        dictionary-style access using '/'-separated paths (so
+        `backend['velocity/x']` works), `keys`, `items`, `values`,
+        `create_group`, `require_group`, `create_dataset` and
+        `require_dataset`. Datasets support numpy-style slicing for reads and
+        writes, `shape`, `dtype`, `maxshape`, `attrs`, `resize` and
+        `refresh`.
+
+        Subclasses should set `root` to the root group of the store.
+
+        :param location: The file or directory to store the data in
+        :type location: string
+        :param mode: One of 'r' (read-only), 'a' (read/write an existing
+            store) or 'w' (create a new store, removing any existing one)
+        :type mode: string
+        :param swmr: Whether to use single-writer/multiple-reader access.
+        :type swmr: bool
+    """
+
+    #: The name used to select this backend in Observations
+    name = None
+
+    def __init__(self, location, mode='a', swmr=False):
+        super(StorageBackend, self).__init__()
+        if mode not in ('r', 'a', 'w'):
+            raise ValueError("Unknown mode {0}".format(mode))
+        self.location, self.mode, self.swmr = location, mode, swmr
+        self.root = None
+
+    @classmethod
+    def exists(cls, location):
+        """ Return True if there is an existing store at the given location
+        """
+        raise NotImplementedError
+
+    @property
+    def writable(self):
+        """ Whether we can write to the store
+        """
+        return self.mode != 'r'
+
+    @property
+    def is_open(self):
+        """ Whether the store is still open
+        """
+        return self.root is not None
+
+    def is_group(self, obj):
+        """ Return True if obj is a group in this store
+        """
+        raise NotImplementedError
+
+    def is_dataset(self, obj):
+        """ Return True if obj is a dataset in this store
+        """
+        raise NotImplementedError
+
+    def start_swmr(self):
+        """ Switch on SWMR writing once all the groups and datasets have
+            been created. Does nothing unless the backend needs it.
+        """
+        pass
+
+    def flush(self):
+        """ Make sure any data written so far is visible to readers
+        """
+        pass
+
+    def close(self):
+        """ Close the store
+        """
+        self.root = None
+
+    # Everything else is passed through to the root group
+    def __getitem__(self, key):
+        return self.root[key]
+
+    def __setitem__(self, key, value):
+        self.root[key] = value
+
+    def __delitem__(self, key):
+        del self.root[key]
+
+    def __contains__(self, key):
+        return key in self.root
+
+    def __iter__(self):
+        return iter(self.root)
+
+    def __len__(self):
+        return len(self.root)
+
+    def keys(self):
+        """ Return the keys of the top-level groups and datasets
+        """
+        return self.root.keys()
+
+    def items(self):
+        """ Return (key, object) pairs for the top-level groups and datasets
+        """
+        return self.root.items()
+
+    def values(self):
+        """ Return the top-level groups and datasets
+        """
+        return self.root.values()
+
+    def create_group(self, name):
+        """ Create a new group
+        """
+        return self.root.create_group(name)
+
+    def require_group(self, name):
+        """ Return the given group, creating it if it doesn't exist
+        """
+        return self.root.require_group(name)
+
+    def create_dataset(self, name, **kwargs):
+        """ Create a new dataset, arguments are as for h5py
+        """
+        return self.root.create_dataset(name, **kwargs)
+
+    def require_dataset(self, name, **kwargs):
+        """ Return the given dataset, creating it if it doesn't exist
+        """
+        return self.root.require_dataset(name, **kwargs)
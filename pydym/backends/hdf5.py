@@ -0,0 +1,60 @@
+""" file:   hdf5.py (pydym.backends)
+
+    description: HDF5 storage backend using h5py
+"""
+
+from __future__ import division
+
+import os
+import h5py
+
+from .base import StorageBackend
+
+
+class HDF5Backend(StorageBackend):
+
+    """ Store observations in an HDF5 file
+
+        This is the default backend. Datasets are gzip-compressed and
+        chunked, and SWMR access is supported.
+    """
+
+    name = 'hdf5'
+
+    def __init__(self, location, mode='a', swmr=False):
+        super(HDF5Backend, self).__init__(location, mode, swmr)
+        if mode == 'r':
+            self.root = h5py.File(location, 'r', swmr=swmr)
+        elif mode == 'w':
+            if swmr:
+                self.root = h5py.File(location, 'w', libver='latest')
+            else:
+                self.root = h5py.File(location, 'w')
+        elif swmr:
+            self.root = h5py.File(location, 'r+', libver='latest')
+        else:
+            self.root = h5py.File(location, 'a')
+
+    @classmethod
+    def exists(cls, location):
+        return location is not None and os.path.exists(location)
+
+    @property
+    def is_open(self):
+        return self.root is not None and bool(self.root)
+
+    def is_group(self, obj):
+        return isinstance(obj, h5py.Group)
+
+    def is_dataset(self, obj):
+        return isinstance(obj, h5py.Dataset)
+
+    def start_swmr(self):
+        self.root.swmr_mode = True
+
+    def flush(self):
+        self.root.flush()
+
+    def close(self):
+        if self.is_open:
+            self.root.close()
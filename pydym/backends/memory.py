@@ -0,0 +1,206 @@
+""" file:   memory.py (pydym.backends)
+
+    description: In-memory storage backend using numpy arrays
+"""
+
+from __future__ import division
+
+import numpy
+
+from .base import StorageBackend
+
+
+def split_path(path):
+    """ Split a '/'-separated path into its parts, ignoring empty parts
+    """
+    return [p for p in path.split('/') if p]
+
+
+class MemoryDataset(object):
+
+    """ A dataset backed by a numpy array
+
+        Reads return views into the underlying array rather than copies.
+    """
+
+    def __init__(self, name, data):
+        super(MemoryDataset, self).__init__()
+        self.name = name
+        self._data = data
+        self.attrs = {}
+
+    @property
+    def shape(self):
+        return self._data.shape
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def ndim(self):
+        return self._data.ndim
+
+    @property
+    def maxshape(self):
+        return (None,) * self._data.ndim
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self._data
+        return self._data.astype(dtype)
+
+    def resize(self, shape):
+        """ Resize the dataset, keeping any data which overlaps the new
+            shape
+        """
+        shape = tuple(shape)
+        if shape == self.shape:
+            return
+        data = numpy.zeros(shape, dtype=self.dtype, order='F')
+        overlap = tuple(slice(0, min(old, new))
+                        for old, new in zip(self.shape, shape))
+        data[overlap] = self._data[overlap]
+        self._data = data
+
+    def refresh(self):
+        """ Nothing to refresh for in-memory data
+        """
+        pass
+
+
+class MemoryGroup(object):
+
+    """ A group of in-memory datasets and subgroups
+    """
+
+    def __init__(self, name='/'):
+        super(MemoryGroup, self).__init__()
+        self.name = name
+        self.attrs = {}
+        self._children = {}
+
+    def _parent(self, path, create=False):
+        """ Return the group containing the object at path, and the name of
+            the object in that group
+        """
+        parts = split_path(path)
+        group = self
+        for part in parts[:-1]:
+            if part not in group._children:
+                if not create:
+                    raise KeyError("Can't find item {0}".format(path))
+                group.create_group(part)
+            group = group._children[part]
+            if not isinstance(group, MemoryGroup):
+                raise KeyError('{0} is not a group'.format(part))
+        return group, parts[-1]
+
+    def _child_name(self, name):
+        return self.name.rstrip('/') + '/' + name
+
+    def __getitem__(self, path):
+        group, name = self._parent(path)
+        try:
+            return group._children[name]
+        except KeyError:
+            raise KeyError("Can't find item {0}".format(path))
+
+    def __setitem__(self, path, value):
+        self.create_dataset(path, data=value)
+
+    def __delitem__(self, path):
+        group, name = self._parent(path)
+        del group._children[name]
+
+    def __contains__(self, path):
+        try:
+            self[path]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self._children)
+
+    def keys(self):
+        return sorted(self._children.keys())
+
+    def values(self):
+        return [self._children[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self._children[k]) for k in self.keys()]
+
+    def create_group(self, name):
+        group, child = self._parent(name, create=True)
+        if child in group._children:
+            raise ValueError('{0} already exists'.format(name))
+        new = group._children[child] = MemoryGroup(group._child_name(child))
+        return new
+
+    def require_group(self, name):
+        if name in self:
+            return self[name]
+        return self.create_group(name)
+
+    def create_dataset(self, name, shape=None, dtype=None, data=None,
+                       **kwargs):
+        """ Create a new dataset
+
+            Storage options which only make sense for files (chunks,
+            compression etc) are ignored.
+        """
+        group, child = self._parent(name, create=True)
+        if child in group._children:
+            raise ValueError('{0} already exists'.format(name))
+        if data is not None:
+            data = numpy.array(data, dtype=dtype)
+        else:
+            data = numpy.zeros(shape, dtype=dtype or float, order='F')
+        new = group._children[child] = \
+            MemoryDataset(group._child_name(child), data)
+        return new
+
+    def require_dataset(self, name, shape=None, dtype=None, **kwargs):
+        if name in self:
+            return self[name]
+        return self.create_dataset(name, shape=shape, dtype=dtype, **kwargs)
+
+
+class MemoryBackend(StorageBackend):
+
+    """ Store observations in numpy arrays in memory
+
+        Nothing is written to disk, so this is handy for small datasets and
+        tests. Two-dimensional datasets are stored in column-major order so
+        that each snapshot is contiguous in memory.
+    """
+
+    name = 'memory'
+
+    def __init__(self, location=None, mode='a', swmr=False):
+        super(MemoryBackend, self).__init__(location, mode, swmr)
+        self.root = MemoryGroup()
+
+    @classmethod
+    def exists(cls, location):
+        return False
+
+    def is_group(self, obj):
+        return isinstance(obj, MemoryGroup)
+
+    def is_dataset(self, obj):
+        return isinstance(obj, MemoryDataset)
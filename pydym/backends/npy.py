@@ -0,0 +1,398 @@
+""" file:   npy.py (pydym.backends)
+
+    description: Storage backend using a directory of memory-mapped .npy
+        files
+"""
+
+from __future__ import division
+
+import os
+import io
+import json
+import shutil
+import numpy
+from numpy.lib import format as npyformat
+
+from .base import StorageBackend
+from .memory import split_path
+
+NPY_SUFFIX = '.npy'
+ATTRS_SUFFIX = '.attrs.json'
+
+# A file written at the top of every store, so we only ever replace
+# directories that we created
+MARKER = 'pydym-store.json'
+
+
+class JSONAttributes(dict):
+
+    """ A dictionary of attributes which is saved to a JSON file on every
+        update
+    """
+
+    def __init__(self, filename, writable=True):
+        super(JSONAttributes, self).__init__()
+        self.filename, self.writable = filename, writable
+        if os.path.exists(filename):
+            with open(filename) as fhandle:
+                self.update(json.load(fhandle))
+
+    def __setitem__(self, key, value):
+        if not self.writable:
+            raise IOError("Can't set attributes, store is read-only")
+        if isinstance(value, numpy.ndarray):
+            value = value.tolist()
+        elif isinstance(value, numpy.generic):
+            value = value.item()
+        super(JSONAttributes, self).__setitem__(key, value)
+        with open(self.filename, 'w') as fhandle:
+            json.dump(dict(self), fhandle)
+
+
+def _read_header(fhandle):
+    """ Read the header from an open .npy file
+
+        :returns: shape, fortran_order, dtype and the offset to the start of
+            the data
+    """
+    version = npyformat.read_magic(fhandle)
+    if version == (1, 0):
+        shape, fortran_order, dtype = npyformat.read_array_header_1_0(fhandle)
+    else:
+        shape, fortran_order, dtype = npyformat.read_array_header_2_0(fhandle)
+    return shape, fortran_order, dtype, fhandle.tell()
+
+
+def _header_bytes(shape, fortran_order, dtype):
+    """ Return the bytes for a .npy header with the given properties
+    """
+    header = {'descr': npyformat.dtype_to_descr(dtype),
+              'fortran_order': fortran_order,
+              'shape': tuple(shape)}
+    buf = io.BytesIO()
+    try:
+        npyformat.write_array_header_1_0(buf, header)
+    except ValueError:
+        buf = io.BytesIO()
+        npyformat.write_array_header_2_0(buf, header)
+    return buf.getvalue()
+
+
+class NpyDataset(object):
+
+    """ A dataset stored in a memory-mapped .npy file
+
+        Two-dimensional datasets are stored in column-major (Fortran) order,
+        so that each snapshot is contiguous on disk, adding snapshots just
+        extends the file, and the mapped arrays can be passed straight to
+        LAPACK without copying.
+    """
+
+    def __init__(self, filename, writable=True):
+        super(NpyDataset, self).__init__()
+        self.filename, self.writable = filename, writable
+        self.name = filename
+        self.attrs = JSONAttributes(filename[:-len(NPY_SUFFIX)] + ATTRS_SUFFIX,
+                                    writable)
+        self._data = None
+        self.refresh()
+
+    @classmethod
+    def create(cls, filename, shape, dtype=float):
+        """ Create a new (zeroed) dataset with the given shape
+        """
+        shape = tuple(shape)
+        npyformat.open_memmap(filename, mode='w+', dtype=dtype, shape=shape,
+                              fortran_order=len(shape) > 1)
+        return cls(filename)
+
+    @classmethod
+    def from_data(cls, filename, data):
+        """ Create a new dataset from some data
+        """
+        data = numpy.asarray(data)
+        if data.ndim > 1:
+            data = numpy.asfortranarray(data)
+        numpy.save(filename, data, allow_pickle=False)
+        return cls(filename)
+
+    def refresh(self):
+        """ Remap the file, picking up any changes in shape made by other
+            processes
+        """
+        mode = 'r+' if self.writable else 'r'
+        self._data = numpy.load(self.filename, mmap_mode=mode)
+
+    @property
+    def shape(self):
+        return self._data.shape
+
+    @property
+    def dtype(self):
+        return self._data.dtype
+
+    @property
+    def ndim(self):
+        return self._data.ndim
+
+    @property
+    def maxshape(self):
+        return (None,) * self._data.ndim
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __array__(self, dtype=None, copy=None):
+        if dtype is None:
+            return self._data
+        return self._data.astype(dtype)
+
+    def flush(self):
+        """ Flush changes to disk
+        """
+        if isinstance(self._data, numpy.memmap):
+            self._data.flush()
+
+    def resize(self, shape):
+        """ Resize the dataset, keeping any data which overlaps the new
+            shape
+
+            Growing along the slowest-varying axis (the last axis for
+            two-dimensional datasets) just rewrites the header and extends
+            the file in place. Anything else (including shrinking, so that
+            existing memory maps of the file stay valid) copies the data to
+            a new file.
+        """
+        shape = tuple(shape)
+        if shape == self.shape:
+            return
+        if not self.writable:
+            raise IOError("Can't resize {0}, store is read-only".format(
+                self.filename))
+        self.flush()
+        self._data = None
+        if not self._grow_in_place(shape):
+            self._resize_by_copy(shape)
+        self.refresh()
+
+    def _grow_in_place(self, shape):
+        """ Try to grow the dataset by rewriting the header and extending the
+            file
+
+            :returns: True if the dataset was resized, False otherwise
+        """
+        with open(self.filename, 'r+b') as fhandle:
+            old_shape, fortran_order, dtype, offset = _read_header(fhandle)
+            if len(old_shape) != len(shape) or len(shape) == 0:
+                return False
+            grow_axis = len(shape) - 1 if fortran_order else 0
+            for axis, (old, new) in enumerate(zip(old_shape, shape)):
+                if (axis == grow_axis and new < old) \
+                        or (axis != grow_axis and new != old):
+                    return False
+            header = _header_bytes(shape, fortran_order, dtype)
+            if len(header) != offset:
+                return False
+            fhandle.seek(0)
+            fhandle.write(header)
+            fhandle.truncate(offset + int(numpy.prod(shape)) * dtype.itemsize)
+        return True
+
+    def _resize_by_copy(self, shape):
+        """ Resize by copying the data into a new file
+        """
+        old = numpy.load(self.filename, mmap_mode='r')
+        tmpname = self.filename + '.resize'
+        new = npyformat.open_memmap(tmpname, mode='w+', dtype=old.dtype,
+                                    shape=shape,
+                                    fortran_order=len(shape) > 1)
+        overlap = tuple(slice(0, min(a, b)) for a, b in zip(old.shape, shape))
+        new[overlap] = old[overlap]
+        new.flush()
+        del old, new
+        os.rename(tmpname, self.filename)
+
+
+class NpyGroup(object):
+
+    """ A group of .npy datasets, stored as a directory
+    """
+
+    def __init__(self, directory, name='/', writable=True, datasets=None):
+        super(NpyGroup, self).__init__()
+        self.directory, self.name = directory, name
+        self.writable = writable
+        self.attrs = JSONAttributes(os.path.join(directory, ATTRS_SUFFIX),
+                                    writable)
+
+        # Open datasets are shared across all the groups in a store so that
+        # everyone sees the same mapping after a resize
+        self._datasets = datasets if datasets is not None else {}
+
+    def _resolve(self, path):
+        """ Return the filesystem path for the object at path, and whether it
+            is a group
+        """
+        location = os.path.join(self.directory, *split_path(path))
+        if os.path.isdir(location):
+            return location, True
+        elif os.path.exists(location + NPY_SUFFIX):
+            return location + NPY_SUFFIX, False
+        raise KeyError("Can't find item {0}".format(path))
+
+    def _check_writable(self):
+        if not self.writable:
+            raise IOError("Can't modify {0}, store is read-only".format(
+                self.directory))
+
+    def __getitem__(self, path):
+        location, is_group = self._resolve(path)
+        name = self.name.rstrip('/') + '/' + '/'.join(split_path(path))
+        if is_group:
+            return NpyGroup(location, name, self.writable, self._datasets)
+        if location not in self._datasets:
+            self._datasets[location] = NpyDataset(location, self.writable)
+        return self._datasets[location]
+
+    def __setitem__(self, path, value):
+        self.create_dataset(path, data=value)
+
+    def __delitem__(self, path):
+        self._check_writable()
+        location, is_group = self._resolve(path)
+        if is_group:
+            for key in [k for k in self._datasets
+                        if k.startswith(location + os.sep)]:
+                del self._datasets[key]
+            shutil.rmtree(location)
+        else:
+            self._datasets.pop(location, None)
+            os.remove(location)
+            attrs = location[:-len(NPY_SUFFIX)] + ATTRS_SUFFIX
+            if os.path.exists(attrs):
+                os.remove(attrs)
+
+    def __contains__(self, path):
+        try:
+            self._resolve(path)
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        keys = []
+        for name in os.listdir(self.directory):
+            if os.path.isdir(os.path.join(self.directory, name)):
+                keys.append(name)
+            elif name.endswith(NPY_SUFFIX):
+                keys.append(name[:-len(NPY_SUFFIX)])
+        return sorted(keys)
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def create_group(self, name):
+        self._check_writable()
+        location = os.path.join(self.directory, *split_path(name))
+        if os.path.exists(location) or os.path.exists(location + NPY_SUFFIX):
+            raise ValueError('{0} already exists'.format(name))
+        os.makedirs(location)
+        return self[name]
+
+    def require_group(self, name):
+        if name in self:
+            return self[name]
+        return self.create_group(name)
+
+    def create_dataset(self, name, shape=None, dtype=None, data=None,
+                       **kwargs):
+        """ Create a new dataset
+
+            Storage options which only make sense for HDF5 (chunks,
+            compression etc) are ignored.
+        """
+        self._check_writable()
+        parts = split_path(name)
+        if name in self:
+            raise ValueError('{0} already exists'.format(name))
+        if len(parts) > 1:
+            self.require_group('/'.join(parts[:-1]))
+        location = os.path.join(self.directory, *parts) + NPY_SUFFIX
+        if data is not None:
+            dset = NpyDataset.from_data(location,
+                                        numpy.asarray(data, dtype=dtype))
+        else:
+            dset = NpyDataset.create(location, shape, dtype or float)
+        self._datasets[location] = dset
+        return dset
+
+    def require_dataset(self, name, shape=None, dtype=None, **kwargs):
+        if name in self:
+            return self[name]
+        return self.create_dataset(name, shape=shape, dtype=dtype, **kwargs)
+
+
+class NpyBackend(StorageBackend):
+
+    """ Store observations in a directory of raw .npy files
+
+        Groups are subdirectories, datasets are .npy files which are
+        memory-mapped on access, and attributes are kept in JSON sidecar
+        files. Data is stored uncompressed, so reads are zero-copy.
+
+        Stores are marked with a small JSON file at the top of the
+        directory. Creating a store ('w' mode) only replaces an existing
+        directory if it has this marker (or is empty), so pointing
+        Observations at the wrong directory raises an IOError rather than
+        deleting it.
+    """
+
+    name = 'npy'
+
+    def __init__(self, location, mode='a', swmr=False):
+        super(NpyBackend, self).__init__(location, mode, swmr)
+        if mode == 'w':
+            if self.exists(location):
+                shutil.rmtree(location)
+            elif os.path.exists(location) and not (
+                    os.path.isdir(location) and not os.listdir(location)):
+                raise IOError("{0} exists and isn't a pydym npy store, "
+                              "refusing to replace it".format(location))
+            if not os.path.isdir(location):
+                os.makedirs(location)
+            with open(os.path.join(location, MARKER), 'w') as fhandle:
+                json.dump({'format': 'pydym.npy', 'version': 1}, fhandle)
+        elif not self.exists(location):
+            raise IOError("Can't find a pydym npy store at {0}".format(
+                location))
+        self.root = NpyGroup(location, writable=self.writable)
+
+    @classmethod
+    def exists(cls, location):
+        return location is not None \
+            and os.path.isfile(os.path.join(location, MARKER))
+
+    def is_group(self, obj):
+        return isinstance(obj, NpyGroup)
+
+    def is_dataset(self, obj):
+        return isinstance(obj, NpyDataset)
+
+    def flush(self):
+        for dset in self.root._datasets.values():
+            dset.flush()
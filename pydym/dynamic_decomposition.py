@@ -9,10 +9,34 @@
 from __future__ import division, print_function
 
 import numpy
-from scipy import linalg
 from numpy.linalg import matrix_rank
 
 from .utilities import foldr, herm_transpose
+from .snapshot_matrix import SnapshotMatrix
+from .pod import shift_factors
+
+
+def time_step(times, rtol=1e-6):
+    """ Return the time between evenly spaced snapshots
+
+        :param times: The snapshot times
+        :type times: array
+        :param rtol: The relative tolerance for checking the spacing
+        :type rtol: float
+        :returns: the time step, or None if there are fewer than two times
+        :raises ValueError: if the times aren't evenly spaced
+    """
+    steps = numpy.diff(numpy.asarray(times, dtype=float))
+    if len(steps) == 0:
+        return None
+    step = steps.mean()
+    if step <= 0 or not numpy.allclose(steps, step, rtol=rtol, atol=0):
+        raise ValueError('Snapshots are not evenly spaced in time (steps '
+                         'range from {0} to {1}), select a window with even '
+                         'spacing or resample the data'.format(
+                             steps.min(), steps.max()))
+    return step
+
 
 class dynamic_decomposition(object):
 
@@ -34,13 +58,40 @@ class dynamic_decomposition(object):
             J(x) = tr(x) . P . x - tr(q) . x - tr(x) . q + s
 
         (Jovanovic Eqn 6) which has solution x = P^{-1} q.
+
+        Parameters:
+            data - an Observations instance, or a SnapshotMatrix (e.g.
+                `data.snapshots.select(...)`)
+            burn - the number of snapshots to skip at the start. Optional,
+                defaults to 0.
+            stop - the snapshot to stop before. Optional, defaults to using
+                all the snapshots.
+            stride - use every `stride`th snapshot. Optional, defaults to 1.
+            dt - the time between snapshots. Optional, by default this is
+                worked out from the snapshot times if data is an Observations
+                instance, otherwise it's 1 (so frequencies are in cycles per
+                snapshot).
+
+        The snapshot selection is lazy, so trying different windows or
+        thinning factors doesn't copy the snapshot matrix.
+
+        DMD assumes the snapshots are evenly spaced in time, so a ValueError
+        is raised if the selected snapshot times aren't.
     """
 
-    def __init__(self, data, burn=None):
+    def __init__(self, data, burn=None, stop=None, stride=None, dt=None):
         # Sort out inputs
         super(dynamic_decomposition, self).__init__()
         self.data = data
         self.burn = burn or 0
+        if isinstance(data, SnapshotMatrix):
+            snapshots, times = data, None
+        else:
+            snapshots, times = data.snapshots, data.times
+        self.snapshots = snapshots.select(self.burn, stop, stride)
+        if dt is None and times is not None:
+            dt = time_step(times[self.burn:stop:stride])
+        self.dt = 1 if dt is None else dt
 
         # Set up initial dynamic mode decomposition
         self.pod_modes = None
@@ -57,29 +108,56 @@ class dynamic_decomposition(object):
         self.n_nonzero, self.pre_polish_norm = None, None
         self.polished_amplitudes, self.residual, self.performance_loss = None, None, None
 
+    @property
+    def frequencies(self):
+        """ The frequency of each dynamic mode, in cycles per unit time
+        """
+        return numpy.angle(self.eigenvalues) / (2 * numpy.pi * self.dt)
+
+    @property
+    def growth_rates(self):
+        """ The growth rate of each dynamic mode, per unit time
+
+            Negative values mean the mode decays.
+        """
+        return numpy.log(numpy.abs(self.eigenvalues)) / self.dt
+
     def decompose(self):
         """ Decompose the data into a Dynamic Mode Decomposition
         """
         # pylint: disable=C0103, R0914
-        # Subdivide the time sequence into the past and current states
-        past = self.data.snapshots[:, self.burn:-1]
-        current = self.data.snapshots[:, (self.burn + 1):]
-
-        # Calculate SVD 'pod modes' of past data array
-        U, sigma, Vstar = linalg.svd(past, full_matrices=False)
-        V = herm_transpose(Vstar)
+        # scipy is slow to import, so only do it when we need to
+        from scipy import linalg
+
+        factors = self.snapshots.factors()
+        if factors is None:
+            # Subdivide the time sequence into the past and current states.
+            # We only read the snapshots once, past and current are views
+            snapshots = self.snapshots[:, :]
+            past, current = snapshots[:, :-1], snapshots[:, 1:]
+
+            # Calculate SVD 'pod modes' of past data array, and project the
+            # current data onto them
+            U, sigma, Vstar = linalg.svd(past, full_matrices=False)
+            V = herm_transpose(Vstar)
+            projected = numpy.dot(herm_transpose(U), current)
+        else:
+            # The snapshots are stored as POD factors already, so we can get
+            # everything we need from those without redoing the SVD
+            U, sigma, V, projected = shift_factors(*factors)
+            Vstar = herm_transpose(V)
         self.pod_modes = (U, sigma, V)
 
         ## Calculate approximate dynamic array given current data
         # and calculate eigendecomposition
-        Fdmd = foldr(numpy.dot, (herm_transpose(U), current, V, numpy.diag(1 / sigma)))
+        Fdmd = foldr(numpy.dot, (projected, V, numpy.diag(1 / sigma)))
         rank = matrix_rank(Fdmd)
         self.eigenvalues, self.eigenvectors = linalg.eig(Fdmd)
 
         # Construct Vandermonde matrix from eigenvalue
         n_snapshots = Vstar.shape[1]
         eigvals_r = self.eigenvalues.reshape(rank, 1)
-        vandermonde = numpy.hstack((eigvals_r ** n for n in range(n_snapshots)))
+        vandermonde = numpy.hstack([eigvals_r ** n for n in range(n_snapshots)])
 
         ## Compute mode weightings
         # Construct matrices
@@ -114,6 +192,8 @@ class dynamic_decomposition(object):
                 relative_tol - relative tolerance
         """
         # pylint: disable=C0103, R0914
+        from scipy import linalg
+
         # Pull out relevant bits
         P, q, s = self._mode_weight_data
         alpha = self.amplitudes
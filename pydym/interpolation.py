@@ -0,0 +1,289 @@
+""" file:   interpolation.py (pydym)
+
+    description: Sparse resampling between sets of sample points
+
+    Resampling data from one set of points onto another (e.g. from the
+    adaptive cells of a simulation onto a fixed list of vertices) is a
+    linear operation, so it can be written as a sparse matrix with one row
+    per target point. Building the matrix means triangulating the source
+    points, which is the expensive bit. Applying it is a single sparse
+    product, so when lots of snapshots share a layout we build the matrix
+    once and reuse it.
+
+    GridInterpolator does the same for interpolating scattered samples onto
+    a regular grid (for plotting, spectra and so on), with interpolators
+    cached by sample positions so repeated calls don't re-triangulate.
+"""
+
+from __future__ import division
+
+import threading
+from collections import OrderedDict
+
+import numpy
+
+from .spatial_index import positions_checksum
+
+
+# The maximum number of grid interpolators kept by get_grid_interpolator
+MAX_CACHED_GRIDS = 8
+
+_GRID_CACHE = OrderedDict()
+_GRID_LOCK = threading.Lock()
+
+
+def resampling_matrix(source, target, extrapolate=True):
+    """ Build a sparse matrix which linearly interpolates values at the
+        source points onto the target points
+
+        The source points are triangulated (Delaunay), and each target point
+        gets the barycentric weights of the vertices of the triangle it
+        falls in. Target points outside the triangulation take the value of
+        the nearest source point, or get an empty row if extrapolate is
+        False.
+
+        :param source: The points we have values at
+        :type source: array of shape (n_dimensions, n_source)
+        :param target: The points we want values at
+        :type target: array of shape (n_dimensions, n_target)
+        :param extrapolate: Whether to fill in points outside the
+            triangulation with the nearest value
+        :type extrapolate: bool
+        :returns: a scipy.sparse.csr_matrix with shape (n_target, n_source)
+    """
+    # scipy is slow to import, so only do it when we need to
+    from scipy import sparse
+    from scipy.spatial import Delaunay, cKDTree
+
+    source = numpy.asarray(source, dtype=float).T
+    target = numpy.asarray(target, dtype=float).T
+    n_dimensions = source.shape[1]
+    triangulation = Delaunay(source)
+    simplex = triangulation.find_simplex(target)
+    inside = numpy.flatnonzero(simplex >= 0)
+    outside = numpy.flatnonzero(simplex < 0)
+
+    # Barycentric coordinates for the points inside the triangulation
+    transform = triangulation.transform[simplex[inside]]
+    partial = numpy.einsum('ijk,ik->ij', transform[:, :n_dimensions],
+                           target[inside] - transform[:, n_dimensions])
+    weights = numpy.hstack([partial, 1 - partial.sum(axis=1)[:, None]])
+    columns = triangulation.simplices[simplex[inside]]
+    rows = numpy.repeat(inside, n_dimensions + 1)
+
+    # Nearest neighbours for everything else
+    if len(outside) and extrapolate:
+        _, nearest = cKDTree(source).query(target[outside])
+        rows = numpy.concatenate([rows, outside])
+        columns = numpy.concatenate([columns.ravel(), nearest])
+        weights = numpy.concatenate([weights.ravel(), numpy.ones(len(outside))])
+
+    return sparse.csr_matrix(
+        (numpy.ravel(weights), (rows, numpy.ravel(columns))),
+        shape=(len(target), len(source)))
+
+
+class Resampler(object):
+
+    """ Resample values onto a fixed set of target points
+
+        Resampling matrices are cached by a hash of the source layout, so
+        resampling lots of snapshots with the same layout only triangulates
+        it once. The cache is safe to share between threads.
+
+        :param target: The points to resample onto. If these have more
+            dimensions than the source points, the extra ones are ignored
+            (so 'x y z' vertices can be used with 2D sources).
+        :type target: array of shape (n_dimensions, n_target)
+        :param max_cached: The maximum number of layouts to keep matrices
+            for. The least recently used are dropped first.
+        :type max_cached: int
+    """
+
+    def __init__(self, target, max_cached=8):
+        super(Resampler, self).__init__()
+        self.target = numpy.asarray(target, dtype=float)
+        self.max_cached = max_cached
+        self.hits, self.misses = 0, 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def matrix(self, source):
+        """ Return the resampling matrix for a source layout
+
+            :param source: The source points
+            :type source: array of shape (n_dimensions, n_source)
+            :returns: a scipy.sparse.csr_matrix with shape
+                (n_target, n_source)
+        """
+        key = positions_checksum(source)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache[key] = self._cache.pop(key)
+                return self._cache[key]
+            self.misses += 1
+
+        # Build outside the lock so other threads aren't held up
+        matrix = resampling_matrix(source, self.target[:len(source)])
+        with self._lock:
+            self._cache[key] = matrix
+            while len(self._cache) > self.max_cached:
+                self._cache.popitem(last=False)
+        return matrix
+
+    def resample(self, source, values):
+        """ Resample values from the source points onto the targets
+
+            :param source: The source points
+            :type source: array of shape (n_dimensions, n_source)
+            :param values: The values at the source points. Several fields
+                can be resampled at once by passing an array of shape
+                (n_source, n_fields).
+            :type values: array
+            :returns: the values at the target points
+        """
+        return self.matrix(source).dot(numpy.asarray(values))
+
+
+def grid_shape(position, n_points=None):
+    """ Work out a grid shape which covers some sample positions with about
+        the same number of points, and roughly square cells
+
+        :param position: The sample positions
+        :type position: array of shape (2, n_samples)
+        :param n_points: The number of grid points to aim for. Optional,
+            defaults to the number of samples.
+        :type n_points: int
+        :returns: the grid shape as (n_y, n_x)
+    """
+    position = numpy.asarray(position, dtype=float)
+    n_points = n_points or position.shape[1]
+    width, height = numpy.ptp(position[0]), numpy.ptp(position[1])
+    if width <= 0 or height <= 0:
+        raise ValueError("Can't grid samples which lie on a line")
+    n_x = max(int(round(numpy.sqrt(n_points * width / height))), 2)
+    n_y = max(int(round(n_points / n_x)), 2)
+    return (n_y, n_x)
+
+
+class GridInterpolator(object):
+
+    """ Linearly interpolate values at scattered points onto a regular grid
+
+        The triangulation and interpolation weights are worked out once, so
+        interpolating each field (or each snapshot) is a single sparse
+        matrix product. Grid points outside the convex hull of the samples
+        are masked.
+
+        :param position: The sample positions
+        :type position: array of shape (2, n_samples)
+        :param shape: The grid shape as (n_y, n_x). Optional, see
+            `grid_shape` for the default.
+        :type shape: tuple
+        :param bounds: The grid limits as (x_min, x_max, y_min, y_max).
+            Optional, defaults to the limits of the samples.
+        :type bounds: tuple
+
+        Attributes:
+            xgrid, ygrid - the grid coordinates along each axis
+            shape - the grid shape as (n_y, n_x)
+            matrix - the sparse interpolation matrix, with one row for each
+                grid point (in C order) and one column for each sample
+            mask - True for grid points outside the samples
+    """
+
+    def __init__(self, position, shape=None, bounds=None):
+        super(GridInterpolator, self).__init__()
+        position = numpy.asarray(position, dtype=float)[:2]
+        self.n_samples = position.shape[1]
+        self.shape = tuple(shape or grid_shape(position))
+        if bounds is None:
+            bounds = (position[0].min(), position[0].max(),
+                      position[1].min(), position[1].max())
+        self.xgrid = numpy.linspace(bounds[0], bounds[1], self.shape[1])
+        self.ygrid = numpy.linspace(bounds[2], bounds[3], self.shape[0])
+        xpts, ypts = numpy.meshgrid(self.xgrid, self.ygrid)
+        self.matrix = resampling_matrix(
+            position, numpy.vstack([xpts.ravel(), ypts.ravel()]),
+            extrapolate=False)
+        self.mask = (numpy.diff(self.matrix.indptr) == 0).reshape(self.shape)
+
+    def __call__(self, values):
+        return self.interpolate(values)
+
+    def interpolate(self, values):
+        """ Interpolate values onto the grid
+
+            :param values: The values at the samples. Several fields (or
+                snapshots) can be interpolated at once by stacking them
+                along extra axes after the sample axis.
+            :type values: array of shape (n_samples, ...)
+            :returns: a masked array with shape (n_y, n_x, ...)
+        """
+        values = numpy.asarray(values)
+        if values.shape[0] != self.n_samples:
+            raise ValueError('Expected values for {0} samples, got '
+                             '{1}'.format(self.n_samples, values.shape[0]))
+        extra = values.shape[1:]
+        gridded = self.matrix.dot(values.reshape(self.n_samples, -1))
+        gridded = gridded.reshape(self.shape + extra)
+        mask = numpy.empty(gridded.shape, dtype=bool)
+        mask[...] = self.mask.reshape(self.shape + (1,) * len(extra))
+        return numpy.ma.masked_array(gridded, mask=mask)
+
+
+# The grid interpolator for regridding in worker processes, set once per
+# process by _init_regrid_worker so it's not sent with every block
+_REGRID_INTERPOLATOR = None
+
+
+def _init_regrid_worker(interpolator):
+    """ Set up a worker process for regridding blocks of snapshots
+    """
+    global _REGRID_INTERPOLATOR  # pylint: disable=W0603
+    _REGRID_INTERPOLATOR = interpolator
+
+
+def regrid_block(values, interpolator=None):
+    """ Interpolate a block of values onto a grid, with NaN outside the
+        samples
+
+        This is a plain function so that it can be farmed out to worker
+        processes.
+
+        :param values: The values to interpolate
+        :type values: array of shape (n_samples, ...)
+        :param interpolator: The interpolator onto the grid. Optional,
+            defaults to the one set up for this worker process.
+        :type interpolator: GridInterpolator
+        :returns: an array of shape (n_y, n_x, ...)
+    """
+    interpolator = interpolator or _REGRID_INTERPOLATOR
+    values = numpy.asarray(values, dtype=float)
+    extra = values.shape[1:]
+    gridded = interpolator.matrix.dot(values.reshape(values.shape[0], -1))
+    gridded = gridded.reshape(tuple(interpolator.shape) + extra)
+    gridded[interpolator.mask] = numpy.nan
+    return gridded
+
+
+def get_grid_interpolator(position, shape=None, bounds=None):
+    """ Return a GridInterpolator for some sample positions, reusing a
+        cached one if these positions have been seen recently
+
+        Arguments are as for GridInterpolator.
+    """
+    key = (positions_checksum(position),
+           None if shape is None else tuple(shape),
+           None if bounds is None else tuple(bounds))
+    with _GRID_LOCK:
+        if key in _GRID_CACHE:
+            _GRID_CACHE[key] = _GRID_CACHE.pop(key)
+            return _GRID_CACHE[key]
+    interpolator = GridInterpolator(position, shape=shape, bounds=bounds)
+    with _GRID_LOCK:
+        _GRID_CACHE[key] = interpolator
+        while len(_GRID_CACHE) > MAX_CACHED_GRIDS:
+            _GRID_CACHE.popitem(last=False)
+    return interpolator
@@ -6,6 +6,6 @@
     description: Imports for I/O module
 """
 
-from . import gerris, matlab
+from . import gerris, gfs, matlab, pipeline
 
-__all__ = ["gerris", "matlab"]
+__all__ = ["gerris", "gfs", "matlab", "pipeline"]
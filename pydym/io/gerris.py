@@ -10,110 +10,522 @@ from __future__ import division, print_function
 
 import re
 import numpy
-import itertools
 import os
 import subprocess
-from functools import reduce
+import time
+import warnings
+from functools import partial
+from numpy.lib import NumpyVersion
 
-from ..utilities import ProgressBar
+# in_box lives in pydym.utilities now, but is still available from here
+from ..utilities import ProgressBar, in_box
 from ..observations import Observations
 from ..snapshot import Snapshot
+from .pipeline import Pipeline
+from .gfs import GfsFile
+from ..interpolation import Resampler
 
 
-def read_output_file(output_file):
-    """ Read in an output file output by Gerris
+# The columns we keep from Gerris output files, in the order we store them
+OUTPUT_COLUMNS = ('x', 'y', 'U', 'V', 'P', 'T')
+
+# numpy 1.23 replaced the pure Python loadtxt with a C parser which can skip
+# the columns we don't want
+FAST_LOADTXT = NumpyVersion(numpy.__version__) >= '1.23.0'
+
+
+def read_columns(fhandle, n_columns, columns):
+    """ Read the given columns of a whitespace-delimited table of numbers
+
+        :param fhandle: The file to read, opened in binary mode and
+            positioned at the start of the numbers
+        :param n_columns: The number of columns in the table
+        :type n_columns: int
+        :param columns: The indices of the columns to read
+        :type columns: sequence of ints
+        :returns: an array with one row for each of the given columns
+        :raises ValueError: if the table can't be parsed
+    """
+    if FAST_LOADTXT:
+        return numpy.loadtxt(fhandle, usecols=columns, unpack=True, ndmin=2)
+
+    # Older versions of loadtxt are very slow, but fromfile can parse the
+    # whole table in C. If there's anything it can't parse it stops early,
+    # which we pick up from the size
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        values = numpy.fromfile(fhandle, sep=' ')
+    if values.size % n_columns != 0:
+        raise ValueError('Expected {0} values per row'.format(n_columns))
+    table = values.reshape(-1, n_columns)
+    data = numpy.empty((len(columns), len(table)))
+    for idx, column in enumerate(columns):
+        data[idx] = table[:, column]
+    return data
+
+
+def read_table(filename, names):
+    """ Read named columns from a text dump with a Gerris-style header
+        (`# 1:t 2:x 3:y ...`)
+
+        :param filename: The file to read
+        :type filename: string
+        :param names: The names of the columns to read
+        :type names: sequence of strings
+        :returns: an array with one row for each name
+        :raises ValueError: if a column is missing or the table can't be
+            parsed
     """
     # Read in header
     regex = re.compile(r'.*:(.*)')
-    with open(output_file, 'r') as fhandle:
+    with open(filename, 'rb') as fhandle:
         header = [regex.findall(k)[0]
-                  for k in fhandle.readline().split()[1:]]
+                  for k in fhandle.readline().decode('utf-8').split()[1:]]
 
         # Read in the rest of the file using numpy
-        data = numpy.loadtxt(fhandle)
-        data_columns = {h: data[:, header.index(h)] for h in header}
-        snapshot = Snapshot(
-            position=numpy.vstack([data_columns['x'], data_columns['y']]),
-            velocity=numpy.vstack([data_columns['U'], data_columns['V']]),
-            pressure=data_columns['P'],
-            tracer=data_columns['T'])
-        return snapshot
+        missing = [key for key in names if key not in header]
+        if missing:
+            raise ValueError('Columns {0} are missing from {1}'.format(
+                ', '.join(missing), filename))
+        columns = [header.index(key) for key in names]
+        try:
+            return read_columns(fhandle, len(header), columns)
+        except ValueError as err:
+            raise ValueError('Unable to parse {0}: {1}'.format(filename, err))
+
+
+def read_output_file(output_file):
+    """ Read in an output file output by Gerris
+
+        Only the columns in OUTPUT_COLUMNS are parsed.
+
+        :param output_file: The file to read
+        :type output_file: string
+        :returns: a pydym.Snapshot
+    """
+    data = read_table(output_file, OUTPUT_COLUMNS)
+    return Snapshot(position=data[0:2], velocity=data[2:4],
+                    pressure=data[4], tracer=data[5])
+
+
+def run_gerris(command, output_filename, update=False):
+    """ Run Gerris to sample a simulation file, unless the output exists
+
+        :param command: The Gerris command which writes the output file
+        :type command: string
+        :param output_filename: The file that Gerris writes to
+        :type output_filename: string
+        :param update: Whether to regenerate the output file if it exists
+            already
+        :type update: bool
+        :returns: the output filename
+    """
+    # If we're updating, we need to remove any existing output or Gerris will
+    # just append the new data to the file
+    if os.path.exists(output_filename) and update:
+        os.remove(output_filename)
+
+    # Call Gerris to generate the new data files
+    if not os.path.exists(output_filename):
+        try:
+            subprocess.check_output(command, shell=True,
+                                    stderr=subprocess.STDOUT)
+        except subprocess.CalledProcessError as err:
+            print(err.output)
+            raise err
+    return output_filename
+
+
+def parse_output_file(output_filename, clean=False):
+    """ Read in a Gerris output file, removing it afterwards if required
+
+        :param output_filename: The file to read
+        :type output_filename: string
+        :param clean: Whether to remove the output file once it's been read
+        :type clean: bool
+        :returns: a pydym.Snapshot
+    """
+    snapshot = read_output_file(output_filename)
+    if clean:
+        os.remove(output_filename)
+    return snapshot
+
+
+def extract_snapshot(command, output_filename, update=False, clean=False):
+    """ Run Gerris to sample a simulation file, and read in the result
+
+        :param command: The Gerris command which writes the output file
+        :type command: string
+        :param output_filename: The file that Gerris writes to
+        :type output_filename: string
+        :param update: Whether to regenerate the output file if it exists
+            already
+        :type update: bool
+        :param clean: Whether to remove the output file once it's been read
+        :type clean: bool
+        :returns: a pydym.Snapshot
+    """
+    return parse_output_file(
+        run_gerris(command, output_filename, update=update), clean=clean)
+
+
+def _run_gerris_task(_, task, update=False):
+    """ Pipeline stage to run Gerris for a (command, output_filename) pair
+
+        :returns: the output filename
+    """
+    return run_gerris(*task, update=update)
+
+
+def _parse_task(_, output_filename, clean=False):
+    """ Pipeline stage to parse a Gerris output file, run in a worker
+        process
+    """
+    return parse_output_file(output_filename, clean=clean)
+
+
+# The resampler used by read_native_file in worker processes, set once per
+# process by _init_native_worker so it isn't sent with every file
+_NATIVE_RESAMPLER = None
+
+
+def _init_native_worker(resampler):
+    """ Set up a worker process for reading simulation files natively
+    """
+    global _NATIVE_RESAMPLER  # pylint: disable=W0603
+    _NATIVE_RESAMPLER = resampler
+
+
+def read_native_file(_, filename, resampler=None):
+    """ Pipeline stage to read a binary simulation file without Gerris
+
+        :param filename: The simulation file to read
+        :type filename: string
+        :param resampler: The resampler onto the sample points. Optional,
+            defaults to the one set up for this worker process.
+        :type resampler: pydym.interpolation.Resampler
+        :returns: a pydym.Snapshot
+    """
+    return GfsFile(filename).snapshot(
+        resampler=resampler or _NATIVE_RESAMPLER)
+
+
+def write_ready(data, pending, start, times, batch_size=1, indices=None):
+    """ Write out consecutive snapshots which are ready to go
+
+        Snapshots are written in blocks of batch_size columns, starting at
+        start. Anything left over stays in pending until more snapshots
+        arrive.
+
+        :param data: The observations to write to
+        :type data: pydym.Observations
+        :param pending: The snapshots waiting to be written, keyed by their
+            position in the list of files being processed. Snapshots are
+            removed as they're written.
+        :type pending: dict
+        :param start: The position of the next snapshot to write
+        :type start: int
+        :param times: The time for each position
+        :type times: sequence of floats
+        :param batch_size: The number of snapshots to write at once
+        :type batch_size: int
+        :param indices: The snapshot index to write each position to, in
+            increasing order. Optional, defaults to writing each snapshot to
+            the index matching its position.
+        :type indices: sequence of ints
+        :returns: the position of the next snapshot to write
+    """
+    if indices is None:
+        indices = range(len(times))
+    while True:
+        stop = start
+        while stop in pending and stop - start < batch_size:
+            stop += 1
+        if stop - start < batch_size:
+            return start
+
+        # Write each run of consecutive indices as a block
+        run_start = start
+        for position in range(start + 1, stop + 1):
+            if position == stop \
+                    or indices[position] != indices[position - 1] + 1:
+                data.set_snapshots(
+                    indices[run_start],
+                    [pending.pop(i) for i in range(run_start, position)],
+                    times=times[run_start:position])
+                run_start = position
+        start = stop
+
+
+def source_entry(filename, index, time_value):
+    """ Describe a source file for an observations manifest
+
+        :param filename: The source file
+        :type filename: string
+        :param index: The snapshot the file is stored in
+        :type index: int
+        :param time_value: The time of the snapshot
+        :type time_value: float
+        :returns: a dictionary with the file size, modification time, index
+            and time
+    """
+    stat = os.stat(filename)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime,
+            'index': index, 'time': time_value}
+
+
+def source_changed(entry, filename):
+    """ Check whether a source file has changed since it was read
+
+        :param entry: The manifest entry for the file
+        :type entry: dict
+        :param filename: The source file
+        :type filename: string
+    """
+    stat = os.stat(filename)
+    return entry['size'] != stat.st_size or entry['mtime'] != stat.st_mtime
 
 
 def boxes_from_gfsfile(gfsfilename):
     """ Read a GFSFile and return the boxes from it
+
+        Works on both text and binary simulation files, since only the
+        GfsBox header lines are parsed.
+
+        :returns: an array with an (x, y, size) row for each box
     """
-    # Parse the simulation geometry from the gfsfile
     with open(gfsfilename, 'rb') as gfsfile:
-        # Return rows which start with two numbers
-        boxes = []
-        for line in (l.decode('utf-8') for l in gfsfile):
-            # Check we're describing a box
-            if not str(line).startswith('GfsBox'):
-                continue
-
-            # Split line into values and keys, generate a dictionary
-            line = line.split()[2:]
-            line.reverse()
-            boxdata = {}
-            while len(line) > 2:
-                key, _, value = line.pop(), line.pop(), line.pop()
-                if key in set(['x', 'y', 'size']):
-                    boxdata[key] = float(value)
-            boxes.append((boxdata['x'], boxdata['y'], boxdata['size']))
+        contents = gfsfile.read()
+    boxes = []
+    for header in BOX_REGEX.findall(contents):
+        boxdata = dict((k.decode('latin-1'), float(v))
+                       for k, v in BOX_VALUE_REGEX.findall(header))
+        boxes.append((boxdata['x'], boxdata['y'], boxdata['size']))
     return numpy.asarray(boxes)
 
 
+# GfsBox header lines, and the values we want from them
+BOX_REGEX = re.compile(br'^GfsBox \{([^\n]*)', re.MULTILINE)
+BOX_VALUE_REGEX = re.compile(br'(?<!\S)(x|y|size) = (\S+)')
+
+# The default template gives the corners of each box
+CORNERS = numpy.array([[1, 1], [1, -1], [-1, 1], [-1, -1]], dtype=float)
+
+
+def _box_vertices(boxes, template):
+    """ Generate the vertices for each box from a template
+
+        :returns: an array with an (x, y, level) row for each vertex,
+            with the vertices for each box together
+    """
+    level = boxes[:, 2] + 1
+    scale = 0.5 ** level
+    vertices = numpy.empty((len(boxes), len(template), 3))
+    vertices[..., :2] = (boxes[:, None, :2]
+                         + template[None, :, :] * scale[:, None, None])
+    vertices[..., 2] = level[:, None]
+    return vertices.reshape(-1, 3)
+
+
+def _dyadic_exponent(values):
+    """ Find the smallest power of two which scales the values to integers
+
+        :returns: the exponent, or None if there isn't one
+    """
+    values = numpy.asarray(values, dtype=float)
+    if not numpy.all(numpy.isfinite(values)):
+        return None
+
+    # Each value is M * 2^(exp - 53) for an integer M, so we need to scale by
+    # 2^(53 - exp) divided by the largest power of two in M
+    mantissa, exponent = numpy.frexp(values)
+    ints = (mantissa * 2. ** 53).astype(numpy.int64)
+    lowest_bit = ints & -ints
+    nonzero = lowest_bit != 0
+    if not nonzero.any():
+        return 0
+    _, bit_exponent = numpy.frexp(lowest_bit[nonzero].astype(float))
+    needed = 53 - (bit_exponent - 1) - exponent[nonzero]
+    return max(0, int(needed.max()))
+
+
+def _lattice_exponents(boxes, template):
+    """ Work out the lattice for the vertices from a set of boxes without
+        generating them
+
+        :returns: the exponents for the y, x and level columns, or None if
+            we can't tell
+    """
+    levels = boxes[:, 2]
+    if not numpy.all(levels == numpy.floor(levels)):
+        return None
+    exponents = (_dyadic_exponent(boxes[:, :2]), _dyadic_exponent(template),
+                 _dyadic_exponent(levels))
+    if None in exponents or len(boxes) == 0:
+        return None
+    coords = max(exponents[0], exponents[1] + int(levels.max()) + 1, 0)
+    return coords, coords, exponents[2]
+
+
+def lattice_keys(vertices, exponents=None):
+    """ Map vertices to integer keys which sort in (y, x, level) order
+
+        Box centres and template offsets are almost always dyadic fractions
+        (sums of powers of two), so the coordinates are exactly integers on
+        a fine enough lattice. Equal vertices get equal keys.
+
+        :param vertices: The vertices, as (x, y, level) rows
+        :type vertices: array
+        :param exponents: The powers of two which scale the y, x and level
+            columns to integers. Optional, worked out from the vertices if
+            not given.
+        :type exponents: tuple of ints
+        :returns: an int64 array of keys, or None if the vertices aren't on
+            a lattice (or the keys won't fit in 64 bits)
+    """
+    columns, sizes = [], []
+    if exponents is None:
+        exponents = [None] * 3
+    for column, exponent in zip(
+            (vertices[:, 1], vertices[:, 0], vertices[:, 2]), exponents):
+        if exponent is None:
+            exponent = _dyadic_exponent(column)
+        if exponent is None:
+            return None
+        scaled = column * 2. ** exponent
+        if numpy.abs(scaled).max() >= 2 ** 52:
+            return None
+        ints = scaled.astype(numpy.int64)
+        ints -= ints.min()
+        columns.append(ints)
+        sizes.append(int(ints.max()) + 1)
+    if float(sizes[0]) * sizes[1] * sizes[2] >= 2 ** 62:
+        return None
+    return (columns[0] * sizes[1] + columns[1]) * sizes[2] + columns[2]
+
+
+def sort_unique(vertices, exponents=None):
+    """ Sort vertices by y, then x, then level, dropping duplicates
+
+        :param vertices: The vertices, as (x, y, level) rows
+        :type vertices: array
+        :param exponents: The lattice exponents, see lattice_keys. Optional.
+        :type exponents: tuple of ints
+    """
+    if len(vertices) == 0:
+        return vertices
+    keys = lattice_keys(vertices, exponents)
+    if keys is not None:
+        order = numpy.argsort(keys)
+        keep = numpy.r_[True, numpy.diff(keys[order]) != 0]
+    else:
+        # Fall back to sorting on the coordinates themselves
+        order = numpy.lexsort((vertices[:, 2], vertices[:, 0],
+                               vertices[:, 1]))
+        keep = numpy.r_[True, (numpy.diff(vertices[order], axis=0) != 0)
+                        .any(axis=1)]
+    return vertices[order[keep]]
+
+
 def make_vertex_list(boxes, template=None):
     """ Make a list of vertices given some template, a list of centers and a
         level for those centers
+
+        :param boxes: The boxes, as (x, y, level) rows
+        :type boxes: array
+        :param template: The vertex offsets for a box, in units of half the
+            box size. Optional, defaults to the box corners.
+        :type template: array of shape (n_vertices, 2)
+        :returns: an array of unique (x, y, level + 1) rows, sorted by y
+            then x then level
     """
-    # Vertex vector function
-    if template is None:
-        template = numpy.asarray(list(itertools.product([1, -1], [1, -1])),
-                                 dtype=int)
-    vertex_vectors = lambda level: template / float(2 ** (level + 1))
-
-    # Generate a unique list of vertices
-    vertices = numpy.empty((4 * len(boxes), 3), dtype=float)
-    for idx, box in enumerate(boxes):
-        vertices[(4 * idx):(4 * idx + 4), :2] = \
-            vertex_vectors(level=box[2]) + box[:2]
-        vertices[(4 * idx):(4 * idx + 4), 2] = box[2] + 1
-
-    # Get unique vertices by voiding the datatype to get unique to treat each
-    # row as an object
-    temp = numpy.ascontiguousarray(vertices).view(
-        numpy.dtype((numpy.void, vertices.dtype.itemsize * vertices.shape[1])))
-    _, idx = numpy.unique(temp, return_index=True)
-    vertices = vertices[idx]
-
-    # Make sure vertices are sorted
-    vertices.view(
-        dtype=[('x', numpy.float), ('y', numpy.float), ('level', numpy.float)]
-    ).sort(order=['y', 'x', 'level'], axis=0)
-    return vertices
-
-
-def double_resolution(boxes):
-    """ Double the sampling resolution in a grid
+    boxes = numpy.asarray(boxes, dtype=float).reshape(-1, 3)
+    template = CORNERS if template is None \
+        else numpy.asarray(template, dtype=float)
+    return sort_unique(_box_vertices(boxes, template),
+                       _lattice_exponents(boxes, template))
+
+
+def iter_vertex_list(boxes, template=None, block_size=100000):
+    """ Generate the same vertices as make_vertex_list, a block at a time
+
+        Boxes are swept from the bottom of the domain to the top, and the
+        vertices below the sweep line (which no later box can touch) are
+        sorted, deduplicated and yielded. Only the vertices for a band of
+        boxes are held in memory at once, so this can handle domains too
+        big to build all at once (e.g. by writing each block to disk).
+
+        :param boxes: The boxes, as (x, y, level) rows
+        :type boxes: array
+        :param template: The vertex offsets, see make_vertex_list.
+        :type template: array of shape (n_vertices, 2)
+        :param block_size: The number of boxes to process at a time
+        :type block_size: int
+        :returns: an iterator over arrays of vertices. Concatenating the
+            blocks gives the output of make_vertex_list.
     """
-    double_template = \
-        numpy.asarray(list(itertools.product([0.5, -0.5], [0.5, -0.5])))
-    return make_vertex_list(boxes, template=double_template)
-
+    boxes = numpy.asarray(boxes, dtype=float).reshape(-1, 3)
+    template = CORNERS if template is None \
+        else numpy.asarray(template, dtype=float)
+
+    # Sort boxes by the lowest point they can reach
+    reach = numpy.abs(template[:, 1]).max() * 0.5 ** (boxes[:, 2] + 1)
+    lowest = boxes[:, 1] - reach
+    order = numpy.argsort(lowest, kind='stable')
+    exponents = _lattice_exponents(boxes, template)
+    pending = numpy.empty((0, 3))
+    for start in range(0, len(boxes), block_size):
+        stop = start + block_size
+        block = boxes[order[start:stop]]
+        pending = numpy.concatenate([pending, _box_vertices(block, template)])
+        sweep = lowest[order[stop]] if stop < len(boxes) else numpy.inf
+        done = pending[:, 1] < sweep
+        if done.any():
+            yield sort_unique(pending[done], exponents)
+            pending = pending[~done]
+
+
+def double_resolution(boxes, levels=1):
+    """ Double the sampling resolution in a grid
 
-def in_box(points, left=0, right=1, top=1, bottom=0):
-    """ Return the subset of points in the given rectangle
+        :param boxes: The boxes, as (x, y, level) rows
+        :type boxes: array
+        :param levels: The number of times to double the resolution.
+            Optional, defaults to 1.
+        :type levels: int
+        :returns: the centres of the child boxes, as (x, y, level + levels)
+            rows sorted by y then x then level
     """
-    return reduce(numpy.logical_and,
-                  (points[..., 0] > left, points[..., 0] < right,
-                   points[..., 1] < top, points[..., 1] > bottom))
+    # The children n levels down are on a 2^n x 2^n grid, and their offsets
+    # relative to half the parent size are (2i + 1 - 2^n) / 2^n
+    boxes = numpy.asarray(boxes, dtype=float).reshape(-1, 3)
+    n_across = 2 ** levels
+    steps = (2 * numpy.arange(n_across) + 1 - n_across) / n_across
+    template = numpy.array([(x, y) for x in steps[::-1] for y in steps[::-1]])
+
+    # The template is scaled by the new level, so scale it up to match
+    template = template * 2 ** (levels - 1)
+    shifted = boxes.copy()
+    shifted[:, 2] += levels - 1
+    return make_vertex_list(shifted, template=template)
 
 
 class GerrisReader(object):
 
     """ Class to read and parse Gerris simulation files
+
+        :param vertex_file: A file with the points to sample the
+            simulations at, one 'x y z' row per point
+        :type vertex_file: string
+        :param native: Whether to read the binary simulation files directly
+            rather than running Gerris to sample them. Natively read values
+            are interpolated linearly between the leaf cell centres, which
+            is close to (but not exactly) what Gerris does. Optional,
+            defaults to reading the files natively only if Gerris isn't
+            installed.
+        :type native: bool
+
+        Any other keyword arguments override the default templates.
     """
 
     default_templates = dict(
@@ -123,13 +535,26 @@ class GerrisReader(object):
         input_file_template=r'simulation_{0}\.gfs'
     )
 
-    def __init__(self, vertex_file, **kwargs):
+    def __init__(self, vertex_file, native=None, **kwargs):
         self.templates = {}
         self.templates.update(self.default_templates)
 
-        # Find Gerris on this system
-        output = subprocess.check_output('which gerris2D', shell=True)
-        self.templates['gerris'] = output.decode('utf-8').strip('\n')
+        # Find Gerris on this system. If it's not installed we can still read
+        # the simulation files ourselves
+        try:
+            output = subprocess.check_output('which gerris2D', shell=True,
+                                             stderr=subprocess.STDOUT)
+            self.templates['gerris'] = output.decode('utf-8').strip('\n')
+            found_gerris = True
+        except subprocess.CalledProcessError:
+            found_gerris = False
+        if native is None:
+            native = not found_gerris
+        elif not native and not found_gerris:
+            raise IOError("Can't find gerris2D on this system, use "
+                          "native=True to read the simulation files directly")
+        self.native = native
+        self.resampler = None
         self.templates.update(kwargs)
 
         # Generate regexes for simulation files and output files
@@ -142,10 +567,12 @@ class GerrisReader(object):
         self.templates['output_file_template'] = \
             self.templates['output_file_template'].replace('\\', '')
         self.vertex_file = os.path.abspath(vertex_file)
+        self.report = None
 
     def process_directory(self, directory=None, output_name=None,
                           update=False, clean=False, show_progress=True,
-                          run_parameters=None):
+                          run_parameters=None, workers=None,
+                          batch_size=16, queue_size=4, min_age=0):
         """ Process the Gerris output files to get values at given points
 
             :param directory: The directory to process
@@ -155,8 +582,10 @@ class GerrisReader(object):
             :type output_name: string
             :param update: Whether to update the files if they already exist.
                 If the directory already has an HDF5 file with the given
-                output_name and update is False, then this file is just loaded,
-                rather than reprocessing the data. Optional, defaults to False.
+                output_name and update is False, then only simulation files
+                which aren't in the file's manifest yet (or have changed since
+                they were read) are processed. Otherwise everything is
+                reprocessed. Optional, defaults to False.
             :type update: bool
             :param clean: If True, remove temporary data files after they've
                 been added to the HDF5 file. Optional, defaults to False.
@@ -164,6 +593,41 @@ class GerrisReader(object):
             :param show_progress: If True, prints a progress bar. Optional,
                 defaults to True
             :type show_progress: bool
+            :param workers: The number of copies of Gerris to run at once,
+                and the number of worker processes parsing their output (or
+                reading simulation files natively). Optional, defaults to
+                one at a time.
+            :type workers: int
+            :param batch_size: The number of snapshots to write to the HDF5
+                file at once. Optional, defaults to 16.
+            :type batch_size: int
+            :param queue_size: The maximum number of files waiting between
+                each stage. Optional, defaults to 4.
+            :type queue_size: int
+            :param min_age: Skip simulation files modified less than this
+                many seconds ago, as Gerris may still be writing them.
+                Optional, defaults to 0.
+            :type min_age: float
+            :returns: the number of simulation files processed
+
+            Files are processed by a pipeline - Gerris extracts the
+            samples from one file while the output from earlier files is
+            parsed in a pool of worker processes (or files are read
+            natively in the pool), and the snapshots are written to the
+            HDF5 file in this thread as they arrive, so the disk and the
+            CPUs are kept busy at the same time. The statistics for each
+            stage are stored in `self.report` afterwards (and printed if
+            show_progress is True), which shows which stage is the
+            bottleneck.
+
+            Each simulation file is recorded in the output's manifest once
+            its snapshot has been written, so an interrupted run picks up
+            where it left off when it's rerun. New files are appended to the
+            end of the snapshots, so they need to be later than any files
+            that have already been processed - earlier ones are skipped with
+            a warning (use update=True to rebuild everything in order).
+            Files without a manifest (from older versions of pydym) are just
+            loaded.
         """
         # Get output name
         if directory is None:
@@ -185,82 +649,190 @@ class GerrisReader(object):
             + self.templates['input_file_template'])
 
         # Get list of files to process
+        data, n_processed = None, 0
         try:
             current_dir = os.getcwd()
             os.chdir(directory)
-            # If the data already exists, then just load it
+            manifest = {}
             if os.path.exists(output_name) and not update:
-                print('Found existing file, loading')
                 data = Observations(filename=output_name, run_checks=False)
-
+                manifest = data.manifest
+                if not manifest:
+                    # We don't know what's in here, so just load it
+                    print('Found existing file, loading')
+                    return n_processed
+
+            # Work out which files still need to be read, and where their
+            # snapshots should go
+            gfsfiles, time_strs, indices = [], [], []
+            next_index = 1 + max([-1] + [e['index']
+                                         for e in manifest.values()])
+            last_time = max([-numpy.inf] + [e['time']
+                                            for e in manifest.values()])
+            for gfsfile, time_str in self.find_simulation_files(min_age):
+                entry = manifest.get(os.path.basename(gfsfile))
+                if entry is None:
+                    if float(time_str) <= last_time:
+                        warnings.warn('Skipping {0}, it is earlier than the '
+                                      'snapshots in {1}'.format(
+                                          gfsfile, output_name))
+                        continue
+                    indices.append(next_index)
+                    next_index += 1
+                elif source_changed(entry, gfsfile):
+                    indices.append(entry['index'])
+                else:
+                    continue
+                gfsfiles.append(gfsfile)
+                time_strs.append(time_str)
+            if not gfsfiles:
+                if show_progress:
+                    print('No new files to process')
+                return n_processed
+            if show_progress:
+                pbar = ProgressBar(len(time_strs), 'Processing files')
+
+            # Reading and parsing happen in worker processes, while we
+            # write the snapshots into place in batches as they arrive
+            times = [float(t) for t in time_strs]
+            pipeline = Pipeline(maxsize=queue_size)
+            if self.native:
+                # Resampling matrices are cached across files (and calls) so
+                # files with the same cell layout share them. Each worker
+                # process gets a copy of the cache when it starts
+                if self.resampler is None:
+                    self.resampler = Resampler(
+                        numpy.loadtxt(self.vertex_file, ndmin=2).T)
+                tasks = gfsfiles
+                if workers is not None and workers > 1:
+                    pipeline.add_stage(
+                        'read', read_native_file, workers=workers,
+                        processes=True, initializer=_init_native_worker,
+                        initargs=(self.resampler,))
+                else:
+                    pipeline.add_stage(
+                        'read', partial(read_native_file,
+                                        resampler=self.resampler))
             else:
-                data = None
-                gfsfiles = sorted([f for f in os.listdir('.')
-                                   if self.input_file_regex.findall(f)])
+                tasks = [
+                    (command_template.format(time_str),
+                     os.path.abspath(
+                         self.templates['output_file_template'].format(
+                             time_str)))
+                    for time_str in time_strs]
+                # Gerris runs in its own process anyway, so the extract
+                # stage just needs threads to wait on it. Parsing is
+                # CPU-bound Python, so that gets a pool of processes
+                pipeline.add_stage(
+                    'extract', partial(_run_gerris_task, update=update),
+                    workers=workers)
+                pipeline.add_stage(
+                    'parse', partial(_parse_task, clean=clean),
+                    workers=workers, processes=True)
+
+            # Record each file in the manifest once its snapshot is written
+            def write(start, size):
+                stop = write_ready(data, pending, start, times, size,
+                                   indices)
+                data.record_sources(dict(
+                    (os.path.basename(gfsfiles[i]),
+                     source_entry(gfsfiles[i], indices[i], times[i]))
+                    for i in range(start, stop)))
+                return stop
+
+            pending, next_idx = {}, 0
+            results = pipeline.run(tasks, consumer='write')
+            for count, (idx, snapshot) in enumerate(results):
+                if data is None:
+                    data = Observations(
+                        filename=output_name,
+                        scalar_datasets=('pressure', 'tracer'),
+                        n_samples=len(snapshot),
+                        update=True,
+                        properties=run_parameters)
+                pending[idx] = snapshot
+                next_idx = write(next_idx, batch_size)
                 if show_progress:
-                    pbar = ProgressBar(len(gfsfiles), 'Processing files')
-
-                for idx, simfile in enumerate(gfsfiles):
-                    # First we need to determine what everything will be called
-                    time_str = self.input_file_regex.findall(simfile)[0]
-                    output_filename = \
-                        self.templates['output_file_template'].format(
-                            time_str, os.path.dirname(simfile))
-                    output_filename = os.path.join(
-                        os.path.abspath(os.getcwd()),
-                        output_filename)
-
-                    # If we're updating, we need to remove any existing output
-                    # or Gerris will just append the new data to the file
-                    if os.path.exists(output_filename) and update:
-                        os.remove(output_filename)
-
-                    # Call Gerris to generate the new data files
-                    if not os.path.exists(output_filename):
-                        try:
-                            subprocess.check_output(
-                                command_template.format(time_str),
-                                shell=True,
-                                stderr=subprocess.STDOUT)
-                        except subprocess.CalledProcessError as err:
-                            print(err.output)
-                            raise err
-
-                    # Generate data objects
-                    if not data:
-                        snapshot = read_output_file(output_filename)
-                        data = Observations(
-                            filename=output_name,
-                            scalar_datasets=('pressure', 'tracer'),
-                            n_snapshots=len(gfsfiles),
-                            n_samples=len(snapshot),
-                            update=True,
-                            properties=run_parameters)
-                        data.set_snapshot(0, snapshot)
-
-                    else:
-                        data.set_snapshot(
-                            idx,
-                            read_output_file(output_filename))
-
-                    # Clean up if required
-                    if clean:
-                        os.remove(output_filename)
-                    if show_progress:
-                        pbar.animate(idx + 1)
-
-                print('File saved to {0}'.format(output_name))
+                    pbar.animate(count + 1)
+            if pending:
+                next_idx = write(next_idx, len(pending))
+            n_processed = next_idx
+
+            self.report = pipeline.report()
+            if show_progress:
+                print(pipeline.format_report())
+            print('File saved to {0}'.format(output_name))
 
         except IOError as err:
             print(err)
 
         finally:
             # Close handle to hdf5 file if it exists
-            try:
-                if data:
-                    data.close()
-            except UnboundLocalError:
-                # The data object doesn't exist, so don't worry
-                pass
-
+            if data is not None:
+                data.close()
             os.chdir(current_dir)
+        return n_processed
+
+    def find_simulation_files(self, min_age=0):
+        """ Find the simulation files in the current directory
+
+            :param min_age: Skip files modified less than this many seconds
+                ago. Optional, defaults to 0.
+            :type min_age: float
+            :returns: a list of (filename, time string) pairs, sorted by
+                simulation time
+        """
+        now = time.time()
+        found = []
+        for fname in os.listdir('.'):
+            match = self.input_file_regex.findall(fname)
+            if not match:
+                continue
+            if min_age and now - os.path.getmtime(fname) < min_age:
+                continue
+            found.append((os.path.abspath(fname), match[0]))
+        return sorted(found, key=lambda f: float(f[1]))
+
+    def watch(self, directory=None, output_name=None, interval=10,
+              timeout=None, min_age=None, **kwargs):
+        """ Process new simulation files as a running simulation writes them
+
+            The directory is polled every `interval` seconds, and any new
+            simulation files are appended to the output file. Stop watching
+            with Ctrl-C.
+
+            :param directory: The directory to watch
+            :type directory: string
+            :param output_name: The name for the output HDF5 file. See
+                `process_directory`.
+            :type output_name: string
+            :param interval: The number of seconds between polls
+            :type interval: float
+            :param timeout: Stop after this many seconds without any new
+                files. Optional, defaults to watching until interrupted.
+            :type timeout: float
+            :param min_age: Only process files which haven't been modified
+                for this many seconds, so we don't read files Gerris is still
+                writing. Optional, defaults to interval.
+            :type min_age: float
+            :returns: the total number of files processed
+
+            Other keyword arguments are passed to `process_directory`.
+        """
+        kwargs.setdefault('show_progress', False)
+        if min_age is None:
+            min_age = interval
+        total, last_new = 0, time.time()
+        try:
+            while True:
+                n_processed = self.process_directory(
+                    directory, output_name, min_age=min_age, **kwargs)
+                total += n_processed
+                if n_processed:
+                    last_new = time.time()
+                elif timeout is not None and time.time() - last_new > timeout:
+                    break
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+        return total
@@ -0,0 +1,291 @@
+""" file:   gfs.py (pydym.io)
+
+    description: Native reader for binary Gerris simulation files
+
+    Gerris simulation files (written by GfsOutputSimulation with binary = 1)
+    have a text header describing the simulation, followed by one GfsBox per
+    root cell. Each box has a text header and then its quadtree of cells in
+    preorder. Each cell is written as
+
+        uint32 flags       - child id in the low three bits, plus the
+                             DESTROYED and LEAF flags. Destroyed cells stop
+                             here.
+        double s[0]        - -1 for cells not cut by a solid boundary,
+                             otherwise the first of the face fractions,
+                             followed by the rest of the face fractions,
+                             the volume fraction and the centres of mass
+                             and area of the solid
+        double values[n]   - one value for each variable in the header
+
+    and non-leaf cells are followed by their children. Reading this
+    directly saves running Gerris to sample the file, so files can be read
+    on machines without a Gerris installation.
+"""
+
+from __future__ import division, print_function
+
+import re
+import struct
+import numpy
+
+from ..snapshot import Snapshot
+
+# Cell flags
+FLAG_ID = 7
+FLAG_DESTROYED = 1 << 3
+FLAG_LEAF = 1 << 4
+
+# Child cell offsets from the centre of their parent (in units of half the
+# child size), by child id
+CHILD_OFFSETS = numpy.array([[-1, 1], [1, 1], [-1, -1], [1, -1]])
+
+_UINT32 = struct.Struct('<I')
+_DOUBLE = struct.Struct('<d')
+
+# Number of doubles describing the solid in a cut cell (face fractions,
+# volume fraction, centre of mass and centre of area)
+N_SOLID = 4 + 1 + 2 + 2
+
+
+def _header_value(text, key, default=None):
+    """ Pull `key = value` out of a Gerris header
+    """
+    match = re.search(r'\b{0}\s*=\s*(\S+)'.format(key), text)
+    return match.group(1) if match else default
+
+
+class GfsFile(object):
+
+    """ The cells from a binary Gerris simulation file
+
+        Cells are stored in flat arrays, one entry per cell, in the order
+        they appear in the file.
+
+        :param filename: The file to read
+        :type filename: string
+
+        Attributes:
+            variables - the names of the variables stored for each cell
+            time - the simulation time
+            rootlevel - the refinement level of the box cells
+            position - the cell centres, as an array of shape (2, n_cells)
+            level - the refinement level of each cell
+            leaf - True for leaf cells
+            solid - the fluid volume fraction of each cell (1 for cells not
+                cut by a solid boundary)
+            values - a dictionary of arrays of cell values, keyed by
+                variable name
+    """
+
+    def __init__(self, filename):
+        super(GfsFile, self).__init__()
+        self.filename = filename
+        with open(filename, 'rb') as fhandle:
+            buf = fhandle.read()
+
+        # Read the simulation header
+        header_end = buf.find(b'GfsBox {')
+        if header_end < 0:
+            raise IOError('No GfsBox found in {0}'.format(filename))
+        header = buf[:header_end].decode('latin-1')
+        if _header_value(header, 'binary') != '1':
+            raise IOError('{0} is not a binary Gerris simulation '
+                          'file'.format(filename))
+        self.variables = _header_value(header, 'variables', '').split(',')
+        self.rootlevel = int(_header_value(header, 'rootlevel', 0))
+        time = re.search(r'GfsTime\s*\{[^}]*\}', header)
+        self.time = float(_header_value(time.group(), 't', 0)) \
+            if time else None
+
+        # Read the boxes
+        cells, boxes, offset = [], [], header_end
+        while True:
+            start = buf.find(b'GfsBox {', offset)
+            if start < 0:
+                break
+            offset, centre, box_cells = self._read_box(buf, start)
+            boxes.append(centre)
+            cells.extend(box_cells)
+        self.boxes = numpy.asarray(boxes).T
+
+        # Pull out the cell data
+        cells = numpy.asarray(cells, dtype=float).reshape(-1, 6)
+        self.position = cells[:, 0:2].T.copy()
+        self.level = cells[:, 2].astype(int)
+        self.leaf = cells[:, 3].astype(bool)
+        offsets = cells[:, 4].astype(int)
+        cut = cells[:, 5].astype(bool)
+
+        # Gather the values for every cell in one go
+        self.values = {}
+        for vidx, name in enumerate(self.variables):
+            self.values[name] = self._gather(buf, offsets + 8 * vidx)
+        self.solid = numpy.ones(len(offsets))
+        if cut.any():
+            # The volume fraction comes after the face fractions
+            solid_offsets = offsets[cut] - 8 * (N_SOLID - 4)
+            self.solid[cut] = self._gather(buf, solid_offsets)
+
+    @staticmethod
+    def _gather(buf, offsets):
+        """ Read little-endian doubles at the given byte offsets
+        """
+        raw = numpy.frombuffer(buf, dtype=numpy.uint8)
+        index = offsets[:, None] + numpy.arange(8)
+        return raw[index].copy().view('<f8').ravel()
+
+    def _read_box(self, buf, start):
+        """ Read a box header and its cells
+
+            :returns: the offset of the end of the box, the centre of the
+                box, and a flat list of (x, y, level, leaf, values_offset,
+                cut) for each cell
+        """
+        # The box header is text, terminated by ' {\n' at the top level
+        depth, idx = 0, start
+        while True:
+            char = buf[idx:idx + 1]
+            if char == b'{':
+                depth += 1
+            elif char == b'}':
+                depth -= 1
+                if depth == 0:
+                    break
+            idx += 1
+        box_header = buf[start:idx].decode('latin-1')
+        idx = buf.index(b'{\n', idx) + 2
+        size = 0.5 ** self.rootlevel
+        centre = (float(_header_value(box_header, 'x', 0)),
+                  float(_header_value(box_header, 'y', 0)))
+
+        # Walk the tree in preorder. The stack holds the centre and level of
+        # each parent still waiting for children, and how many are left
+        n_vars = len(self.variables)
+        cells, stack = [], []
+        while True:
+            flags = _UINT32.unpack_from(buf, idx)[0]
+            idx += 4
+            if stack:
+                parent = stack[-1]
+                parent[3] -= 1
+                level = parent[2] + 1
+                half = size * 0.5 ** level / 2
+                child = CHILD_OFFSETS[flags & FLAG_ID]
+                x, y = parent[0] + child[0] * half, parent[1] + child[1] * half
+            else:
+                level, (x, y) = 0, centre
+
+            if not flags & FLAG_DESTROYED:
+                solid = _DOUBLE.unpack_from(buf, idx)[0]
+                cut = solid != -1
+                idx += 8 * (N_SOLID if cut else 1)
+                leaf = bool(flags & FLAG_LEAF)
+                cells.extend((x, y, level + self.rootlevel, leaf, idx, cut))
+                idx += 8 * n_vars
+                if not leaf:
+                    stack.append([x, y, level, 4])
+                    continue
+
+            # Move back up to the next parent with children left to read
+            while stack and stack[-1][3] == 0:
+                stack.pop()
+            if not stack:
+                break
+
+        return idx, centre, cells
+
+    def __len__(self):
+        return len(self.level)
+
+    def leaves(self):
+        """ Return the indices of the leaf cells
+        """
+        return numpy.flatnonzero(self.leaf)
+
+    def locate(self, points):
+        """ Find the leaf cells containing the given points
+
+            :param points: The points to look up
+            :type points: array of shape (2, n_points)
+            :returns: an array with the index of the cell containing each
+                point, or -1 for points outside the domain
+        """
+        points = numpy.asarray(points, dtype=float)[:2]
+        leaves = self.leaves()
+        position, level = self.position[:, leaves], self.level[leaves]
+
+        # Cells at each level sit on a regular grid lined up with the
+        # corner of the boxes
+        box_size = 0.5 ** self.rootlevel
+        origin = self.boxes.min(axis=1)[:, None] - box_size / 2
+        extent = (self.boxes.max(axis=1)[:, None] + box_size / 2) - origin
+        result = -numpy.ones(points.shape[1], dtype=int)
+        for lvl in numpy.unique(level):
+            # Label cells at this level by their grid coordinates, and look
+            # up the cell each point would be in at this level
+            width = 0.5 ** lvl
+            shape = numpy.ceil(extent[:, 0] / width).astype(numpy.int64)
+            at_level = numpy.flatnonzero(level == lvl)
+            cell_keys = self._grid_keys(position[:, at_level], origin, width,
+                                        shape)
+            order = numpy.argsort(cell_keys)
+            cell_keys = cell_keys[order]
+            point_keys = self._grid_keys(points, origin, width, shape)
+            found = numpy.minimum(numpy.searchsorted(cell_keys, point_keys),
+                                  len(cell_keys) - 1)
+            match = (cell_keys[found] == point_keys) & (point_keys >= 0)
+            result[match] = leaves[at_level[order[found[match]]]]
+        return result
+
+    @staticmethod
+    def _grid_keys(points, origin, width, shape):
+        """ Label points by the grid cell they fall in, or -1 for points
+            outside the grid
+        """
+        index = numpy.floor((points - origin) / width).astype(numpy.int64)
+        inside = ((index >= 0) & (index < shape[:, None])).all(axis=0)
+        return numpy.where(inside, index[0] * shape[1] + index[1], -1)
+
+    def snapshot(self, points=None, resampler=None):
+        """ Return the cell values as a pydym.Snapshot
+
+            :param points: The points to sample the cells at. Optional, if
+                None then the snapshot has one sample for each leaf cell.
+                Points are given the value of the cell that contains them.
+            :type points: array of shape (2, n_points)
+            :param resampler: Interpolates linearly between the leaf cell
+                centres onto the resampler's target points instead. Optional,
+                overrides points.
+            :type resampler: pydym.interpolation.Resampler
+            :returns: a pydym.Snapshot with velocity, pressure and tracer
+            :raises ValueError: if any points are outside the domain
+        """
+        if resampler is not None:
+            leaves = self.leaves()
+            fields = numpy.column_stack(
+                [self.values[key][leaves] for key in ('U', 'V', 'P', 'T')])
+            values = resampler.resample(self.position[:, leaves], fields)
+            snapshot = Snapshot(
+                position=resampler.target[:2],
+                velocity=values[:, :2].T.copy(),
+                pressure=values[:, 2].copy(),
+                tracer=values[:, 3].copy())
+            snapshot.time = self.time
+            return snapshot
+        elif points is None:
+            cells = self.leaves()
+            position = self.position[:, cells]
+        else:
+            position = numpy.asarray(points, dtype=float)[:2]
+            cells = self.locate(position)
+            if (cells < 0).any():
+                raise ValueError('{0} points are outside the simulation '
+                                 'domain'.format((cells < 0).sum()))
+        snapshot = Snapshot(
+            position=position,
+            velocity=numpy.vstack([self.values['U'][cells],
+                                   self.values['V'][cells]]),
+            pressure=self.values['P'][cells],
+            tracer=self.values['T'][cells])
+        snapshot.time = self.time
+        return snapshot
@@ -4,4 +4,310 @@
     date:   Tuesday 24 June 2014
 
     description: Matlab I/O module for pydym
+
+    MATLAB v7.3 files are HDF5 files with a 512 byte header, so we read them
+    with h5py a block of snapshots at a time rather than loading whole
+    variables. MATLAB stores arrays in column-major order, so a MATLAB
+    matrix with shape (n_samples, n_snapshots) turns up in HDF5 with shape
+    (n_snapshots, n_samples) and each snapshot is a contiguous row. Older
+    formats (v4 to v7) don't support partial reads, so they're loaded with
+    scipy.io one variable at a time.
 """
+
+from __future__ import division, print_function
+
+import time
+import struct
+import numpy
+
+from ..observations import Observations
+
+# MATLAB classes for numpy types, used when writing v7.3 files
+MATLAB_CLASSES = {
+    'f': 'double', 'c': 'double', 'i': 'int64', 'u': 'uint64', 'b': 'logical'}
+
+# Bytes reserved at the start of v7.3 files for the MATLAB header
+USERBLOCK_SIZE = 512
+
+
+def is_v73(filename):
+    """ Check whether a .mat file is a v7.3 (HDF5) file
+    """
+    import h5py
+    return h5py.is_hdf5(filename)
+
+
+def list_variables(filename):
+    """ List the numeric variables in a .mat file
+
+        :param filename: The file to read
+        :type filename: string
+        :returns: a dictionary mapping variable names to their shapes (in
+            MATLAB's order)
+    """
+    if is_v73(filename):
+        import h5py
+        with h5py.File(filename, 'r') as mat:
+            return dict((name, tuple(reversed(dset.shape)))
+                        for name, dset in mat.items()
+                        if isinstance(dset, h5py.Dataset)
+                        and 'MATLAB_class' in dset.attrs
+                        and _is_numeric(dset.dtype))
+
+    # scipy is slow to import, so only do it when we need to
+    from scipy import io
+    return dict((name, tuple(shape))
+                for name, shape, cls in io.whosmat(filename)
+                if cls not in ('char', 'cell', 'struct', 'object'))
+
+
+def _is_numeric(dtype):
+    """ Check whether a dtype is numeric, or a MATLAB complex type
+    """
+    if dtype.names:
+        return set(dtype.names) == set(('real', 'imag'))
+    return dtype.kind in 'biufc'
+
+
+def _from_hdf5(values):
+    """ Convert values read from a v7.3 file to a numpy array, joining up
+        complex values
+    """
+    if values.dtype.names:
+        return values['real'] + 1j * values['imag']
+    return values
+
+
+def read_variable(filename, name):
+    """ Read a whole variable from a .mat file
+
+        :param filename: The file to read
+        :type filename: string
+        :param name: The name of the variable
+        :type name: string
+        :returns: the variable as an array, with the same shape as in MATLAB
+        :raises KeyError: if the variable isn't in the file
+    """
+    if is_v73(filename):
+        import h5py
+        with h5py.File(filename, 'r') as mat:
+            if name not in mat:
+                raise KeyError('No variable {0} in {1}'.format(name, filename))
+            return _from_hdf5(mat[name][()]).T
+
+    from scipy import io
+    variables = io.loadmat(filename, variable_names=[name])
+    if name not in variables:
+        raise KeyError('No variable {0} in {1}'.format(name, filename))
+    return variables[name]
+
+
+def iter_columns(filename, names, block_size=64):
+    """ Iterate over blocks of columns of matrices in a .mat file
+
+        For v7.3 files only one block is read at a time. Older files are
+        loaded in full, and the blocks are views into them.
+
+        :param filename: The file to read
+        :type filename: string
+        :param names: The names of the matrices to read. These must all have
+            the same number of columns.
+        :type names: sequence of strings
+        :param block_size: The number of columns in each block
+        :type block_size: int
+        :returns: an iterator over (start, blocks) pairs, where start is the
+            index of the first column and blocks is a list with a
+            (n_rows, block_size) array for each name
+    """
+    if is_v73(filename):
+        import h5py
+        with h5py.File(filename, 'r') as mat:
+            dsets = [mat[name] for name in names]
+            n_columns = _n_columns([d.shape[0] for d in dsets], names)
+            for start in range(0, n_columns, block_size):
+                stop = min(start + block_size, n_columns)
+                yield start, [_from_hdf5(d[start:stop]).T for d in dsets]
+    else:
+        matrices = [read_variable(filename, name) for name in names]
+        n_columns = _n_columns([m.shape[1] for m in matrices], names)
+        for start in range(0, n_columns, block_size):
+            yield start, [m[:, start:start + block_size] for m in matrices]
+
+
+def _n_columns(counts, names):
+    """ Check that the matrices all have the same number of columns
+    """
+    if len(set(counts)) != 1:
+        raise ValueError('Matrices {0} have different numbers of columns '
+                         '({1})'.format(', '.join(names), counts))
+    return counts[0]
+
+
+def load_observations(filename, output_name, position=('x', 'y'),
+                      velocity=('u', 'v'), scalars=None, times=None,
+                      block_size=64, **kwargs):
+    """ Load snapshots from a .mat file into an Observations instance
+
+        Each snapshot field should be stored as a matrix with one column
+        per snapshot, with samples in the same order as the position
+        vectors. Position variables can be vectors or grids - grids are
+        flattened in MATLAB order (i.e. `x(:)`).
+
+        :param filename: The .mat file to read
+        :type filename: string
+        :param output_name: The name of the Observations file to create.
+            Any existing file is replaced.
+        :type output_name: string
+        :param position: The names of the position variables, one per axis
+        :type position: sequence of strings
+        :param velocity: The names of the velocity component matrices, one
+            per axis. Optional, set to None to skip velocities.
+        :type velocity: sequence of strings
+        :param scalars: The scalar fields to read. Optional, a dictionary
+            mapping dataset names to matrix names (or a list of names to
+            keep the MATLAB names).
+        :type scalars: dict or sequence of strings
+        :param times: The name of a vector of snapshot times. Optional, if
+            None then snapshots are `snapshot_interval` apart.
+        :type times: string
+        :param block_size: The number of snapshots to copy at a time
+        :type block_size: int
+        :returns: the Observations instance
+
+        Any other keyword arguments are passed on to Observations.
+    """
+    scalars = scalars or {}
+    if not isinstance(scalars, dict):
+        scalars = dict((name, name) for name in scalars)
+    velocity = tuple(velocity or ())
+    if velocity and len(velocity) != len(position):
+        raise ValueError('Need a velocity matrix for each of the {0} position '
+                         'axes'.format(len(position)))
+
+    # Read positions and times, which are small
+    position = numpy.vstack([
+        numpy.ravel(read_variable(filename, name), order='F')
+        for name in position])
+    if times is not None:
+        times = numpy.ravel(read_variable(filename, times))
+
+    # Copy the snapshots over a block at a time
+    scalar_names = sorted(scalars)
+    names = list(velocity) + [scalars[name] for name in scalar_names]
+    if not names:
+        raise ValueError('No velocity or scalar matrices given')
+    n_snapshots = list_variables(filename)[names[0]][1]
+    kwargs.setdefault('n_dimensions', len(position))
+    output = Observations(
+        output_name, n_samples=position.shape[1], n_snapshots=n_snapshots,
+        vector_datasets=('velocity',) if velocity else (),
+        scalar_datasets=scalar_names, update=True, **kwargs)
+    n_vector = len(velocity)
+    for start, blocks in iter_columns(filename, names, block_size):
+        arrays = dict((name, blocks[n_vector + sidx])
+                      for sidx, name in enumerate(scalar_names))
+        if velocity:
+            arrays['velocity'] = blocks[:n_vector]
+        block_times = None if times is None \
+            else times[start:start + blocks[0].shape[1]]
+        output.set_arrays(start, arrays, times=block_times, position=position)
+    return output
+
+
+def save_decomposition(filename, decomposition, positions=None,
+                       v73=False, block_size=64):
+    """ Save the results of a dynamic mode decomposition to a .mat file
+
+        The eigenvalues, amplitudes, modes, frequencies and growth rates are
+        saved, along with the results of `sparsify` if it's been run.
+
+        :param filename: The file to write
+        :type filename: string
+        :param decomposition: The decomposition to save
+        :type decomposition: pydym.dynamic_decomposition
+        :param positions: The positions of the samples, saved as x, y
+            (and z). Optional, defaults to the positions in the
+            decomposition's data if it's an Observations instance.
+        :type positions: array of shape (n_dimensions, n_samples)
+        :param v73: Whether to write a v7.3 (HDF5) file. These are written
+            a block of modes at a time, and can be larger than the 2 GB
+            limit on older formats.
+        :type v73: bool
+        :param block_size: The number of modes to write at a time for v7.3
+            files
+        :type block_size: int
+    """
+    variables = {
+        'eigenvalues': decomposition.eigenvalues,
+        'amplitudes': decomposition.amplitudes,
+        'modes': decomposition.modes,
+        'frequencies': decomposition.frequencies,
+        'growth_rates': decomposition.growth_rates,
+        'dt': numpy.float64(decomposition.dt)}
+    for key in ('polished_amplitudes', 'n_nonzero', 'residual',
+                'performance_loss'):
+        if getattr(decomposition, key, None) is not None:
+            variables[key] = getattr(decomposition, key)
+    if positions is None and isinstance(decomposition.data, Observations):
+        data = decomposition.data
+        positions = [data['position/' + axis] for axis in data.axis_labels]
+    if positions is not None:
+        for label, values in zip(('x', 'y', 'z'), positions):
+            variables[label] = numpy.asarray(values)
+
+    if v73:
+        write_v73(filename, variables, block_size=block_size)
+    else:
+        from scipy import io
+        io.savemat(filename, variables, oned_as='column')
+
+
+def write_v73(filename, variables, block_size=64):
+    """ Write arrays to a MATLAB v7.3 file
+
+        Arrays are written a block of columns at a time, so only one block
+        is ever copied into MATLAB order.
+
+        :param filename: The file to write
+        :type filename: string
+        :param variables: The arrays to write, keyed by name
+        :type variables: dict
+        :param block_size: The number of columns to write at a time
+        :type block_size: int
+    """
+    import h5py
+    with h5py.File(filename, 'w', userblock_size=USERBLOCK_SIZE) as mat:
+        for name, values in variables.items():
+            values = numpy.asarray(values)
+            if values.ndim < 2:
+                # 1D arrays are stored as column vectors
+                values = values.reshape(-1, 1)
+            dtype = values.dtype
+            if dtype.kind == 'c':
+                dtype = numpy.dtype([('real', float), ('imag', float)])
+            elif dtype.kind == 'f':
+                dtype = numpy.dtype(float)
+            elif dtype.kind in 'iu':
+                dtype = numpy.dtype(dtype.kind + '8')
+            elif dtype.kind == 'b':
+                dtype = numpy.dtype('u1')
+            dset = mat.create_dataset(name, shape=values.shape[::-1],
+                                      dtype=dtype)
+            dset.attrs['MATLAB_class'] = \
+                numpy.bytes_(MATLAB_CLASSES[values.dtype.kind])
+            for start in range(0, values.shape[1], block_size):
+                block = values[:, start:start + block_size].T
+                if values.dtype.kind == 'c':
+                    converted = numpy.empty(block.shape, dtype=dtype)
+                    converted['real'], converted['imag'] = \
+                        block.real, block.imag
+                    block = converted
+                dset[start:start + block.shape[0]] = block
+
+    # MATLAB checks the header to tell v7.3 files from older formats
+    header = 'MATLAB 7.3 MAT-file, Platform: GLNXA64, Created on: {0} ' \
+             'HDF5 schema 1.00 .'.format(time.strftime('%a %b %d %H:%M:%S %Y'))
+    with open(filename, 'r+b') as fhandle:
+        fhandle.write(header.encode('ascii').ljust(116)
+                      + struct.pack('<8s', b'')
+                      + struct.pack('<H', 0x0200) + b'IM')
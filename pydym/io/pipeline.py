@@ -0,0 +1,343 @@
+""" file:   pipeline.py (pydym.io)
+
+    description: Streaming pipelines with bounded queues between stages
+"""
+
+from __future__ import division, print_function
+
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+# Markers passed down the queues
+_DONE = object()
+_STOPPED = object()
+
+# How often blocked threads check whether the pipeline has been stopped
+_POLL = 0.05
+
+
+class StageStats(object):
+
+    """ Running totals for a pipeline stage
+
+        :param name: The name of the stage
+        :type name: string
+        :param workers: The number of threads (or processes) running the
+            stage
+        :type workers: int
+    """
+
+    def __init__(self, name, workers=1):
+        super(StageStats, self).__init__()
+        self.name, self.workers = name, workers
+        self.items = 0
+        self.busy = 0.      # seconds spent doing work
+        self.starved = 0.   # seconds spent waiting for input
+        self.blocked = 0.   # seconds spent waiting for room downstream
+        self._lock = threading.Lock()
+
+    def add(self, items=0, busy=0., starved=0., blocked=0.):
+        """ Add to the totals for the stage
+        """
+        with self._lock:
+            self.items += items
+            self.busy += busy
+            self.starved += starved
+            self.blocked += blocked
+
+    def as_dict(self, elapsed):
+        """ Return the stage statistics as a dictionary
+
+            Times are given as fractions of the total thread time available
+            to the stage (elapsed time x number of workers).
+
+            :param elapsed: The wall time the pipeline ran for
+            :type elapsed: float
+        """
+        available = elapsed * self.workers or 1.
+        return OrderedDict([
+            ('workers', self.workers),
+            ('items', self.items),
+            ('throughput', self.items / elapsed if elapsed else 0.),
+            ('busy', self.busy / available),
+            ('starved', self.starved / available),
+            ('blocked', self.blocked / available)])
+
+
+class Pipeline(object):
+
+    """ A chain of processing stages connected by bounded queues
+
+        Each stage runs in its own thread (or threads), taking items off
+        the queue in front of it and putting its results on the queue
+        behind it. The queues are bounded, so a slow stage makes the stages
+        upstream of it block (backpressure) rather than piling up results
+        in memory. The last stage is run by whoever iterates over `run`,
+        so that things like HDF5 writes stay in a single thread.
+
+        Threads are a good fit when stages spend their time in
+        subprocesses, I/O or numpy code which releases the GIL. Stages
+        which are CPU-bound in Python (e.g. parsing) can be run in a pool of
+        worker processes instead by passing `processes=True` to
+        `add_stage` - the stage's threads then just hand items to the pool
+        and wait for the results. The statistics show how much time each
+        stage spends working, waiting for input (starved) and waiting for
+        room downstream (blocked). The stage with the highest busy fraction
+        is the bottleneck.
+
+        :param maxsize: The maximum number of items waiting between each
+            pair of stages
+        :type maxsize: int
+    """
+
+    def __init__(self, maxsize=4):
+        super(Pipeline, self).__init__()
+        self.maxsize = maxsize
+        self.stages = []
+        self.stats = OrderedDict()
+        self.elapsed = None
+        self._stop = None
+        self._errors = []
+        self._pools = {}
+
+    def add_stage(self, name, func, workers=1, processes=False,
+                  initializer=None, initargs=()):
+        """ Add a stage to the pipeline
+
+            :param name: The name of the stage
+            :type name: string
+            :param func: The function for the stage. This is called as
+                func(index, item) for each item coming off the queue, and
+                should return the item for the next stage.
+            :type func: callable
+            :param workers: The number of threads to run the stage in. If
+                this is more than one then items may come out of the stage
+                in a different order to the one they went in.
+            :type workers: int
+            :param processes: Whether to run the stage in a pool of
+                `workers` processes rather than in threads. func has to be
+                picklable (e.g. defined at the top level of a module). If
+                there's only one worker the stage runs in a thread anyway.
+            :type processes: bool
+            :param initializer: A function called with initargs once in
+                each worker process, e.g. to set up state shared by every
+                item. Optional, only used if the stage runs in processes.
+            :type initializer: callable
+            :returns: the pipeline, so calls can be chained
+        """
+        if name in [s[0] for s in self.stages]:
+            raise ValueError('Pipeline already has a stage called '
+                             '{0}'.format(name))
+        self.stages.append((name, func, max(int(workers or 1), 1)))
+        self._pools[name] = (processes, initializer, initargs)
+        return self
+
+    def _start_pools(self):
+        """ Start the process pools for stages which need them
+
+            Pools are started before any threads so that the worker
+            processes are forked from a single-threaded process.
+
+            :returns: a dictionary of pools, keyed by stage name
+        """
+        # Only import this if we need it
+        from concurrent.futures import ProcessPoolExecutor
+
+        pools = {}
+        for name, _, workers in self.stages:
+            processes, initializer, initargs = self._pools[name]
+            if processes and workers > 1:
+                pools[name] = ProcessPoolExecutor(
+                    max_workers=workers, initializer=initializer,
+                    initargs=initargs)
+
+                # The worker processes aren't forked until the first task
+                # is submitted, so submit one now. Otherwise they could be
+                # forked while another stage is starting a subprocess, and
+                # hold on to the pipe it uses to check that the exec worked
+                pools[name].submit(int).result()
+        return pools
+
+    @staticmethod
+    def _in_pool(pool, func):
+        """ Wrap a stage function so that it runs in a process pool
+        """
+        return lambda idx, value: pool.submit(func, idx, value).result()
+
+    def run(self, items, consumer='write'):
+        """ Push the items through the pipeline
+
+            :param items: The items to process. These are read lazily, so
+                this can be a generator.
+            :type items: iterable
+            :param consumer: The name to use in the statistics for the code
+                consuming the results
+            :type consumer: string
+            :returns: an iterator over (index, result) pairs, where index is
+                the position of the item in items. Results come out in the
+                order they're finished.
+        """
+        self.stats = OrderedDict(
+            (name, StageStats(name, workers))
+            for name, _, workers in self.stages)
+        self.stats[consumer] = StageStats(consumer)
+        self._stop = threading.Event()
+        self._errors = []
+        queues = [queue.Queue(self.maxsize)
+                  for _ in range(len(self.stages) + 1)]
+
+        # Start everything up
+        pools = self._start_pools()
+        threads = [threading.Thread(target=self._feed,
+                                    args=(items, queues[0]))]
+        for sidx, (name, func, workers) in enumerate(self.stages):
+            if name in pools:
+                func = self._in_pool(pools[name], func)
+            remaining = [workers, threading.Lock()]
+            n_downstream = (self.stages[sidx + 1][2]
+                            if sidx + 1 < len(self.stages) else 1)
+            for _ in range(workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(func, self.stats[name], queues[sidx],
+                          queues[sidx + 1], remaining, n_downstream)))
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        # Consume the results, stopping everything if anything goes wrong
+        stats, results = self.stats[consumer], queues[-1]
+        start = time.time()
+        try:
+            while True:
+                tic = time.time()
+                item = self._get(results)
+                stats.add(starved=time.time() - tic)
+                if item is _DONE or item is _STOPPED:
+                    break
+                tic = time.time()
+                yield item
+                stats.add(items=1, busy=time.time() - tic)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+            for pool in pools.values():
+                pool.shutdown()
+            self.elapsed = time.time() - start
+        if self._errors:
+            raise self._errors[0]
+
+    def _put(self, target, item):
+        """ Put an item on a queue, giving up if the pipeline is stopped
+        """
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=_POLL)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        """ Get an item from a queue, giving up if the pipeline is stopped
+        """
+        while not self._stop.is_set():
+            try:
+                return source.get(timeout=_POLL)
+            except queue.Empty:
+                continue
+        return _STOPPED
+
+    def _fail(self, err):
+        """ Record an error and stop the pipeline
+        """
+        self._errors.append(err)
+        self._stop.set()
+
+    def _feed(self, items, target):
+        """ Put the items onto the first queue
+        """
+        try:
+            for item in enumerate(items):
+                if not self._put(target, item):
+                    return
+            for _ in range(self.stages[0][2] if self.stages else 1):
+                if not self._put(target, _DONE):
+                    return
+        except Exception as err:  # pylint: disable=W0703
+            self._fail(err)
+
+    def _work(self, func, stats, source, target, remaining, n_downstream):
+        """ Run a stage until its input runs out
+        """
+        try:
+            while True:
+                tic = time.time()
+                item = self._get(source)
+                stats.add(starved=time.time() - tic)
+                if item is _STOPPED:
+                    return
+                elif item is _DONE:
+                    break
+                idx, value = item
+                tic = time.time()
+                result = func(idx, value)
+                stats.add(items=1, busy=time.time() - tic)
+                tic = time.time()
+                if not self._put(target, (idx, result)):
+                    return
+                stats.add(blocked=time.time() - tic)
+
+            # The last worker out tells the next stage we're done
+            with remaining[1]:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                for _ in range(n_downstream):
+                    if not self._put(target, _DONE):
+                        return
+        except Exception as err:  # pylint: disable=W0703
+            self._fail(err)
+
+    @property
+    def bottleneck(self):
+        """ The name of the stage with the highest busy fraction in the last
+            run, or None if the pipeline hasn't been run
+        """
+        if not self.stats or not self.elapsed:
+            return None
+        report = self.report()
+        return max(report, key=lambda name: report[name]['busy'])
+
+    def report(self):
+        """ Return the statistics for each stage from the last run
+
+            :returns: an ordered dictionary of statistics keyed by stage
+                name. See `StageStats.as_dict` for the fields.
+        """
+        elapsed = self.elapsed or 0.
+        return OrderedDict((name, stats.as_dict(elapsed))
+                           for name, stats in self.stats.items())
+
+    def format_report(self):
+        """ Return the statistics from the last run as a table
+        """
+        lines = ['{0:<12}{1:>8}{2:>8}{3:>10}{4:>8}{5:>9}{6:>9}'.format(
+            'stage', 'workers', 'items', 'items/s', 'busy', 'starved',
+            'blocked')]
+        for name, stats in self.report().items():
+            lines.append(
+                '{0:<12}{1[workers]:>8d}{1[items]:>8d}{1[throughput]:>10.2f}'
+                '{1[busy]:>8.0%}{1[starved]:>9.0%}{1[blocked]:>9.0%}'.format(
+                    name, stats))
+        bottleneck = self.bottleneck
+        if bottleneck is not None:
+            lines.append('bottleneck: {0}'.format(bottleneck))
+        return '\n'.join(lines)
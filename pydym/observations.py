@@ -8,88 +8,165 @@
 
 from __future__ import division
 
+import json
 import numpy
-import h5py
 import os
+from functools import partial
 from itertools import product
 from collections import OrderedDict
 
-from .snapshot import Snapshot
+from .snapshot import Snapshot, SnapshotBase, CompactSnapshot
+from .backends import get_backend
+from .backends.memory import MemoryGroup
 from .dynamic_decomposition import dynamic_decomposition
-from .utilities import thinned_length
+from .snapshot_matrix import (SnapshotMatrix, InterleavedMatrix, read_rows,
+                              read_block)
+from .spatial_index import GridIndex, positions_checksum
+from .preprocessing import running_moments, component_scales
+from .summary import STATISTICS, summarise, combine
+from .pod import incremental_svd, FactoredMatrix
+from .quantization import Quantizer
+from .utilities import in_box, in_polygon
 
 AXIS_LABELS = OrderedDict(zip(('x', 'y', 'z'), range(3)))
 
+# Default number of snapshot columns to reserve for resizable datasets, and
+# the maximum number of samples in a single HDF5 chunk
+MIN_CAPACITY = 8
+MAX_CHUNK_SAMPLES = 8192
+
+# Top-level groups and datasets which don't hold vector or scalar data
+RESERVED_GROUPS = ('snapshots', 'properties', 'modes', 'region',
+                   'preprocessing', 'index', 'time', 'spatial_index', 'pod',
+                   'manifest', 'gridded')
+
 
 class Observations(object):
 
     """ A class to store velocity data from a collection of flow visualisations
+
+        Existing files are opened for reading and writing by default. Pass
+        `mode='r'` to open a file read-only, so that several processes can
+        read from the same file at once. Setting `swmr=True` uses HDF5's
+        single-writer/multiple-reader mode: a writer created or opened with
+        `swmr=True` can keep appending snapshots while readers opened with
+        `mode='r', swmr=True` pick up the new data by calling `refresh`.
+
+        Data is stored in an HDF5 file by default. Other storage backends can
+        be selected with the `backend` argument: 'memory' keeps everything
+        in numpy arrays (the filename can be None), and 'npy' stores each
+        dataset as a memory-mapped .npy file in the directory given by
+        filename. See pydym.backends for details.
+
+        Datasets can be stored with lossy quantization to save space and
+        read bandwidth, by passing a dictionary mapping dataset names to
+        quantization specifications as `quantization` when creating the
+        observations, e.g. `{'velocity': {'digits': 4}, 'tracer': {'bits': 8,
+        'range': (0, 1)}}`. See pydym.quantization.Quantizer for the options.
+        Values are dequantized as they're read, except when accessing the
+        raw datasets with `observations[key]`.
     """
 
     def __init__(self, filename, key_on=('velocity',),
                  n_snapshots=None, n_samples=None, n_dimensions=2,
                  vector_datasets=('velocity',), scalar_datasets=tuple(),
                  update=False, thin_by=None, run_checks=True,
-                 snapshot_interval=1, properties=None):
+                 snapshot_interval=1, properties=None, mode='a', swmr=False,
+                 backend='hdf5', quantization=None):
         super(Observations, self).__init__()
+        if mode not in ('r', 'a'):
+            raise ValueError("Unknown mode {0}, should be one of 'r' "
+                             "(read-only) or 'a' (read/write)".format(mode))
+        self.mode, self.swmr = mode, swmr
         self.n_samples, self.n_snapshots = n_samples, n_snapshots
         self.n_dimensions = n_dimensions
         self.snapshot_interval = snapshot_interval
-        self.filename = os.path.abspath(filename)
+        self.filename = os.path.abspath(filename) if filename else None
         self.run_checks = run_checks
         self.vectors, self.scalars = vector_datasets, scalar_datasets
         self.properties = properties
+        self.quantization = quantization or {}
 
         # Set up snapshot datasets
         self.key_on = key_on
         self.thin_by = thin_by
+        self.window = (None, None)
         self.shape = (self.n_samples, self.n_snapshots)
         self.axis_labels = list(AXIS_LABELS.keys())[:self.n_dimensions]
         self._snapshots = None
         self._modes = None
+        self._region = None
+        self._preprocessing, self._unsaved_preprocessing = None, {}
+        self._index = None
+        self._tree = None
+        self._compressed, self._factors = {}, {}
+        self._quantizers, self._quantization_errors = {}, {}
         self._recalc_snapshots, self._positions_filled = None, None
+        self._position_cache = None
 
-        # Initialize HDF5 backend file
-        self._file = None
-        if os.path.exists(filename) and not update:
+        # Initialize storage backend
+        self._backend = get_backend(backend)
+        self._store = None
+        if self._backend.exists(self.filename) and not update:
             self._init_from_file()
         elif filename and self.n_samples is None:
             # We obviously wanted a file but it can't be found
             raise IOError("Can't find {0}".format(filename))
+        elif self.mode == 'r':
+            raise IOError("Can't create {0} in read-only mode".format(
+                filename))
         else:
             self._init_from_arguments()
 
     def _init_from_file(self):
-        """ Initialize the FlowData object from an HDF5 resource
+        """ Initialize the FlowData object from an existing store
         """
-        self._file = h5py.File(self.filename, 'a')
+        self._store = self._backend(self.filename, self.mode, self.swmr)
         self.properties = self['properties']
         for attr in ('shape', 'n_samples', 'n_snapshots', 'snapshot_interval'):
             setattr(self, attr, self.properties[attr][()])
         self.n_dimensions = len(self['position'])
         self.axis_labels = tuple(self['position'].keys())
-        self.vectors = [n for n, v in self._file.items()
-                        if isinstance(v, h5py.Group)
-                        and n not in ('snapshots', 'properties')]
-        self.scalars = [n for n, v in self._file.items()
-                        if isinstance(v, h5py.Dataset)]
+        self.vectors = [n for n, v in self._store.items()
+                        if self._store.is_group(v)
+                        and n not in RESERVED_GROUPS]
+        self.scalars = [n for n, v in self._store.items()
+                        if self._store.is_dataset(v)
+                        and n not in RESERVED_GROUPS]
+        self._positions_filled = self.n_snapshots > 0
+        if 'region/index' in self._store:
+            self._region = numpy.asarray(self['region/index'][:])
+        if 'index' in self._store:
+            self._index = self['index']
+        if 'pod' in self._store:
+            self._load_compressed()
+        if self.swmr and self.writable:
+            self._store.start_swmr()
 
     def _init_from_arguments(self):
         """ Initialize the FlowData object from the arguments given to __init__
+
+            If n_snapshots is None, then the snapshot axis starts out empty
+            and grows as snapshots are added with `append`.
         """
         # Check inputs to __init__ are specced
-        if any((s is None for s in self.shape)):
+        if self.n_samples is None:
             raise ValueError('You must specify a shape for a new FlowData '
                              'object created from scratch')
+        if self.n_snapshots is None:
+            self.n_snapshots = 0
+            self.shape = (self.n_samples, self.n_snapshots)
+        for key in self.quantization:
+            if key not in list(self.vectors) + list(self.scalars):
+                raise ValueError("Can't quantize {0}, it's not one of the "
+                                 "vector or scalar datasets".format(key))
 
-        # Create file - ensure any existing files are deleted (which may be the
+        # Create store - any existing files are removed (which may be the
         # case if update=True in __init__)
-        if os.path.exists(self.filename):
-            os.remove(self.filename)
-        self._file = h5py.File(self.filename, 'w')
+        self._store = self._backend(self.filename, 'w', self.swmr)
 
         # Generate positions
-        grp = self._file.create_group('position')
+        grp = self._store.create_group('position')
         for axis_label in self.axis_labels:
             grp.require_dataset(name=axis_label,
                                 shape=(self.n_samples,),
@@ -97,24 +174,36 @@ class Observations(object):
                                 compression="gzip")
         self._positions_filled = False
 
-        # Map out other vector datasets
+        # Map out other vector datasets. The snapshot axis is unlimited so
+        # that we can append snapshots later
+        capacity = max(self.n_snapshots, MIN_CAPACITY)
+        chunks = (min(self.n_samples, MAX_CHUNK_SAMPLES), MIN_CAPACITY)
         for dset_name in self.vectors:
-            grp = self._file.create_group(dset_name)
+            grp = self._store.create_group(dset_name)
+            quantizer = Quantizer.from_spec(self.quantization.get(dset_name))
             for axis_label in self.axis_labels:
-                grp.require_dataset(name=axis_label,
-                                    shape=self.shape,
-                                    dtype=float,
-                                    compression="gzip")
+                dset = grp.require_dataset(name=axis_label,
+                                           shape=(self.n_samples, capacity),
+                                           maxshape=(self.n_samples, None),
+                                           chunks=chunks,
+                                           compression="gzip",
+                                           **quantizer.dataset_options())
+                quantizer.write_attrs(dset.attrs)
 
         # Map out scalar datasets
         for dset_name in self.scalars:
-            self._file.require_dataset(name=dset_name,
-                                       shape=self.shape,
-                                       dtype=float,
-                                       compression="gzip")
+            quantizer = Quantizer.from_spec(self.quantization.get(dset_name))
+            dset = self._store.require_dataset(
+                name=dset_name,
+                shape=(self.n_samples, capacity),
+                maxshape=(self.n_samples, None),
+                chunks=chunks,
+                compression="gzip",
+                **quantizer.dataset_options())
+            quantizer.write_attrs(dset.attrs)
 
         # Add properties to file
-        grp = self._file.create_group('properties')
+        grp = self._store.create_group('properties')
         attrs_to_add = ('shape', 'n_samples', 'n_snapshots',
                         'n_dimensions', 'snapshot_interval')
         for attr in attrs_to_add:
@@ -126,18 +215,219 @@ class Observations(object):
                 grp[key] = value
         self.properties = grp
 
+        # Make the time coordinate
+        self._create_time(capacity)
+
+        # Make an empty index for the summary statistics
+        self._index = self._create_index(self._store.require_group('index'),
+                                         capacity)
+
+        # Once SWMR is switched on we can't make new objects in the file, so
+        # everything needs to be set up before we get here
+        if self.swmr:
+            self._store.start_swmr()
+
+    @classmethod
+    def from_arrays(cls, filename, position, datasets, times=None,
+                    block_size=256, **kwargs):
+        """ Create observations from arrays holding every snapshot
+
+            Datasets with three dimensions are vectors, with shape
+            (n_dimensions, n_samples, n_snapshots), and datasets with two
+            dimensions are scalars with shape (n_samples, n_snapshots). The
+            arrays can be memory-mapped (e.g. with `numpy.load(...,
+            mmap_mode='r')`) - they're only read a block of snapshots at a
+            time.
+
+            :param filename: The file to create. Any existing file is
+                replaced.
+            :type filename: string
+            :param position: The sample positions
+            :type position: array of shape (n_dimensions, n_samples)
+            :param datasets: The snapshot data, keyed by dataset name
+            :type datasets: dict
+            :param times: The time of each snapshot. Optional, defaults to
+                snapshots `snapshot_interval` apart.
+            :type times: array
+            :param block_size: The number of snapshots to write at a time.
+                This is rounded to a whole number of HDF5 chunks.
+            :type block_size: int
+            :returns: the Observations instance
+
+            Any other keyword arguments are passed on to Observations.
+        """
+        position = numpy.asarray(position, dtype=float)
+        vectors = sorted(k for k, v in datasets.items() if numpy.ndim(v) == 3)
+        scalars = sorted(k for k, v in datasets.items() if numpy.ndim(v) == 2)
+        if len(vectors) + len(scalars) != len(datasets):
+            raise ValueError('Datasets should have two dimensions (scalars) '
+                             'or three dimensions (vectors)')
+        n_snapshots = set(numpy.shape(v)[-1] for v in datasets.values())
+        if len(n_snapshots) != 1:
+            raise ValueError('Datasets have different numbers of snapshots '
+                             '({0})'.format(sorted(n_snapshots)))
+        n_snapshots = n_snapshots.pop()
+        kwargs.setdefault('update', True)
+        observations = cls(filename, n_samples=position.shape[1],
+                           n_snapshots=n_snapshots,
+                           n_dimensions=len(position),
+                           vector_datasets=vectors, scalar_datasets=scalars,
+                           **kwargs)
+
+        # Blocks which line up with the chunks are written in one go
+        block_size = max(block_size // MIN_CAPACITY, 1) * MIN_CAPACITY
+        for start in range(0, n_snapshots, block_size):
+            stop = min(start + block_size, n_snapshots)
+            observations.set_arrays(
+                start,
+                dict((k, v[..., start:stop]) for k, v in datasets.items()),
+                times=None if times is None else times[start:stop],
+                position=position)
+        return observations
+
+    @classmethod
+    def from_npy_directory(cls, filename, directory, block_size=256,
+                           **kwargs):
+        """ Create observations from a directory of .npy stacks
+
+            The directory should hold `position.npy`, with shape
+            (n_dimensions, n_samples), and a .npy file for each dataset
+            named after the dataset, shaped as for `from_arrays`. If there's
+            a `time.npy` it's used for the snapshot times. The files are
+            memory-mapped rather than loaded.
+
+            :param filename: The file to create. Any existing file is
+                replaced.
+            :type filename: string
+            :param directory: The directory with the .npy files
+            :type directory: string
+            :param block_size: The number of snapshots to write at a time
+            :type block_size: int
+            :returns: the Observations instance
+
+            Any other keyword arguments are passed on to Observations.
+        """
+        arrays = {}
+        for fname in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(fname)
+            if ext == '.npy':
+                arrays[name] = numpy.load(os.path.join(directory, fname),
+                                          mmap_mode='r')
+        if 'position' not in arrays:
+            raise IOError('No position.npy in {0}'.format(directory))
+        position = arrays.pop('position')
+        times = arrays.pop('time', None)
+        return cls.from_arrays(filename, position, arrays, times=times,
+                               block_size=block_size, **kwargs)
+
+    @classmethod
+    def from_text_dumps(cls, filename, files, position=('x', 'y'),
+                        vectors=None, scalars=None, time='t', workers=None,
+                        block_size=64, **kwargs):
+        """ Create observations from text dumps, one file per snapshot
+
+            Each file should have a header naming its columns, in the same
+            style as Gerris output (`# 1:t 2:x 3:y ...`). Parsing the text is
+            the slow bit, so files can be parsed in a pool of worker
+            processes. Parsed snapshots are written a block at a time, in
+            the order the files are given.
+
+            :param filename: The file to create. Any existing file is
+                replaced.
+            :type filename: string
+            :param files: The files to read
+            :type files: sequence of strings
+            :param position: The columns with the sample positions
+            :type position: sequence of strings
+            :param vectors: The columns for each vector dataset. Optional,
+                defaults to `{'velocity': ('U', 'V')}`.
+            :type vectors: dict
+            :param scalars: The column for each scalar dataset. Optional,
+                defaults to `{'pressure': 'P', 'tracer': 'T'}`.
+            :type scalars: dict
+            :param time: The column with the snapshot time. Optional, if None
+                then snapshots are `snapshot_interval` apart.
+            :type time: string
+            :param workers: The number of processes to parse files in.
+                Optional, defaults to parsing in this process.
+            :type workers: int
+            :param block_size: The number of snapshots to write at a time
+            :type block_size: int
+            :returns: the Observations instance
+
+            Any other keyword arguments are passed on to Observations.
+        """
+        # Avoid a circular import, the readers need Observations
+        from .io.gerris import read_table
+        from .utilities import bounded_map
+
+        files = list(files)
+        if not files:
+            raise ValueError("Can't create observations without any files")
+        if vectors is None:
+            vectors = {'velocity': ('U', 'V')}
+        if scalars is None:
+            scalars = {'pressure': 'P', 'tracer': 'T'}
+        vector_names, scalar_names = sorted(vectors), sorted(scalars)
+        columns = list(position)
+        for name in vector_names:
+            columns.extend(vectors[name])
+        columns.extend(scalars[name] for name in scalar_names)
+        if time is not None:
+            columns.append(time)
+
+        # Files come back from the workers in any order, so hold on to them
+        # until we have a full block to write
+        observations, parsed, start = None, {}, 0
+        results = bounded_map(read_table, ((f, columns) for f in files),
+                              workers=workers)
+        for idx, data in results:
+            parsed[idx] = data
+            if observations is None:
+                kwargs.setdefault('update', True)
+                observations = cls(
+                    filename, n_samples=data.shape[1],
+                    n_snapshots=len(files), n_dimensions=len(position),
+                    vector_datasets=vector_names,
+                    scalar_datasets=scalar_names, **kwargs)
+            while start < len(files):
+                stop = min(start + block_size, len(files))
+                if any(i not in parsed for i in range(start, stop)):
+                    break
+                block = numpy.dstack([parsed.pop(i)
+                                      for i in range(start, stop)])
+                positions = block[:len(position)]
+                if observations.run_checks and not numpy.allclose(
+                        positions, positions[..., :1]):
+                    raise ValueError('Files {0} to {1} do not all have the '
+                                     'same positions'.format(files[start],
+                                                             files[stop - 1]))
+                arrays, offset = {}, len(position)
+                for name in vector_names:
+                    n_components = len(vectors[name])
+                    arrays[name] = block[offset:offset + n_components]
+                    offset += n_components
+                for name in scalar_names:
+                    arrays[name] = block[offset]
+                    offset += 1
+                observations.set_arrays(
+                    start, arrays, position=positions[..., 0],
+                    times=None if time is None else block[offset, 0])
+                start = stop
+        return observations
+
     def __getitem__(self, value_or_key):
         """ Get the data associated with a given index or key
 
             If value_or_key is an integer index, return the Snapshot object
             associated with that snapshot. If value_or_key is a string, return
-            the h5py.Dataset object for that string.
+            the dataset (e.g. an h5py.Dataset) or group for that string.
         """
         if isinstance(value_or_key, int):
             return self.get_snapshot(value_or_key)
         else:
             try:
-                return self._file[value_or_key]
+                return self._store[value_or_key]
             except KeyError:
                 raise KeyError("Can't find item {0}".format(value_or_key))
 
@@ -148,9 +438,13 @@ class Observations(object):
 
     def __iter__(self):
         """ Iterate over the data snapshots
+
+            Snapshots are read a block at a time, but each one is an
+            ordinary pydym.Snapshot with its own copy of the data. Use
+            `iter_snapshots` for compact snapshots which share memory.
         """
-        for idx in range(self.n_snapshots):
-            yield self.get_snapshot(idx)
+        for snapshot in self.iter_snapshots():
+            yield snapshot.to_snapshot()
 
     def __enter__(self):
         """ On with block entry, just initialize self
@@ -163,13 +457,21 @@ class Observations(object):
         self.close()
 
     def close(self):
-        """ Close the underlying HDF5 file
+        """ Close the underlying storage
+
+            Any spare capacity reserved on the snapshot axis is trimmed off
+            before the file is closed. Closing observations which are
+            already closed (or were never opened) does nothing.
         """
+        store = getattr(self, '_store', None)
+        if store is None or not store.is_open:
+            return
         try:
-            self._file.close()
-        except ValueError:
-            # Gets raised when file already closed or doesn't exist
-            pass
+            if self.writable and not self.swmr:
+                self.trim()
+                self._save_quantization_errors()
+        finally:
+            store.close()
 
     def __del__(self):
         self.close()
@@ -177,23 +479,82 @@ class Observations(object):
     def keys(self):
         """ Return an iterator over the available keys
         """
-        return self._file.keys()
+        return self._store.keys()
 
     def items(self):
         """ Return an iterator over the datasets keys and HDF5 datasets
         """
-        return self._file.items()
+        return self._store.items()
 
     def values(self):
         """ Return an iterator over the top-level HDF5 datasets and groups
         """
-        return self._file.values()
+        return self._store.values()
+
+    @property
+    def writable(self):
+        """ Whether we can write snapshots to the observations
+        """
+        return self.mode != 'r'
+
+    @property
+    def backend_name(self):
+        """ The name of the storage backend, as passed to Observations
+        """
+        return self._backend.name
+
+    def refresh(self):
+        """ Pick up any snapshots appended by a writer since the file was
+            opened or last refreshed.
+
+            This is only needed for readers opened with `swmr=True` - it's a
+            no-op otherwise.
+
+            :returns: the number of new snapshots available
+        """
+        if not self.swmr or self.writable:
+            return 0
+        for key in ('n_snapshots', 'shape'):
+            self.properties[key].refresh()
+        for key in self._stored_datasets:
+            self[key].refresh()
+        if self._index is not None and self._store.is_group(self._index):
+            for field, stat in product(self.index_fields, STATISTICS):
+                self._index[field + '/' + stat].refresh()
+        if 'time' in self._store:
+            self['time'].refresh()
+        n_new = self.properties['n_snapshots'][()] - self.n_snapshots
+        if n_new:
+            self.n_snapshots = self.properties['n_snapshots'][()]
+            self.shape = (self.n_samples, self.n_snapshots)
+            self._recalc_snapshots = True
+            self._position_cache = None
+        return n_new
 
     @property
     def snapshots(self):
-        """ Returns the snapshot array for the data
+        """ Returns the snapshot matrix for the data
+
+            This is a lazy SnapshotMatrix view with the current time window,
+            thinning, region of interest and preprocessing applied, so
+            nothing is read until it's indexed.
         """
-        if self._snapshots is None:
+        snapshots = self._snapshot_source()
+        start, stop = self.window
+        snapshots = snapshots.select(start, stop, self.thin_by)
+        if self._region is not None:
+            snapshots = snapshots.select_samples(self._region)
+        if self._preprocessing is not None:
+            n_samples = self.n_samples
+            snapshots = snapshots.normalize(
+                offset=self._preprocessing['mean'],
+                scale=numpy.tile(self._preprocessing['scale'], n_samples))
+        return snapshots
+
+    def _snapshot_source(self):
+        """ Return the full snapshot matrix, generating it if required
+        """
+        if self._snapshots is None or self._recalc_snapshots:
             self.generate_snapshots()
         return self._snapshots
 
@@ -205,13 +566,477 @@ class Observations(object):
             self.generate_modes()
         return self._modes
 
-    def get_snapshot(self, index):
+    @property
+    def region(self):
+        """ The sorted indices of the samples in the current region of
+            interest, or None if all samples are used
+        """
+        return self._region
+
+    @property
+    def positions(self):
+        """ The positions of the samples in the current region of interest
+
+            This is a read-only array with shape (n_dimensions, n_samples),
+            shared with the snapshots from `iter_snapshots`.
+        """
+        return self._shared_position()
+
+    def set_region(self, box=None, polygon=None, mask=None):
+        """ Restrict analysis to a spatial region of interest
+
+            Once a region is set, `get_snapshot`, `snapshots` and so
+            `dynamic_decomposition` only read the samples inside the region.
+            The sample index is stored in the file (as 'region/index') so it
+            persists when the file is reloaded. The underlying data isn't
+            changed.
+
+            Specify exactly one of:
+
+            :param box: The bounding box for the region, either as a
+                dictionary with keys 'left', 'right', 'top' and 'bottom', or a
+                sequence (left, right, top, bottom)
+            :param polygon: The vertices of a polygon bounding the region
+            :type polygon: array of shape (n_vertices, 2)
+            :param mask: A boolean mask of length n_samples which is True for
+                samples in the region
+            :returns: the sorted array of sample indices in the region
+        """
+        if sum(a is not None for a in (box, polygon, mask)) != 1:
+            raise ValueError('Specify exactly one of box, polygon or mask')
+        if mask is None:
+            points = numpy.column_stack([self['position/' + axis][:]
+                                         for axis in self.axis_labels])
+            if polygon is not None:
+                mask = in_polygon(points, polygon)
+            elif isinstance(box, dict):
+                mask = in_box(points, **box)
+            else:
+                mask = in_box(points, *box)
+        mask = numpy.asarray(mask, dtype=bool)
+        if mask.shape != (self.n_samples,):
+            raise ValueError('Region mask should have one entry per sample')
+        self._set_region(numpy.flatnonzero(mask))
+        return self._region
+
+    def clear_region(self):
+        """ Remove the region of interest, so that all samples are used
+        """
+        self._set_region(None)
+
+    def _set_region(self, index):
+        """ Set the region index, storing it if we can
+        """
+        self._region = index
+        self._position_cache = None
+        if self.writable and not self.swmr:
+            if 'region' in self._store:
+                del self._store['region']
+            if index is not None:
+                self._store.create_group('region')
+                self._store['region/index'] = index
+
+    @property
+    def preprocessing(self):
+        """ The statistics used to center and normalize the snapshot matrix,
+            or None if the snapshots are used as-is
+
+            This is a dictionary containing the 'mean' and 'variance' of each
+            row of the snapshot matrix, and the 'scale' for each component.
+        """
+        self._snapshot_source()
+        return self._preprocessing
+
+    def set_preprocessing(self, center=True, normalize=True, block_size=64):
+        """ Center and/or normalize the snapshot matrix
+
+            The mean and variance of each row of the snapshot matrix are
+            calculated in a single streaming pass over blocks of snapshots,
+            and stored in the file under 'preprocessing/<snapshot key>'
+            (or kept in memory if the file can't be written to).
+            From then on, the temporal mean is subtracted from each row
+            (if center is True) and each dataset is divided by its RMS value
+            (if normalize is True) as the snapshot matrix is read. A centered
+            copy of the data is never made.
+
+            The statistics are calculated over all the stored snapshots, so
+            call this again after adding new snapshots.
+
+            :param center: Whether to subtract the temporal mean from each
+                row. Optional, defaults to True.
+            :type center: bool
+            :param normalize: Whether to scale each dataset (e.g. velocity,
+                pressure) by its RMS value so they have similar magnitudes.
+                Optional, defaults to True.
+            :type normalize: bool
+            :param block_size: The number of snapshots to read at once
+            :type block_size: int
+            :returns: the statistics, as for `preprocessing`
+        """
+        source = self._snapshot_source()
+        _, mean, variance = running_moments(
+            block for _, block in source.iter_blocks(block_size))
+        if normalize:
+            scale = component_scales(mean, variance, source.keys, center)
+        else:
+            scale = numpy.ones(len(source.keys))
+        stats = {
+            'mean': mean if center else numpy.zeros_like(mean),
+            'variance': variance,
+            'scale': scale
+        }
+
+        # Store stats if we can
+        key = 'preprocessing/' + self.snapshot_dataset_key
+        if self.writable and not self.swmr:
+            if key in self._store:
+                del self._store[key]
+            grp = self._store.require_group(key)
+            for name, values in stats.items():
+                grp[name] = values
+        else:
+            self._unsaved_preprocessing[self.snapshot_dataset_key] = stats
+        self._preprocessing = stats
+        return stats
+
+    def clear_preprocessing(self):
+        """ Use the snapshot matrix without any centering or normalization
+        """
+        key = 'preprocessing/' + self.snapshot_dataset_key
+        if self.writable and not self.swmr and key in self._store:
+            del self._store[key]
+        self._unsaved_preprocessing.pop(self.snapshot_dataset_key, None)
+        self._preprocessing = None
+
+    def _load_preprocessing(self):
+        """ Load any stored preprocessing statistics for the current snapshot
+            matrix
+
+            Statistics which couldn't be stored (because the file is
+            read-only or being read with SWMR) are kept in memory instead.
+        """
+        key = 'preprocessing/' + self.snapshot_dataset_key
+        if key not in self._store:
+            return self._unsaved_preprocessing.get(self.snapshot_dataset_key)
+        return dict((name, numpy.asarray(self[key + '/' + name][:]))
+                    for name in ('mean', 'variance', 'scale'))
+
+    @property
+    def index_fields(self):
+        """ The fields which have summary statistics in the index
+
+            These are the components of each vector dataset (e.g.
+            'velocity/x'), the magnitude of each vector dataset (e.g.
+            'velocity/magnitude') and each scalar dataset.
+        """
+        fields = []
+        for dset in (v for v in self.vectors if v != 'position'):
+            fields.extend(dset + '/' + axis for axis in self.axis_labels)
+            fields.append(dset + '/magnitude')
+        return fields + list(self.scalars)
+
+    def _create_index(self, group, capacity):
+        """ Create empty datasets for the summary statistics in the given
+            group
+        """
+        for field, stat in product(self.index_fields, STATISTICS):
+            dset = group.create_dataset(field + '/' + stat,
+                                        shape=(capacity,),
+                                        maxshape=(None,),
+                                        chunks=(MIN_CAPACITY,),
+                                        dtype=float)
+            dset[:] = numpy.nan
+        return group
+
+    def build_index(self, block_size=64):
+        """ Calculate the summary statistics for every snapshot
+
+            The index is kept up to date by `set_snapshot`, so this is only
+            needed for files written before the index existed. If the file is
+            read-only the index is built in memory.
+
+            :param block_size: The number of snapshots to read at once
+            :type block_size: int
+        """
+        if self.writable and not self.swmr:
+            if 'index' in self._store:
+                del self._store['index']
+            index = self._create_index(self._store.require_group('index'),
+                                       self.capacity)
+        else:
+            index = self._create_index(MemoryGroup('/index'),
+                                       self.n_snapshots)
+
+        # Read through the data in blocks of snapshots
+        for start in range(0, self.n_snapshots, block_size):
+            stop = min(start + block_size, self.n_snapshots)
+            summaries = {}
+            for dset in (v for v in self.vectors if v != 'position'):
+                magnitude = 0
+                for axis in self.axis_labels:
+                    values = self._read_block(dset + '/' + axis,
+                                              range(self.n_samples),
+                                              range(start, stop))
+                    summaries[dset + '/' + axis] = summarise(values, axis=0)
+                    magnitude = magnitude + values ** 2
+                summaries[dset + '/magnitude'] = \
+                    summarise(numpy.sqrt(magnitude), axis=0)
+            for dset in self.scalars:
+                values = self._read_block(dset, range(self.n_samples),
+                                          range(start, stop))
+                summaries[dset] = summarise(values, axis=0)
+            for field, stats in summaries.items():
+                for stat, values in stats.items():
+                    index[field + '/' + stat][start:stop] = values
+        self._index = index
+
+    def snapshot_statistics(self, field, statistic=None):
+        """ Return summary statistics for each snapshot from the index
+
+            No snapshot data is read, unless the index has to be built first.
+            Statistics are over all the samples, whatever the current region
+            of interest.
+
+            :param field: The field to look up, one of `index_fields`
+            :type field: str
+            :param statistic: The statistic to return - one of 'min', 'max',
+                'mean' or 'l2' (the L2 norm). Optional, if None then all
+                statistics are returned.
+            :type statistic: str
+            :returns: an array with one value per snapshot, or a dictionary
+                of arrays if statistic is None. Snapshots which haven't been
+                set are NaN.
+        """
+        if field not in self.index_fields:
+            raise KeyError('No index for {0}, should be one of {1}'.format(
+                field, self.index_fields))
+        if self._index is None:
+            self.build_index()
+        if statistic is None:
+            return dict((stat, self.snapshot_statistics(field, stat))
+                        for stat in STATISTICS)
+        elif statistic not in STATISTICS:
+            raise KeyError('Unknown statistic {0}, should be one of '
+                           '{1}'.format(statistic, STATISTICS))
+        key = field + '/' + statistic
+        return numpy.asarray(self._index[key][:self.n_snapshots])
+
+    def summary(self, field=None):
+        """ Return summary statistics over all snapshots
+
+            For example, `data.summary('pressure')` gives the global range of
+            the pressure field, which is handy for setting colour scales.
+
+            :param field: The field to summarise. Optional, if None then
+                a dictionary with the summary for each field is returned.
+            :type field: str
+            :returns: a dictionary with the 'min', 'max', 'mean' and 'l2'
+                values for the field
+        """
+        if field is None:
+            return dict((f, self.summary(f)) for f in self.index_fields)
+        return combine(self.snapshot_statistics(field))
+
+    def find_snapshots(self, field, statistic='max', above=None, below=None):
+        """ Find the snapshots where a statistic lies in the given range
+
+            For example, `data.find_snapshots('velocity/magnitude',
+            above=2)` returns the snapshots with a maximum speed above 2.
+
+            :param field: The field to look up, one of `index_fields`
+            :type field: str
+            :param statistic: The statistic to compare. Optional, defaults
+                to 'max'.
+            :type statistic: str
+            :param above: Only return snapshots where the statistic is
+                greater than this. Optional.
+            :param below: Only return snapshots where the statistic is less
+                than this. Optional.
+            :returns: an array of snapshot indices
+        """
+        values = self.snapshot_statistics(field, statistic)
+        mask = ~numpy.isnan(values)
+        if above is not None:
+            mask &= values > above
+        if below is not None:
+            mask &= values < below
+        return numpy.flatnonzero(mask)
+
+    @property
+    def spatial_index(self):
+        """ A spatial index over the sample positions
+
+            The index is stored in the file (under 'spatial_index') as
+            plain arrays, along with a checksum of the positions it was
+            built for. It's loaded if the checksum matches the current
+            positions, and rebuilt (and stored again, if we can) if not.
+
+            :returns: a pydym.spatial_index.GridIndex over all the samples
+                (ignoring any region of interest)
+        """
+        if self._tree is None:
+            positions = numpy.vstack([self['position/' + axis][:]
+                                      for axis in self.axis_labels])
+            checksum = positions_checksum(positions)
+            self._tree = self._load_spatial_index(positions, checksum)
+            if self._tree is None:
+                self._tree = GridIndex.build(positions)
+                if self.writable and not self.swmr:
+                    self._save_spatial_index(self._tree, checksum)
+        return self._tree
+
+    def _load_spatial_index(self, positions, checksum):
+        """ Load the stored spatial index, if there is one and it matches
+            the given positions
+        """
+        if 'spatial_index' not in self._store:
+            return None
+        grp = self['spatial_index']
+        if grp.attrs.get('checksum') != checksum \
+                or any(name not in grp for name in GridIndex.ARRAYS):
+            return None
+        try:
+            return GridIndex(positions, *[grp[name][:]
+                                          for name in GridIndex.ARRAYS])
+        except ValueError:
+            return None
+
+    def _save_spatial_index(self, index, checksum):
+        """ Store a spatial index, replacing any existing one
+        """
+        if 'spatial_index' in self._store:
+            del self._store['spatial_index']
+        grp = self._store.create_group('spatial_index')
+        for name in GridIndex.ARRAYS:
+            grp[name] = numpy.asarray(getattr(index, name))
+        grp.attrs['checksum'] = checksum
+
+    def nearest(self, points):
+        """ Find the samples nearest to the given points
+
+            :param points: The points to look up
+            :type points: array with shape (n_points, n_dimensions)
+            :returns: the distance to the nearest sample and the index of
+                that sample, for each point
+        """
+        points = numpy.atleast_2d(numpy.asarray(points, dtype=float))
+        distances, samples = self.spatial_index.query(points)
+        return distances, samples
+
+    def probe(self, points, times=None, datasets=None):
+        """ Extract time series at the samples nearest to some probe points
+
+            For each dataset, only the rows for the nearest samples are read,
+            with one (hyperslab) read covering all the requested snapshots.
+
+            :param points: The probe locations
+            :type points: array with shape (n_points, n_dimensions)
+            :param times: The times to extract. Each time is matched to the
+                nearest snapshot in time. Optional, defaults to all the
+                snapshots.
+            :type times: array of floats
+            :param datasets: The datasets to extract, as given by
+                `snapshot_datasets` (e.g. 'velocity/x' or 'pressure').
+                Optional, defaults to all of them.
+            :type datasets: list of strings
+            :returns: a dictionary mapping each dataset to an array of shape
+                (n_points, n_times). The 'time' key gives the times of the
+                snapshots used, 'sample' gives the index of the nearest
+                sample to each point and 'distance' the distance to it.
+        """
+        distances, samples = self.nearest(points)
+        rows, inverse = numpy.unique(samples, return_inverse=True)
+
+        # Work out which snapshots we need
+        all_times = self._time_coordinate()
+        if times is None:
+            columns = range(self.n_snapshots)
+        else:
+            columns = self._nearest_snapshots(all_times, times)
+
+        # Read each dataset in one pass
+        if datasets is None:
+            datasets = self.snapshot_datasets
+        result = {
+            'time': all_times[numpy.asarray(columns, dtype=int)],
+            'sample': samples,
+            'distance': distances
+        }
+        for key in datasets:
+            if key not in self.snapshot_datasets:
+                raise KeyError('Unknown dataset {0}, should be one of '
+                               '{1}'.format(key, self.snapshot_datasets))
+            block = self._read_block(key, rows, columns)
+            result[key] = block[inverse.ravel()]
+        return result
+
+    @staticmethod
+    def _nearest_snapshots(all_times, times):
+        """ Return the index of the snapshot closest to each of the given
+            times
+
+            :param all_times: The sorted times of all the snapshots
+            :param times: The times to look up
+        """
+        times = numpy.atleast_1d(numpy.asarray(times, dtype=float))
+        if len(all_times) == 0:
+            raise ValueError('No snapshots to probe')
+        elif len(all_times) == 1:
+            return numpy.zeros(len(times), dtype=int)
+        right = numpy.clip(numpy.searchsorted(all_times, times), 1,
+                           len(all_times) - 1)
+        left = right - 1
+        closer_left = \
+            abs(times - all_times[left]) <= abs(all_times[right] - times)
+        return numpy.where(closer_left, left, right)
+
+    def _read_samples(self, key, column=None):
+        """ Read the data for the samples in the current region from the
+            given dataset
+
+            :param key: The dataset to read from
+            :param column: The snapshot to read. Optional, if None then the
+                dataset is treated as 1D (e.g. positions).
+        """
+        if key in self._compressed:
+            rows = self._region if self._region is not None \
+                else range(self.n_samples)
+            return self._read_block(key, rows, column)
+        dset, decode = self[key], self._quantizer(key).decode
+        if self._region is not None:
+            return decode(read_rows(dset, self._region, column))
+        elif column is None:
+            return decode(dset[:])
+        return decode(dset[:, column])
+
+    def get_snapshot(self, index, compact=False):
         """ Get the snapshot associated with the given index
+
+            If a region of interest is set, the snapshot only contains the
+            samples in that region.
+
+            :param index: The index of the snapshot
+            :type index: int
+            :param compact: Whether to return a pydym.CompactSnapshot, which
+                shares its positions with the other snapshots and keeps all
+                its fields in one buffer. Optional, defaults to False.
+            :type compact: bool
         """
+        if compact:
+            layout, keys = self._snapshot_layout()
+            buffer = numpy.empty((len(keys), self._n_region_samples))
+            for row, key in enumerate(keys):
+                buffer[row] = self._read_samples(key, index)
+            return CompactSnapshot(
+                self._shared_position(), buffer, layout,
+                time=self._time_coordinate()[index],
+                properties=self._snapshot_properties())
+
         # Reconstruct Snapshot
         snapshot = Snapshot(
-            position=numpy.vstack([self['position/x'],
-                                   self['position/y']]))
+            position=numpy.vstack([self._read_samples('position/' + axis)
+                                   for axis in self.axis_labels]))
+        n_samples = len(snapshot)
 
         # Add other scalar and vector fields
         remaining_vectors = [v for v in self.vectors
@@ -219,60 +1044,523 @@ class Observations(object):
         for vector in remaining_vectors:
             vec_data = numpy.empty(
                 shape=(self.n_dimensions,
-                       self.n_samples,
-                       self.n_snapshots))
+                       n_samples))
             for dim_index in range(self.n_dimensions):
                 key = vector + '/' + self.axis_labels[dim_index]
-                vec_data[dim_index] = self[key][:, index]
+                vec_data[dim_index] = self._read_samples(key, index)
             setattr(snapshot, vector, vec_data)
 
         for scalar in self.scalars:
-            setattr(snapshot, scalar, numpy.asarray(self[scalar][:, index]))
+            setattr(snapshot, scalar, self._read_samples(scalar, index))
+        snapshot.time = self._time_coordinate()[index]
 
         # Add properties
-        setattr(snapshot, 'properties', {})
-        for key, value in self['properties'].items():
-            snapshot.properties[key] = value[()]
+        setattr(snapshot, 'properties', self._snapshot_properties())
 
         return snapshot
 
-    def set_snapshot(self, idx, snapshot):
+    def iter_snapshots(self, start=None, stop=None, block_size=64):
+        """ Iterate over snapshots, reading them a block at a time
+
+            Snapshots are returned as pydym.CompactSnapshot instances whose
+            fields are views into the block that was read, and which all
+            share one (read-only) positions array. Holding on to them keeps
+            their block alive, but nothing else is copied. Each snapshot has
+            its own copy of the properties.
+
+            :param start: The first snapshot. Optional, defaults to 0.
+            :type start: int
+            :param stop: The snapshot to stop before. Optional, defaults to
+                the last snapshot.
+            :type stop: int
+            :param block_size: The number of snapshots to read at once
+            :type block_size: int
+            :returns: an iterator over snapshots
+        """
+        start, stop, _ = slice(start, stop).indices(self.n_snapshots)
+        if start >= stop:
+            return
+        layout, keys = self._snapshot_layout()
+        position = self._shared_position()
+        properties = self._snapshot_properties()
+        times = self._time_coordinate()
+        rows = self._region if self._region is not None \
+            else range(self.n_samples)
+        for block_start in range(start, stop, block_size):
+            columns = range(block_start, min(block_start + block_size, stop))
+            block = numpy.empty((len(columns), len(keys), len(rows)))
+            for row, key in enumerate(keys):
+                block[:, row] = numpy.transpose(
+                    self._read_block(key, rows, columns))
+            for offset, column in enumerate(columns):
+                yield CompactSnapshot(position, block[offset], layout,
+                                      time=times[column],
+                                      properties=dict(properties))
+
+    def _snapshot_layout(self):
+        """ Return the buffer layout for compact snapshots, and the dataset
+            for each row of the buffer
+        """
+        vectors = [v for v in self.vectors if v != 'position']
+        layout, _ = CompactSnapshot.layout_for(vectors, self.scalars,
+                                               self.n_dimensions)
+        keys = [vector + '/' + axis
+                for vector in vectors for axis in self.axis_labels]
+        return layout, keys + list(self.scalars)
+
+    @property
+    def _n_region_samples(self):
+        """ The number of samples in the current region
+        """
+        return self.n_samples if self._region is None else len(self._region)
+
+    def _shared_position(self):
+        """ Return the positions of the samples in the current region, as a
+            read-only array which snapshots can share
+        """
+        if self._position_cache is None:
+            position = numpy.vstack([self._read_samples('position/' + axis)
+                                     for axis in self.axis_labels])
+            position.setflags(write=False)
+            self._position_cache = position
+        return self._position_cache
+
+    def _snapshot_properties(self):
+        """ Return the stored properties as a dictionary
+        """
+        return dict((key, value[()])
+                    for key, value in self['properties'].items())
+
+    def _quantizer(self, key):
+        """ Return the quantizer for the given dataset
+        """
+        if key not in self._quantizers:
+            self._quantizers[key] = Quantizer.from_dataset(self[key])
+        return self._quantizers[key]
+
+    def _write_column(self, key, idx, values):
+        """ Write the values for a snapshot to a dataset, quantizing them if
+            required
+
+            idx can also be a slice or list of columns, in which case values
+            should have one column for each.
+        """
+        quantizer = self._quantizer(key)
+        encoded = quantizer.encode(values)
+        if quantizer.lossy:
+            errors = quantizer.round_trip_error(values, encoded, axis=0)
+            previous = self._quantization_errors.get(key, (0., 0.))
+            self._quantization_errors[key] = tuple(
+                max(a, b) for a, b in zip(previous, errors))
+        self._store[key][:, idx] = encoded
+
+    def _save_quantization_errors(self):
+        """ Store the worst quantization errors seen so far in the dataset
+            attributes
+        """
+        for key, errors in self._quantization_errors.items():
+            attrs = self[key].attrs
+            for name, value in zip(('max_error', 'relative_error'), errors):
+                attrs[name] = max(value, float(attrs.get(name, 0)))
+        self._quantization_errors = {}
+
+    def quantization_report(self):
+        """ Report the storage used and the errors from quantization for each
+            quantized dataset
+
+            Errors come from a round-trip check when each snapshot is
+            written, and are the worst seen over all the snapshots.
+
+            :returns: a dictionary mapping each quantized dataset to a
+                dictionary containing the 'kind' of quantization, the
+                'bytes_per_value' stored, the 'max_error' (the largest
+                absolute error in any value) and the 'relative_error' (the
+                largest error in the L2 norm of a snapshot, relative to the
+                norm of that snapshot)
+        """
+        report = {}
+        for key in self._stored_datasets:
+            quantizer = self._quantizer(key)
+            if not quantizer.lossy:
+                continue
+            attrs = self[key].attrs
+            errors = self._quantization_errors.get(key, (0., 0.))
+            report[key] = {
+                'kind': quantizer.kind,
+                'bytes_per_value': quantizer.dtype.itemsize,
+                'max_error': max(errors[0],
+                                 float(attrs.get('max_error', 0))),
+                'relative_error': max(errors[1],
+                                      float(attrs.get('relative_error', 0)))
+            }
+        return report
+
+    @property
+    def snapshot_datasets(self):
+        """ Return the keys for the datasets which have a snapshot axis
+        """
+        keys = [dset + '/' + axis
+                for dset in self.vectors if dset != 'position'
+                for axis in self.axis_labels]
+        return keys + list(self.scalars)
+
+    @property
+    def _stored_datasets(self):
+        """ The snapshot datasets which are stored in full (i.e. haven't been
+            compressed)
+        """
+        return [k for k in self.snapshot_datasets if k not in self._compressed]
+
+    @property
+    def capacity(self):
+        """ The number of snapshots which can be stored without resizing
+        """
+        return min([self[key].shape[1] for key in self._stored_datasets]
+                   or [self.n_snapshots])
+
+    def resize(self, capacity):
+        """ Resize the snapshot axis of the datasets to the given capacity
+
+            This doesn't change the number of snapshots, just the space
+            available to store them.
+
+            :param capacity: The new number of snapshot columns. Must be at
+                least n_snapshots.
+            :type capacity: int
+        """
+        if capacity < self.n_snapshots:
+            raise ValueError('Cannot resize to {0} columns without losing '
+                             'snapshots ({1} stored)'.format(
+                                 capacity, self.n_snapshots))
+        for key in self._stored_datasets:
+            dset = self[key]
+            if dset.maxshape[1] is not None and dset.maxshape[1] < capacity:
+                raise ValueError("Dataset {0} can't be resized - it was "
+                                 "created with a fixed number of "
+                                 "snapshots".format(key))
+            dset.resize((self.n_samples, capacity))
+
+        # Keep the time coordinate and index the same size, marking new
+        # snapshots as unset
+        if 'time' in self._store:
+            dset = self['time']
+            old_capacity = dset.shape[0]
+            dset.resize((capacity,))
+            if capacity > old_capacity:
+                dset[old_capacity:] = numpy.nan
+        if self._index is not None and self._store.is_group(self._index):
+            for field, stat in product(self.index_fields, STATISTICS):
+                dset = self._index[field + '/' + stat]
+                old_capacity = dset.shape[0]
+                dset.resize((capacity,))
+                if capacity > old_capacity:
+                    dset[old_capacity:] = numpy.nan
+
+    def trim(self):
+        """ Remove any spare capacity from the end of the snapshot axis
+        """
+        if self.capacity > self.n_snapshots:
+            self.resize(self.n_snapshots)
+
+    def _set_n_snapshots(self, n_snapshots):
+        """ Update the number of snapshots and keep the stored properties
+            consistent
+        """
+        self.n_snapshots = int(n_snapshots)
+        self.shape = (self.n_samples, self.n_snapshots)
+        self.properties['n_snapshots'][()] = self.n_snapshots
+        self.properties['shape'][...] = self.shape
+
+    def append(self, snapshot, time=None):
+        """ Add a snapshot to the end of the observations
+
+            The snapshot axis is grown geometrically as required, so
+            appending n snapshots takes amortized O(n) time.
+
+            :param snapshot: The snapshot to add
+            :type snapshot: pydym.Snapshot
+            :param time: The time of the snapshot. Optional, see
+                `set_snapshot`.
+            :type time: float
+            :returns: the index of the new snapshot
+        """
+        idx = self.n_snapshots
+        self.set_snapshot(idx, snapshot, time=time)
+        return idx
+
+    def set_snapshot(self, idx, snapshot, time=None):
         """ Set the snapshot data at the given index
+
+            If the index is past the end of the current snapshots, the
+            observations are extended to include it.
+
+            :param idx: The index of the snapshot
+            :type idx: int
+            :param snapshot: The snapshot data
+            :type snapshot: pydym.Snapshot
+            :param time: The time of the snapshot. Optional, if None then
+                the snapshot's `time` attribute is used if it has one,
+                otherwise it defaults to `idx * snapshot_interval`.
+            :type time: float
         """
-        if not isinstance(snapshot, Snapshot):
+        self.set_snapshots(idx, [snapshot], times=[time])
+
+    def set_snapshots(self, idx, snapshots, times=None):
+        """ Set the data for a run of consecutive snapshots
+
+            Each dataset is written as a single block of columns, which is
+            much cheaper than writing the snapshots one at a time when the
+            datasets are chunked along the snapshot axis.
+
+            :param idx: The index of the first snapshot
+            :type idx: int
+            :param snapshots: The snapshot data
+            :type snapshots: sequence of pydym.Snapshot
+            :param times: The times of the snapshots. Optional, see
+                `set_snapshot`.
+            :type times: sequence of floats
+        """
+        snapshots = list(snapshots)
+        if not snapshots:
+            return
+        if any(not isinstance(s, SnapshotBase) for s in snapshots):
             raise ValueError("Trying to append non-Snapshot object to "
                              "Observations collection")
+        self._check_writable()
+        stop = idx + len(snapshots)
+        self._prepare_columns(idx, stop)
 
         # If we have no positions yet, get them. Otherwise check that the
         # position data matches
         if not self._positions_filled:
-            values = snapshot.position
-            for aidx, axis in enumerate(self.axis_labels):
-                self._file['position/' + axis][:] = values[aidx]
-            self._positions_filled = True
-        elif self.run_checks:
-            values = snapshot.position
-            for aidx, axis in enumerate(self.axis_labels):
-                if not numpy.allclose(self._file['position/' + axis],
-                                      values[aidx]):
-                    raise ValueError('Snapshot supplied to Observations '
-                                     'does not have the same position data')
-
-        # Append vector data in the right places
-        for dset in self.vectors:
-            values = getattr(snapshot, dset)
-            if values is not None:
-                for aidx, axis in enumerate(self.axis_labels):
-                    self._file[dset + '/' + axis][:, idx] = values[aidx]
-
-        # Update scalar data
+            self._set_positions(snapshots[0].position)
+            checked = snapshots[1:]
+        else:
+            checked = snapshots
+        if self.run_checks:
+            for snapshot in checked:
+                self._check_positions(snapshot.position)
+
+        # Gather each dataset into a block of columns
+        blocks = {}
+        for dset in (v for v in self.vectors if v != 'position'):
+            columns, present = self._columns_present(idx, snapshots, dset)
+            if present:
+                blocks[dset] = (columns, [
+                    numpy.column_stack([getattr(s, dset)[aidx]
+                                        for s in present])
+                    for aidx in range(len(self.axis_labels))])
         for dset in self.scalars:
-            values = getattr(snapshot, dset)
-            if values is not None:
-                self._file[dset][:, idx] = values
+            columns, present = self._columns_present(idx, snapshots, dset)
+            if present:
+                blocks[dset] = (columns, numpy.column_stack(
+                    [getattr(s, dset) for s in present]))
+
+        # Snapshots without a time get their own time attribute if they have
+        # one
+        if times is None:
+            times = [None] * len(snapshots)
+        times = [getattr(s, 'time', None) if t is None else t
+                 for s, t in zip(snapshots, times)]
+        self._write_blocks(idx, stop, blocks, times)
+
+    def set_arrays(self, idx, arrays, times=None, position=None):
+        """ Set the data for a run of consecutive snapshots from arrays
+
+            This skips building Snapshot objects, so it's the quickest way
+            to write blocks of data you already have as arrays.
+
+            :param idx: The index of the first snapshot
+            :type idx: int
+            :param arrays: The values for each dataset, keyed by dataset
+                name. Vector datasets should have shape (n_dimensions,
+                n_samples, n_block) and scalar datasets shape (n_samples,
+                n_block). Datasets can be left out.
+            :type arrays: dict
+            :param times: The times of the snapshots. Optional, defaults to
+                `idx * snapshot_interval` for each snapshot.
+            :type times: sequence of floats
+            :param position: The sample positions, with shape
+                (n_dimensions, n_samples). Required for the first write to
+                new observations, and checked against the stored positions
+                afterwards.
+            :type position: array
+        """
+        if not arrays:
+            return
+        self._check_writable()
+        blocks, n_block = {}, None
+        for dset, values in arrays.items():
+            if dset in self.vectors:
+                values = [values[aidx]
+                          for aidx in range(len(self.axis_labels))]
+                shape = values[0].shape
+            elif dset in self.scalars:
+                shape = values.shape
+            else:
+                raise KeyError('Unknown dataset {0}'.format(dset))
+            if n_block is None:
+                n_block = shape[1]
+            if shape != (self.n_samples, n_block):
+                raise ValueError('Expected values for {0} with shape {1}, '
+                                 'got {2}'.format(dset,
+                                                  (self.n_samples, n_block),
+                                                  shape))
+            blocks[dset] = (slice(idx, idx + n_block), values)
+        stop = idx + n_block
+        self._prepare_columns(idx, stop)
+
+        if not self._positions_filled:
+            if position is None:
+                raise ValueError('Positions are needed for the first '
+                                 'snapshots written')
+            self._set_positions(position)
+        elif position is not None and self.run_checks:
+            self._check_positions(position)
+        self._write_blocks(idx, stop, blocks,
+                           times if times is not None else [None] * n_block)
+
+    def _check_writable(self):
+        """ Make sure we can write snapshots
+        """
+        if not self.writable:
+            raise IOError("Can't add snapshots to {0}, it was opened "
+                          "read-only".format(self.filename))
+        if 'pod' in self._store:
+            raise IOError("Can't add snapshots to {0}, the snapshots have "
+                          "been compressed".format(self.filename))
+
+    def _prepare_columns(self, idx, stop):
+        """ Make sure there's room for snapshots idx to stop, and that the
+            index and time coordinate exist
+        """
+        # Files written before we kept an index or a time coordinate need
+        # them built first
+        if self._index is None and not self.swmr:
+            self.build_index()
+        if 'time' not in self._store and not self.swmr:
+            self._create_time(self.capacity)
+
+        # Make room for new snapshots if required
+        if stop > self.n_snapshots:
+            if stop > self.capacity:
+                self.resize(max(2 * self.capacity, stop, MIN_CAPACITY))
+            self._set_n_snapshots(stop)
 
+    def _set_positions(self, position):
+        """ Store the sample positions
+        """
+        for aidx, axis in enumerate(self.axis_labels):
+            self._store['position/' + axis][:] = position[aidx]
+        self._positions_filled = True
+        self._tree = None
+        self._position_cache = None
+
+    def _check_positions(self, position):
+        """ Check that positions match the stored positions
+        """
+        for aidx, axis in enumerate(self.axis_labels):
+            if not numpy.allclose(self._store['position/' + axis],
+                                  position[aidx]):
+                raise ValueError('Snapshot supplied to Observations '
+                                 'does not have the same position '
+                                 'data')
+
+    def _write_blocks(self, idx, stop, blocks, times):
+        """ Write blocks of columns to the datasets, summarising the data
+            for the index as we go
+
+            :param blocks: The (columns, values) to write for each dataset.
+                Values for vector datasets are a list of blocks, one for
+                each axis.
+            :param times: The time of each snapshot from idx to stop, or None
+                to use the snapshot interval
+        """
+        summaries = {}
+        for dset, (columns, values) in blocks.items():
+            if dset not in self.vectors:
+                self._write_column(dset, columns, values)
+                summaries[dset] = (columns, summarise(values, axis=0))
+                continue
+            magnitude = 0
+            for axis, block in zip(self.axis_labels, values):
+                block = numpy.asarray(block)
+                self._write_column(dset + '/' + axis, columns, block)
+                summaries[dset + '/' + axis] = (columns,
+                                                summarise(block, axis=0))
+                magnitude = magnitude + block ** 2
+            summaries[dset + '/magnitude'] = \
+                (columns, summarise(numpy.sqrt(magnitude), axis=0))
+
+        # Update the time coordinate
+        times = [(idx + offset) * self.snapshot_interval if time is None
+                 else time for offset, time in enumerate(times)]
+        if 'time' in self._store:
+            self._store['time'][idx:stop] = times
+
+        # Update the index
+        if self._index is not None:
+            for field, (columns, stats) in summaries.items():
+                for stat, value in stats.items():
+                    self._index[field + '/' + stat][columns] = value
+
+        # Make sure that SWMR readers can see the new data
+        if self.swmr:
+            self._store.flush()
         self._recalc_snapshots = True
 
+    @staticmethod
+    def _columns_present(idx, snapshots, dset):
+        """ Work out which of a run of snapshots have values for a dataset
+
+            :returns: the columns to write (a slice if every snapshot has
+                values, otherwise a list of indices) and the snapshots with
+                values
+        """
+        offsets = [i for i, s in enumerate(snapshots)
+                   if getattr(s, dset) is not None]
+        present = [snapshots[i] for i in offsets]
+        if len(offsets) == len(snapshots):
+            return slice(idx, idx + len(snapshots)), present
+        return [idx + i for i in offsets], present
+
+    @property
+    def manifest(self):
+        """ The source files the snapshots were read from
+
+            The manifest is stored in the file as JSON under 'manifest'.
+            Readers use it to work out which files they've already
+            processed.
+
+            :returns: a dictionary of entries keyed by source name. The
+                contents of each entry are up to the reader, but should
+                include the snapshot 'index'. Empty if nothing has been
+                recorded.
+        """
+        if 'manifest' not in self._store:
+            return {}
+        return json.loads(
+            numpy.asarray(self._store['manifest'][:]).tobytes().decode('utf-8'))
+
+    def record_sources(self, sources):
+        """ Add source files to the manifest
+
+            :param sources: The new entries, keyed by source name. Existing
+                entries with the same names are replaced.
+            :type sources: dict
+        """
+        if not sources:
+            return
+        if not self.writable or self.swmr:
+            raise IOError("Can't update the manifest for {0}, it was opened "
+                          "read-only or for SWMR writing".format(self.filename))
+        manifest = self.manifest
+        manifest.update(sources)
+        encoded = json.dumps(manifest, sort_keys=True).encode('utf-8')
+        if 'manifest' in self._store:
+            del self._store['manifest']
+        self._store['manifest'] = numpy.frombuffer(encoded, dtype=numpy.uint8)
+
     def generate_modes(self):
         """ Calculate the dynamic modes from the current shapshot
         """
@@ -280,7 +1568,7 @@ class Observations(object):
         results = dynamic_decomposition(self)
 
         # Add regular dynamic mode info
-        self._modes = mode_grp = self._file.require_group('modes')
+        self._modes = mode_grp = self._store.require_group('modes')
         items = {
             'eigenvalues': results.eigenvalues,
             'eigenvectors': results.eigenvectors,
@@ -304,37 +1592,322 @@ class Observations(object):
                 dtype=values.dtype)
             dset[...] = values
 
-    def set_snapshot_properties(self, key_on=None, thin_by=None):
+    def set_snapshot_properties(self, key_on=None, thin_by=None,
+                                window=None):
         """ Set the properties used to generate snapshots
 
+            Changing the thinning or the time window doesn't copy any data,
+            it just changes the view returned by `snapshots`.
+
             :param key_on: The datasets used to generate the snapshot
                 arrays
             :type key_on: list of strings
             :param thin_by: Take every 'thin_by' snapshots. `thin_by = None`
                 removes thinning.
             :type thin_by: int or None
+            :param window: The (start, stop) indices of the snapshots to use,
+                either can be None to use everything from the start or up
+                to the end.
+            :type window: tuple
         """
-        if key_on is not None:
+        if key_on is not None and tuple(key_on) != tuple(self.key_on):
             self.key_on = key_on
+            self._snapshots = None
         if thin_by is not None:
             self.thin_by = thin_by
+        if window is not None:
+            self.window = tuple(window)
+
+    def _create_time(self, capacity):
+        """ Create the time coordinate dataset
+
+            Any existing snapshots are assumed to be `snapshot_interval`
+            apart, and unset snapshots are NaN.
+        """
+        dset = self._store.create_dataset('time',
+                                          shape=(capacity,),
+                                          maxshape=(None,),
+                                          chunks=(MIN_CAPACITY,),
+                                          dtype=float)
+        dset[:] = numpy.nan
+        if self.n_snapshots:
+            dset[:self.n_snapshots] = \
+                numpy.arange(self.n_snapshots) * self.snapshot_interval
+        return dset
+
+    def _time_coordinate(self):
+        """ Return the time of every stored snapshot
+        """
+        if 'time' in self._store:
+            return numpy.asarray(self['time'][:self.n_snapshots])
+        return numpy.arange(self.n_snapshots) * self.snapshot_interval
+
+    @property
+    def times(self):
+        """ The time of each snapshot in the current snapshot matrix
+
+            This has the current time window and thinning applied, so
+            `times[i]` is the time of the snapshot in column i of
+            `snapshots`.
+        """
+        start, stop = self.window
+        return self._time_coordinate()[start:stop:self.thin_by]
+
+    @property
+    def snapshot_times(self):
+        """ The time of every stored snapshot, ignoring the current time
+            window and thinning
+        """
+        return self._time_coordinate()
+
+    def select(self, start_time=None, stop_time=None):
+        """ Set the time window to the snapshots between the given times
+
+            The snapshots are found by a binary search on the time
+            coordinate, so this is fast however many snapshots there are.
+            Both ends of the range are inclusive.
+
+            Because this returns the observations, you can feed the selection
+            straight into a decomposition, e.g.
+            `dynamic_decomposition(data.select(1.5, 3))`.
+
+            :param start_time: The earliest time to include. Optional,
+                defaults to the first snapshot.
+            :type start_time: float
+            :param stop_time: The latest time to include. Optional, defaults
+                to the last snapshot.
+            :type stop_time: float
+            :returns: the observations
+        """
+        times = self._time_coordinate()
+        if numpy.any(numpy.isnan(times)) or numpy.any(numpy.diff(times) < 0):
+            raise ValueError("Can't select by time, some snapshot times are "
+                             "unset or not in increasing order")
+        start = None if start_time is None \
+            else int(numpy.searchsorted(times, start_time, side='left'))
+        stop = None if stop_time is None \
+            else int(numpy.searchsorted(times, stop_time, side='right'))
+        self.window = (start, stop)
+        return self
+
+    def compress(self, tolerance=1e-3, block_size=64, max_rank=None,
+                 keep_datasets=False):
+        """ Compress the snapshot matrix into truncated POD factors
+
+            The snapshot matrix X for the current `key_on` datasets is
+            decomposed as U diag(sigma) V^H in a single streaming pass over
+            blocks of snapshots (see pydym.pod.incremental_svd), keeping just
+            enough modes that
+
+                ||X - U diag(sigma) V^H||_F <= tolerance * ||X||_F
+
+            The factors are stored under 'pod/<snapshot key>', and from then
+            on `snapshots`, `get_snapshot`, `probe` etc. reconstruct the data
+            from the factors as it's read. `dynamic_decomposition` uses the
+            stored factors directly rather than redoing the SVD.
+
+            Unless `keep_datasets` is True, the full datasets are then
+            removed. Note that HDF5 doesn't give the space back to the
+            filesystem by itself - run `h5repack` over the file to shrink
+            it. Compressed observations can't have new snapshots added.
+
+            :param tolerance: The relative error allowed in the Frobenius
+                norm. Optional, defaults to 1e-3.
+            :type tolerance: float
+            :param block_size: The number of snapshots to read at once
+            :type block_size: int
+            :param max_rank: The maximum number of modes to keep. Optional,
+                if set then the error may exceed the tolerance.
+            :type max_rank: int
+            :param keep_datasets: Whether to keep the full datasets as well
+                as the factors. Optional, defaults to False.
+            :type keep_datasets: bool
+            :returns: the relative error of the compressed snapshots
+        """
+        if not self.writable or self.swmr:
+            raise IOError("Can't compress {0}, we can't add new data to "
+                          "it".format(self.filename))
+        pod_key = 'pod/' + self.snapshot_dataset_key
+        if pod_key in self._store:
+            raise ValueError('Snapshots for {0} are already '
+                             'compressed'.format(self.snapshot_dataset_key))
+
+        # Decompose the snapshots, reading directly from the datasets
+        components = self._snapshot_components()
+        U, sigma, V, error = incremental_svd(
+            self._iter_dataset_blocks(components, block_size),
+            tolerance=tolerance, max_rank=max_rank)
+
+        # Store the factors
+        grp = self._store.require_group(pod_key)
+        for name, values in (('U', U), ('sigma', sigma), ('V', V)):
+            grp.create_dataset(name, data=values, compression='gzip')
+        grp.attrs['keys'] = ','.join(components)
+        grp.attrs['tolerance'] = tolerance
+        grp.attrs['error'] = error
+
+        # Remove the full datasets
+        if keep_datasets:
+            grp.attrs['datasets'] = ''
+        else:
+            grp.attrs['datasets'] = ','.join(components)
+            for key in set(k.split('/')[0] for k in components):
+                del self._store[key]
+            if 'snapshots/' + self.snapshot_dataset_key in self._store:
+                del self._store['snapshots/' + self.snapshot_dataset_key]
+        self._load_compressed()
         self._snapshots = None
+        return error
 
     @property
-    def snapshot_dataset_key(self):
-        """ Return the snapshot datset key for the current snapshot dataset
+    def gridded(self):
+        """ The snapshots interpolated onto a regular grid by `regrid`, or
+            None if they haven't been
         """
-        # Make snapshot dataset
-        key = '_'.join(self.key_on)
-        if self.thin_by:
-            key += '_thin_by_{0}'.format(self.thin_by)
-        return key
+        if 'gridded' in self._store:
+            return self['gridded']
+        return None
 
-    def generate_snapshots(self):
-        """ Generate the snapshots
+    def regrid(self, fields=None, shape=None, bounds=None, block_size=64,
+               workers=None):
+        """ Interpolate every snapshot onto a regular grid
+
+            The interpolation weights are worked out once (see
+            pydym.interpolation.GridInterpolator) and applied to blocks of
+            snapshots, all fields at once. The results go in the 'gridded'
+            group: 'x' and 'y' hold the grid coordinates, 'mask' marks grid
+            points outside the samples, and each field is stored as a
+            dataset of shape (n_y, n_x, n_snapshots) under its usual name
+            (e.g. 'gridded/velocity/x'), chunked by grid rows and a few
+            snapshots so that reading single frames is cheap. Values
+            outside the samples are NaN. Any existing gridded data is
+            replaced.
+
+            :param fields: The datasets to regrid. Optional, defaults to
+                all of `snapshot_datasets`.
+            :type fields: sequence of strings
+            :param shape: The grid shape as (n_y, n_x). Optional, defaults
+                to about as many grid points as samples.
+            :type shape: tuple
+            :param bounds: The grid limits as (x_min, x_max, y_min, y_max).
+                Optional, defaults to the limits of the samples.
+            :type bounds: tuple
+            :param block_size: The number of snapshots to interpolate at once
+            :type block_size: int
+            :param workers: The number of processes to interpolate blocks in.
+                Optional, defaults to interpolating in this process.
+            :type workers: int
+            :returns: the 'gridded' group
+        """
+        # Keep scipy out of the core imports
+        from .interpolation import (GridInterpolator, regrid_block,
+                                    _init_regrid_worker)
+        from .utilities import bounded_map
+
+        if not self.writable or self.swmr:
+            raise IOError("Can't regrid {0}, we can't add new data to "
+                          "it".format(self.filename))
+        fields = list(fields or self.snapshot_datasets)
+        unknown = [f for f in fields if f not in self.snapshot_datasets]
+        if unknown:
+            raise KeyError('Unknown datasets {0}'.format(', '.join(unknown)))
+        position = numpy.vstack([self['position/' + axis][:]
+                                 for axis in self.axis_labels[:2]])
+        interpolator = GridInterpolator(position, shape=shape, bounds=bounds)
+        n_y, n_x = interpolator.shape
+
+        # Set up the datasets. Chunks hold whole rows of the grid
+        if 'gridded' in self._store:
+            del self._store['gridded']
+        grp = self._store.create_group('gridded')
+        grp.create_dataset('x', data=interpolator.xgrid)
+        grp.create_dataset('y', data=interpolator.ygrid)
+        grp.create_dataset('mask', data=interpolator.mask)
+        chunks = (max(1, min(n_y, MAX_CHUNK_SAMPLES // n_x)), n_x,
+                  max(1, min(self.n_snapshots, MIN_CAPACITY)))
+        dsets = [grp.create_dataset(field, dtype=float,
+                                    shape=(n_y, n_x, self.n_snapshots),
+                                    chunks=chunks, compression='gzip')
+                 for field in fields]
+        grp.attrs['fields'] = ','.join(fields)
+
+        # Interpolate blocks of snapshots, possibly in other processes.
+        # Blocks are read as they're handed out, so only a few are in
+        # memory at once. Worker processes get the interpolator once when
+        # they start, so only the values are sent with each block
+        rows = range(self.n_samples)
+        starts = range(0, self.n_snapshots, block_size)
+        if workers is not None and workers > 1:
+            func = regrid_block
+        else:
+            func = partial(regrid_block, interpolator=interpolator)
+
+        def tasks():
+            "Generate the arguments for each block"
+            for start in starts:
+                columns = range(start,
+                                min(start + block_size, self.n_snapshots))
+                values = numpy.stack([self._read_block(key, rows, columns)
+                                      for key in fields], axis=1)
+                yield (values,)
+
+        for idx, gridded in bounded_map(func, tasks(), workers=workers,
+                                        initializer=_init_regrid_worker,
+                                        initargs=(interpolator,)):
+            start = starts[idx]
+            for fidx, dset in enumerate(dsets):
+                dset[:, :, start:start + gridded.shape[-1]] = \
+                    gridded[:, :, fidx]
+        return grp
+
+    def _load_compressed(self):
+        """ Load the details of any datasets stored as POD factors
+        """
+        self._compressed, self._factors = {}, {}
+        vectors, scalars = list(self.vectors), list(self.scalars)
+        for key, grp in self['pod'].items():
+            components = grp.attrs['keys'].split(',')
+            datasets = grp.attrs['datasets']
+            for dset in (datasets.split(',') if datasets else []):
+                self._compressed[dset] = (key, components.index(dset),
+                                          len(components))
+                name = dset.split('/')[0]
+                if '/' in dset and name not in vectors:
+                    vectors.append(name)
+                elif '/' not in dset and name not in scalars:
+                    scalars.append(name)
+        self.vectors, self.scalars = vectors, scalars
+
+    def _pod_factors(self, key):
+        """ Return a FactoredMatrix with the stored factors for the given
+            snapshot dataset key
+        """
+        if key not in self._factors:
+            grp = self['pod/' + key]
+            self._factors[key] = FactoredMatrix(
+                grp['U'][:], grp['sigma'][:], grp['V'][:self.n_snapshots])
+        return self._factors[key]
+
+    def _read_block(self, key, rows, columns):
+        """ Read a block of the given snapshot dataset, reconstructing it
+            from the POD factors if it has been compressed
+
+            :param key: The dataset to read, as given by `snapshot_datasets`
+            :param rows: The samples to read - an integer, range or sorted
+                array of indices
+            :param columns: The snapshots to read, as for rows
+        """
+        if key not in self._compressed:
+            return self._quantizer(key).decode(
+                read_block(self[key], rows, columns))
+        pod_key, component, n_components = self._compressed[key]
+        rows = numpy.asarray(rows, dtype=int) * n_components + component
+        return self._pod_factors(pod_key).read(rows, columns)
+
+    def _snapshot_components(self):
+        """ Return the names of the datasets interleaved in the rows of the
+            snapshot matrix
         """
-        # Determine number of measurements per sample - need to include fact
-        # that vector snapshots have more samples
         vector_components = [key + '/' + ax
                              for ax, key in product(self.axis_labels,
                                                     self.key_on)
@@ -342,35 +1915,78 @@ class Observations(object):
         scalar_components = [key.replace('/', '_')
                              for key in self.key_on
                              if key not in self.vectors]
-        all_components = tuple(vector_components + scalar_components)
+        return tuple(vector_components + scalar_components)
+
+    def _iter_dataset_blocks(self, components, block_size=64):
+        """ Iterate over blocks of the snapshot matrix, reading directly from
+            the datasets
+
+            :param components: The datasets to interleave
+            :param block_size: The number of snapshots in each block
+        """
+        n_components = len(components)
+        for start in range(0, self.n_snapshots, block_size):
+            stop = min(start + block_size, self.n_snapshots)
+            block = numpy.empty((n_components * self.n_samples, stop - start))
+            for idx, key in enumerate(components):
+                block[idx::n_components] = self._read_block(
+                    key, range(self.n_samples), range(start, stop))
+            yield block
+
+    @property
+    def snapshot_dataset_key(self):
+        """ Return the snapshot datset key for the current snapshot dataset
+        """
+        return '_'.join(self.key_on)
+
+    def generate_snapshots(self):
+        """ Generate the snapshots
+        """
+        # Compressed snapshots are reconstructed from the stored factors
+        if 'pod/' + self.snapshot_dataset_key in self._store:
+            grp = self['pod/' + self.snapshot_dataset_key]
+            self._snapshots = SnapshotMatrix(
+                self._pod_factors(self.snapshot_dataset_key),
+                keys=tuple(grp.attrs['keys'].split(',')))
+            self._preprocessing = self._load_preprocessing()
+            self._recalc_snapshots = False
+            return
+
+        # Determine number of measurements per sample - need to include fact
+        # that vector snapshots have more samples
+        all_components = self._snapshot_components()
         n_components = len(all_components)
 
-        # Determine snapshot size
-        if self.thin_by:
-            snapshot_size = (n_components * self.n_samples,
-                             thinned_length(self.n_snapshots, self.thin_by))
+        # Determine snapshot size - we store all the snapshots and apply any
+        # thinning or time windows lazily
+        snapshot_size = (n_components * self.n_samples, self.n_snapshots)
+
+        # Generate group for snapshots. If we can't add new objects to the
+        # file then we read straight from the component datasets instead, so
+        # nothing is copied into memory (e.g. for readers in worker
+        # processes)
+        if self.writable and not self.swmr:
+            snapshot_grp = self._store.require_group('snapshots')
+            if self.snapshot_dataset_key in set(snapshot_grp.keys()):
+                del snapshot_grp[self.snapshot_dataset_key]
+            source = snapshot_grp.require_dataset(
+                name=self.snapshot_dataset_key, shape=snapshot_size,
+                dtype=float, compression="gzip")
+            source.attrs['keys'] = ','.join(all_components)
+
+            # Copy over dataset data
+            for idx, key in enumerate(all_components):
+                source[idx::n_components] = self._read_block(
+                    key, range(self.n_samples), range(self.n_snapshots))
         else:
-            snapshot_size = (n_components * self.n_samples, self.n_snapshots)
-
-        # Generate group for snapshots
-        snapshot_grp = self._file.require_group('snapshots')
-        if self.snapshot_dataset_key in set(snapshot_grp.keys()):
-            del snapshot_grp[self.snapshot_dataset_key]
-        self._snapshots = snapshot_grp.require_dataset(
-            name=self.snapshot_dataset_key, shape=snapshot_size, dtype=float,
-            compression="gzip")
-        self._snapshots.attrs['keys'] = ','.join(all_components)
-
-        # Copy over dataset data
-        for idx, key in enumerate(all_components):
-            if self.thin_by:
-                self._snapshots[idx::n_components] = \
-                    self[key][:, ::self.thin_by]
-            else:
-                self._snapshots[idx::n_components] = self[key]
+            source = InterleavedMatrix(self._read_block, all_components,
+                                       self.shape)
+        self._snapshots = SnapshotMatrix(source, keys=all_components)
+        self._preprocessing = self._load_preprocessing()
+        self._recalc_snapshots = False
 
 
-def load(datafile):
+def load(datafile, **kwargs):
     """ Load the given filename into a FlowData instance.
 
         This is essentially a utility wrapper for use with 'with' statements
@@ -379,6 +1995,7 @@ def load(datafile):
             with pydym.load('somefile.hdf5') as data:
                 # do something with data
 
-        and have pydym clean up the HDF5 references for you nicely.
+        and have pydym clean up the HDF5 references for you nicely. Any
+        keyword arguments (e.g. `mode='r'`) are passed on to Observations.
     """
-    return Observations(datafile)
+    return Observations(datafile, **kwargs)
@@ -9,5 +9,7 @@
 from .eigenplots import eigenplot
 from .plot_snapshot import plot_snapshot
 from .utilities import spy, make_axes_grid
+from .animate import render_frames
 
-__all__ = ["eigenplot", "spy", "plot_snapshot", "make_axes_grid"]
+__all__ = ["eigenplot", "spy", "plot_snapshot", "make_axes_grid",
+           "render_frames"]
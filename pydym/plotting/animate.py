@@ -0,0 +1,288 @@
+""" file:   animate.py (pydym.plotting)
+
+    description: Rendering animation frames off-screen, in parallel
+
+    Frames are drawn with the Agg canvas directly rather than through
+    pyplot, so they can be rendered in worker processes without a display.
+    The interpolation weights and colour limits are worked out once, up
+    front, and handed to the workers, so every frame uses the same grid and
+    the same colour scale. Each worker opens the observations read-only and
+    reads just its own range of snapshots.
+"""
+
+from __future__ import division
+
+import os
+import subprocess
+import numpy
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from ..observations import Observations
+from ..interpolation import GridInterpolator
+from ..utilities import bounded_map, AXIS_LABELS
+
+# The name pattern for frame files
+FRAME_PATTERN = '{0}_{1:05d}.png'
+
+
+def field_values(snapshot, field):
+    """ Pull the values for a field out of a snapshot
+
+        :param snapshot: The snapshot
+        :type snapshot: pydym.Snapshot or pydym.CompactSnapshot
+        :param field: The field, e.g. 'pressure', 'velocity/x' or
+            'velocity/magnitude'
+        :type field: string
+        :returns: the values at each sample
+    """
+    if '/' not in field:
+        return getattr(snapshot, field)
+    vector, axis = field.split('/')
+    values = getattr(snapshot, vector)
+    if axis == 'magnitude':
+        return numpy.sqrt((values ** 2).sum(axis=0))
+    return values[AXIS_LABELS[axis]]
+
+
+def render_range(source, field, columns, first_frame, interpolator, limits,
+                 directory, prefix='frame', cmap='RdYlBu_r',
+                 figsize=(8, 6), dpi=100, times=None):
+    """ Render frames for a range of snapshots to numbered PNGs
+
+        This is a plain function so that it can run in a worker process.
+
+        :param source: Where to read the snapshots from - either an
+            Observations instance, the arguments (filename, backend,
+            region) to open one read-only, or an array of values with one
+            column per frame
+        :param field: The field to plot (ignored for arrays of values)
+        :type field: string
+        :param columns: The snapshots (or columns of the array) to render
+        :type columns: range
+        :param first_frame: The frame number of the first snapshot
+        :type first_frame: int
+        :param interpolator: The interpolator for the sample positions
+        :type interpolator: pydym.interpolation.GridInterpolator
+        :param limits: The colour limits as (min, max)
+        :type limits: tuple
+        :param directory: The directory to write frames to
+        :type directory: string
+        :param times: The time of each frame in columns. Optional, shown in
+            the frame titles if given.
+        :type times: sequence of floats
+        :returns: the frame filenames
+
+        The remaining arguments control how the frames look.
+    """
+    # Set up the figure once, and just swap the data for each frame
+    figure = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(1, 1, 1)
+    extent = (interpolator.xgrid[0], interpolator.xgrid[-1],
+              interpolator.ygrid[0], interpolator.ygrid[-1])
+    image = axes.imshow(numpy.zeros(interpolator.shape), origin='lower',
+                        extent=extent, cmap=cmap, vmin=limits[0],
+                        vmax=limits[1], interpolation='nearest')
+    figure.colorbar(image, ax=axes, label=None if field is None else field)
+    axes.set_axis_off()
+    title = axes.set_title('')
+
+    filenames = []
+    for frame, values in zip(range(first_frame, first_frame + len(columns)),
+                             _iter_values(source, field, columns)):
+        image.set_data(interpolator.interpolate(values))
+        if times is not None:
+            title.set_text('t = {0:.4g}'.format(times[frame - first_frame]))
+        filename = os.path.join(directory, FRAME_PATTERN.format(prefix, frame))
+        figure.savefig(filename, dpi=dpi)
+        filenames.append(filename)
+    return filenames
+
+
+def _iter_values(source, field, columns, block_size=64):
+    """ Iterate over the values to plot in each frame
+    """
+    if isinstance(source, numpy.ndarray):
+        for column in range(len(columns)):
+            yield source[:, column]
+        return
+
+    # Open the observations ourselves if we're in a worker
+    data = source
+    if not isinstance(source, Observations):
+        filename, backend, region = source
+        data = Observations(filename, mode='r', backend=backend)
+        if region is not None:
+            mask = numpy.zeros(data.n_samples, dtype=bool)
+            mask[region] = True
+            data.set_region(mask=mask)
+    try:
+        for snapshot in data.iter_snapshots(columns[0], columns[-1] + 1,
+                                            block_size=block_size):
+            yield field_values(snapshot, field)
+    finally:
+        if data is not source:
+            data.close()
+
+
+def render_frames(source, directory, field='velocity/magnitude',
+                  position=None, start=None, stop=None, shape=None,
+                  limits=None, workers=None, video=None, fps=24,
+                  prefix='frame', **kwargs):
+    """ Render animation frames for some observations or reconstructed
+        snapshots
+
+        Frames are written as numbered PNGs, split into contiguous ranges
+        which are rendered in a pool of worker processes. Every frame uses
+        the same interpolation grid and colour limits.
+
+        :param source: The snapshots to render - either Observations (or
+            the name of an Observations file), or an array of values with
+            one column per frame (e.g. snapshots reconstructed from a
+            dynamic mode decomposition)
+        :param directory: The directory to write frames to. It's created if
+            it doesn't exist.
+        :type directory: string
+        :param field: The field to plot, for Observations. Vector fields can
+            be given as components (e.g. 'velocity/x') or as
+            'velocity/magnitude'.
+        :type field: string
+        :param position: The sample positions, for arrays of values
+        :type position: array of shape (2, n_samples)
+        :param start: The first snapshot to render. Optional, defaults to 0.
+        :type start: int
+        :param stop: The snapshot to stop before. Optional, defaults to the
+            last snapshot.
+        :type stop: int
+        :param shape: The grid shape for the frames as (n_y, n_x). Optional,
+            see pydym.interpolation.grid_shape.
+        :type shape: tuple
+        :param limits: The colour limits as (min, max). Optional, defaults
+            to the range of the field over the rendered snapshots. For
+            Observations without a region of interest this comes from the
+            index, so no data is read.
+        :type limits: tuple
+        :param workers: The number of processes to render in. Optional,
+            defaults to rendering in this process. Observations have to be
+            file-backed and opened read-only (or given as a filename) to
+            render in other processes.
+        :type workers: int
+        :param video: A video file to encode the frames into with ffmpeg.
+            Optional.
+        :type video: string
+        :param fps: The frame rate for the video
+        :type fps: int
+        :param prefix: The start of the frame filenames
+        :type prefix: string
+        :returns: the frame filenames, in order
+
+        Any other keyword arguments (cmap, figsize, dpi) are passed on to
+        `render_range`.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    workers = workers or 1
+
+    # Work out where the values come from, and the range to render
+    close = False
+    if isinstance(source, Observations) or not hasattr(source, 'shape'):
+        if not isinstance(source, Observations):
+            source, close = Observations(source, mode='r'), True
+        data = source
+        start, stop, _ = slice(start, stop).indices(data.n_snapshots)
+        position = data.positions
+        times = data.snapshot_times[start:stop]
+        if workers > 1:
+            if data.filename is None or data.writable:
+                raise IOError("Can't render Observations in other "
+                              "processes unless they're saved to a file and "
+                              "opened read-only")
+            source = (data.filename, data.backend_name, data.region)
+        if limits is None:
+            limits = _field_limits(data, field, start, stop)
+    else:
+        if position is None:
+            raise ValueError('Positions are needed to render arrays')
+        start, stop, _ = slice(start, stop).indices(source.shape[1])
+        times, field = None, None
+        if limits is None:
+            limits = (numpy.nanmin(source[:, start:stop]),
+                      numpy.nanmax(source[:, start:stop]))
+
+    try:
+        interpolator = GridInterpolator(position, shape=shape)
+
+        # Split the frames into contiguous ranges, a few per worker so that
+        # they finish at about the same time
+        n_frames = stop - start
+        n_ranges = min(n_frames, 1 if workers == 1 else 4 * workers)
+        bounds = numpy.linspace(start, stop, n_ranges + 1).astype(int)
+        tasks = []
+        for first, last in zip(bounds[:-1], bounds[1:]):
+            columns = range(first, last)
+            range_source = source[:, first:last] \
+                if isinstance(source, numpy.ndarray) else source
+            tasks.append((range_source, field, columns, first - start,
+                          interpolator, limits, directory, prefix,
+                          kwargs.get('cmap', 'RdYlBu_r'),
+                          kwargs.get('figsize', (8, 6)),
+                          kwargs.get('dpi', 100),
+                          None if times is None
+                          else times[first - start:last - start]))
+        filenames = [None] * len(tasks)
+        for idx, names in bounded_map(render_range, tasks, workers=workers):
+            filenames[idx] = names
+    finally:
+        if close:
+            data.close()
+
+    filenames = [name for names in filenames for name in names]
+    if video is not None:
+        encode_video(directory, video, fps=fps, prefix=prefix)
+    return filenames
+
+
+def _field_limits(data, field, start, stop):
+    """ Get the range of a field over some snapshots
+
+        The index covers every sample, so it can only be used if there's no
+        region of interest.
+    """
+    if data.region is None and field in data.index_fields:
+        lower = data.snapshot_statistics(field, 'min')[start:stop]
+        upper = data.snapshot_statistics(field, 'max')[start:stop]
+        return numpy.nanmin(lower), numpy.nanmax(upper)
+
+    # Fall back to reading through the data
+    lower, upper = numpy.inf, -numpy.inf
+    for snapshot in data.iter_snapshots(start, stop):
+        values = field_values(snapshot, field)
+        lower = min(lower, numpy.nanmin(values))
+        upper = max(upper, numpy.nanmax(values))
+    return lower, upper
+
+
+def encode_video(directory, video, fps=24, prefix='frame'):
+    """ Encode numbered frames into a video with ffmpeg
+
+        :param directory: The directory holding the frames
+        :type directory: string
+        :param video: The video file to write, e.g. 'movie.mp4'
+        :type video: string
+        :param fps: The frame rate
+        :type fps: int
+        :param prefix: The start of the frame filenames
+        :type prefix: string
+        :raises IOError: if ffmpeg isn't available
+    """
+    pattern = os.path.join(directory, prefix + '_%05d.png')
+    command = ['ffmpeg', '-y', '-loglevel', 'error', '-framerate', str(fps),
+               '-i', pattern, '-pix_fmt', 'yuv420p',
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', video]
+    try:
+        subprocess.check_call(command)
+    except OSError:
+        raise IOError("Can't find ffmpeg on this system, it's needed to "
+                      "encode videos")
+    return video
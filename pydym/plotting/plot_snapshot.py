@@ -28,9 +28,8 @@ def plot_snapshot(snapshot, axes=None, decimate_by=10):
                       colors=['red', 'gold'], extend='both',
                       alpha=0.6, zorder=1)
     except AttributeError:
-        _, _, xvel = snapshot.interpolate('velocity', 'x')
-        _, _, yvel = snapshot.interpolate('velocity', 'y')
-        axes.contourf(xgrid, ygrid, numpy.sqrt(xvel ** 2 + yvel ** 2),
+        xgrid, ygrid, velocity = snapshot.interpolate('velocity')
+        axes.contourf(xgrid, ygrid, numpy.sqrt((velocity ** 2).sum(axis=-1)),
                       cmap='Spectral', alpha=0.7, zorder=1)
 
     # Plot velocity field
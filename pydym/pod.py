@@ -0,0 +1,183 @@
+""" file:   pod.py (pydym)
+
+    description: Streaming proper orthogonal decomposition (truncated SVD)
+        of snapshot matrices
+"""
+
+from __future__ import division
+
+import numpy
+from numpy import linalg
+
+from .utilities import herm_transpose
+
+
+def incremental_svd(blocks, tolerance=1e-3, max_rank=None):
+    """ Calculate a truncated SVD of a matrix in a single pass over blocks of
+        its columns
+
+        This uses Brand's incremental SVD update: each new block of columns
+        is projected onto the current left singular vectors, the residual is
+        orthogonalized with a QR decomposition, and the SVD of a small
+        (rank + block size) square matrix updates the factors. Only the
+        factors and one block are held in memory at a time.
+
+        After each update the smallest singular values are dropped, as long
+        as the total energy discarded stays within the error budget, so the
+        result satisfies
+
+            ||X - U diag(sigma) V^H||_F <= tolerance * ||X||_F
+
+        (the truncation errors from each step are orthogonal, so they add in
+        quadrature).
+
+        :param blocks: The blocks of columns
+        :type blocks: iterator over 2D arrays with the same number of rows
+        :param tolerance: The relative error allowed in the Frobenius norm.
+            Optional, defaults to 1e-3.
+        :type tolerance: float
+        :param max_rank: The maximum number of singular values to keep.
+            Optional, defaults to no limit. If this is set the error may
+            exceed the tolerance.
+        :type max_rank: int
+        :returns: the left singular vectors U (n_rows x rank), the singular
+            values sigma, the right singular vectors V (n_columns x rank) and
+            the relative error of the approximation
+    """
+    U, sigma, V = None, None, None
+    total_energy, discarded = 0, 0
+    for block in blocks:
+        block = numpy.asarray(block, dtype=float)
+        n_block = block.shape[1]
+        if n_block == 0:
+            continue
+        total_energy += (block ** 2).sum()
+
+        if U is None:
+            U, sigma, Vstar = linalg.svd(block, full_matrices=False)
+            V = herm_transpose(Vstar)
+        else:
+            # Split the new columns into the part in the span of U and the
+            # orthogonal residual
+            rank, n_old = len(sigma), V.shape[0]
+            projected = numpy.dot(herm_transpose(U), block)
+            residual = block - numpy.dot(U, projected)
+            J, K = linalg.qr(residual)
+
+            # Diagonalize the small update matrix and rotate the factors
+            update = numpy.block([
+                [numpy.diag(sigma), projected],
+                [numpy.zeros((K.shape[0], rank)), K]])
+            Up, sigma, Vpstar = linalg.svd(update, full_matrices=False)
+            U = numpy.dot(numpy.hstack([U, J]), Up)
+            V_expanded = numpy.zeros((n_old + n_block, rank + n_block))
+            V_expanded[:n_old, :rank] = V
+            V_expanded[n_old:, rank:] = numpy.identity(n_block)
+            V = numpy.dot(V_expanded, herm_transpose(Vpstar))
+
+        # Truncate while we're still within the error budget. tail[k] is the
+        # energy discarded if we keep k singular values
+        budget = tolerance ** 2 * total_energy - discarded
+        tail = numpy.r_[numpy.cumsum((sigma ** 2)[::-1])[::-1], 0]
+        within_budget = numpy.flatnonzero(tail <= budget)
+        keep = within_budget[0] if len(within_budget) else len(sigma)
+        keep = max(int(keep), 1)
+        if max_rank is not None:
+            keep = min(keep, max_rank)
+        discarded += tail[keep]
+        U, sigma, V = U[:, :keep], sigma[:keep], V[:, :keep]
+
+    if U is None:
+        raise ValueError("Can't decompose a matrix without any columns")
+    error = numpy.sqrt(discarded / total_energy) if total_energy else 0
+    return U, sigma, V, error
+
+
+def shift_factors(U, sigma, V):
+    """ Get the factors needed for DMD from the SVD of a snapshot matrix
+
+        Given X = U diag(sigma) V^H, this calculates the SVD of the 'past'
+        snapshots X[:, :-1] and the projection of the 'current' snapshots
+        X[:, 1:] onto the past POD modes, without ever forming X. Only
+        matrices with one side the size of the rank are decomposed.
+
+        :returns: the left singular vectors, singular values and right
+            singular vectors of the past snapshots, and the projected
+            current snapshots
+    """
+    V_past, V_current = V[:-1], V[1:]
+    Q, R = linalg.qr(V_past)
+    A, sigma_past, Bstar = linalg.svd(sigma[:, None] * herm_transpose(R),
+                                      full_matrices=False)
+    U_past = numpy.dot(U, A)
+    V_past = numpy.dot(Q, herm_transpose(Bstar))
+    projected = numpy.dot(herm_transpose(A),
+                          sigma[:, None] * herm_transpose(V_current))
+    return U_past, sigma_past, V_past, projected
+
+
+class FactoredMatrix(object):
+
+    """ A matrix stored as truncated SVD factors U diag(sigma) V^H
+
+        This can be used as the source for a SnapshotMatrix - blocks are
+        reconstructed from the factors as they're read.
+
+        :param U: The left singular vectors (n_rows x rank)
+        :param sigma: The singular values
+        :param V: The right singular vectors (n_columns x rank)
+    """
+
+    # Any selection of rows can be read at once
+    fancy_indexing = True
+
+    def __init__(self, U, sigma, V):
+        super(FactoredMatrix, self).__init__()
+        self.U = numpy.asarray(U)
+        self.sigma = numpy.asarray(sigma)
+        self.V = numpy.asarray(V)
+
+    @property
+    def shape(self):
+        return (self.U.shape[0], self.V.shape[0])
+
+    @property
+    def dtype(self):
+        return self.U.dtype
+
+    @property
+    def ndim(self):
+        return 2
+
+    @property
+    def rank(self):
+        return len(self.sigma)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read(self, rows, columns):
+        """ Reconstruct the given block of the matrix
+
+            :param rows: The rows to read - an integer, slice or array of
+                indices
+            :param columns: The columns to read, as for rows
+        """
+        if isinstance(rows, range):
+            rows = numpy.asarray(rows)
+        if isinstance(columns, range):
+            columns = numpy.asarray(columns)
+        left = self.U[rows] * self.sigma
+        right = self.V[columns]
+        return numpy.dot(left, herm_transpose(right))
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        return self.read(*key)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.read(slice(None), slice(None))
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
@@ -0,0 +1,73 @@
+""" file:   preprocessing.py (pydym)
+
+    description: Streaming statistics for centering and normalizing
+        snapshot matrices
+"""
+
+from __future__ import division
+
+import numpy
+
+
+def running_moments(blocks):
+    """ Calculate the mean and variance of each row of a matrix, given an
+        iterator over blocks of its columns
+
+        Uses the pairwise update of Chan et al. (a blocked version of
+        Welford's algorithm), so only one block is held in memory at a time
+        and the result is numerically stable.
+
+        :param blocks: The blocks of columns
+        :type blocks: iterator over 2D arrays with the same number of rows
+        :returns: the number of columns, and the mean and (population)
+            variance of each row
+    """
+    count, mean, sum_sq = 0, None, None
+    for block in blocks:
+        block = numpy.asarray(block, dtype=float)
+        n_block = block.shape[1]
+        if n_block == 0:
+            continue
+        block_mean = block.mean(axis=1)
+        block_sum_sq = ((block - block_mean[:, None]) ** 2).sum(axis=1)
+        if mean is None:
+            count, mean, sum_sq = n_block, block_mean, block_sum_sq
+            continue
+        total = count + n_block
+        delta = block_mean - mean
+        mean = mean + delta * (n_block / total)
+        sum_sq = sum_sq + block_sum_sq + delta ** 2 * (count * n_block / total)
+        count = total
+    if mean is None:
+        raise ValueError("Can't calculate statistics without any snapshots")
+    return count, mean, sum_sq / count
+
+
+def component_scales(mean, variance, keys, center=True):
+    """ Calculate a scale for each dataset in a snapshot matrix
+
+        Each dataset is scaled by its root-mean-square value (about the mean
+        if center is True), so that e.g. velocity and pressure contribute
+        equally to the snapshot matrix. All the components of a vector
+        dataset (e.g. 'velocity/x' and 'velocity/y') share the same scale,
+        so directions are preserved.
+
+        :param mean: The mean of each row of the snapshot matrix
+        :param variance: The variance of each row of the snapshot matrix
+        :param keys: The names of the components interleaved in each row
+        :type keys: sequence of strings
+        :param center: Whether the data will be centered before scaling
+        :type center: bool
+        :returns: an array with the scale for each component
+    """
+    n_components = len(keys)
+    power = variance if center else variance + mean ** 2
+    datasets = [k.split('/')[0] for k in keys]
+    scales = numpy.ones(n_components)
+    for dataset in set(datasets):
+        components = [i for i, d in enumerate(datasets) if d == dataset]
+        rms = numpy.sqrt(numpy.mean([power[i::n_components].mean()
+                                     for i in components]))
+        if rms > 0:
+            scales[components] = rms
+    return scales
@@ -0,0 +1,164 @@
+""" file:   quantization.py (pydym)
+
+    description: Lossy quantized storage for snapshot datasets
+"""
+
+from __future__ import division
+
+import numpy
+
+
+def _unsigned_type(bits):
+    """ Return the smallest unsigned integer type with the given number of
+        bits
+    """
+    for dtype in (numpy.uint8, numpy.uint16, numpy.uint32):
+        if bits <= 8 * numpy.dtype(dtype).itemsize:
+            return numpy.dtype(dtype)
+    raise ValueError('Can only quantize to at most 32 bits, not '
+                     '{0}'.format(bits))
+
+
+class Quantizer(object):
+
+    """ Encode values for storage in a dataset, and decode them on read
+
+        There are three kinds of quantization:
+
+            'float' - values are stored as a smaller float type (e.g.
+                float16, which keeps about 3 significant digits)
+            'fixed' - values are stored as integers q, and decoded as
+                offset + q * scale. Values outside the range of the integer
+                type are clipped.
+            'none' - values are stored as they are
+
+        Use `Quantizer.from_spec` to make a quantizer from the options
+        passed to Observations, and `Quantizer.from_dataset` to get the
+        quantizer for an existing dataset.
+
+        :param kind: The kind of quantization
+        :type kind: str
+        :param dtype: The type stored in the dataset
+        :param scale: The size of one step for fixed-point quantization
+        :param offset: The value stored as zero for fixed-point quantization
+    """
+
+    def __init__(self, kind='none', dtype=float, scale=None, offset=None):
+        super(Quantizer, self).__init__()
+        self.kind = kind
+        self.dtype = numpy.dtype(dtype)
+        self.scale, self.offset = scale, offset
+
+    @classmethod
+    def from_spec(cls, spec):
+        """ Make a quantizer from a specification
+
+            :param spec: One of
+                - None, to store values as 64-bit floats
+                - 'float32' or 'float16', to store smaller floats
+                - {'digits': d}, to store fixed-point values with d decimal
+                  places (e.g. 4 digits stores multiples of 0.0001)
+                - {'bits': b, 'range': (low, high)}, to store b-bit
+                  unsigned integers spanning the range (e.g. 8 bits over
+                  (0, 1) for a tracer)
+        """
+        if spec is None:
+            return cls()
+        elif spec in ('float32', 'float16'):
+            return cls('float', dtype=spec)
+        elif isinstance(spec, dict) and 'digits' in spec:
+            return cls('fixed', dtype=numpy.int32,
+                       scale=10. ** -int(spec['digits']), offset=0.)
+        elif isinstance(spec, dict) and 'bits' in spec:
+            bits = int(spec['bits'])
+            low, high = spec['range']
+            if not high > low:
+                raise ValueError('Quantization range {0} is '
+                                 'empty'.format(spec['range']))
+            return cls('fixed', dtype=_unsigned_type(bits),
+                       scale=(high - low) / (2 ** bits - 1),
+                       offset=float(low))
+        raise ValueError('Unknown quantization {0}, should be None, '
+                         "'float32', 'float16', {{'digits': d}} or "
+                         "{{'bits': b, 'range': (low, high)}}".format(spec))
+
+    @classmethod
+    def from_dataset(cls, dset):
+        """ Get the quantizer for an existing dataset from its attributes
+        """
+        attrs = dset.attrs
+        if 'scale' in attrs:
+            return cls('fixed', dtype=dset.dtype,
+                       scale=float(attrs['scale']),
+                       offset=float(attrs['offset']))
+        elif dset.dtype != numpy.dtype(float):
+            return cls('float', dtype=dset.dtype)
+        return cls()
+
+    @property
+    def lossy(self):
+        return self.kind != 'none'
+
+    def dataset_options(self):
+        """ Return the options to pass to create_dataset
+
+            Integers are also bit-packed with HDF5's (lossless) scale-offset
+            filter, so only the bits needed for the actual range of values
+            are stored. Other backends ignore the filter.
+        """
+        options = dict(dtype=self.dtype)
+        if self.kind == 'fixed':
+            options['scaleoffset'] = 0
+        return options
+
+    def write_attrs(self, attrs):
+        """ Store the quantization parameters in the dataset attributes
+        """
+        if self.kind == 'fixed':
+            attrs['scale'] = self.scale
+            attrs['offset'] = self.offset
+
+    def encode(self, values):
+        """ Convert values to the stored representation
+        """
+        values = numpy.asarray(values, dtype=float)
+        if self.kind == 'fixed':
+            info = numpy.iinfo(self.dtype)
+            steps = numpy.rint((values - self.offset) / self.scale)
+            return numpy.clip(steps, info.min, info.max).astype(self.dtype)
+        return values.astype(self.dtype)
+
+    def decode(self, values):
+        """ Convert stored values back to 64-bit floats
+        """
+        values = numpy.asarray(values)
+        if self.kind == 'fixed':
+            return self.offset + values * self.scale
+        elif self.kind == 'float':
+            return values.astype(float)
+        return values
+
+    def round_trip_error(self, values, encoded=None, axis=None):
+        """ Return the maximum absolute error and the relative L2 error from
+            encoding and decoding the given values
+
+            :param values: The original values
+            :param encoded: The encoded values, if we have them already.
+                Optional.
+            :param axis: The axis to take the L2 norms along. Optional, by
+                default the norm of all the values is used. If given, the
+                relative error is the largest for any slice along the axis
+                (e.g. axis=0 gives the worst column).
+            :type axis: int
+        """
+        values = numpy.asarray(values, dtype=float)
+        if encoded is None:
+            encoded = self.encode(values)
+        error = self.decode(encoded) - values
+        if not error.size:
+            return 0., 0.
+        norm = numpy.linalg.norm(values, axis=axis)
+        relative = numpy.linalg.norm(error, axis=axis) \
+            / numpy.where(norm > 0, norm, 1)
+        relative = numpy.where(norm > 0, relative, 0)
+        return float(abs(error).max()), float(numpy.max(relative))
@@ -6,19 +6,17 @@
     description: Class to store some spatially-located data
 """
 
+import numpy
+
 from .utilities import interpolate, AXIS_LABELS
 
 
-class Snapshot(object):
+class SnapshotBase(object):
 
-    """ A class to store spatially located data
+    """ Methods shared by Snapshot and CompactSnapshot
     """
 
-    def __init__(self, position, **datasets):
-        self.position = position
-        self.n_dimensions = len(position[:, 0])
-        for key, value in datasets.items():
-            setattr(self, key, value)
+    __slots__ = ()
 
     def __len__(self):
         return len(self.position[0])
@@ -29,12 +27,141 @@ class Snapshot(object):
     def __getitem__(self, key):
         return getattr(self, key)
 
-    def interpolate(self, attribute, axis=None, decimate_by=None):
+    def interpolate(self, attribute, axis=None, decimate_by=None,
+                    shape=None):
         """ Return the given attribute interpolated over a regular grid
+
+            Vector attributes are interpolated all at once if no axis is
+            given, with the components along the last axis of the result.
+            The triangulation is cached, so interpolating several attributes
+            of the same snapshot (or snapshots with the same positions) only
+            triangulates the positions once. See
+            pydym.utilities.interpolate for details.
         """
         # Get the values for the given attribute
         values = getattr(self, attribute)
         if axis is not None:
             values = values[AXIS_LABELS[axis]]
+        elif numpy.ndim(values) == 2:
+            values = numpy.transpose(values)
+
+        return interpolate(self.position, values, decimate_by=decimate_by,
+                           shape=shape)
+
+
+class Snapshot(SnapshotBase):
+
+    """ A class to store spatially located data
+    """
+
+    def __init__(self, position, **datasets):
+        self.position = position
+        self.n_dimensions = len(position[:, 0])
+        for key, value in datasets.items():
+            setattr(self, key, value)
+
 
-        return interpolate(self.position, values, decimate_by=decimate_by)
+class CompactSnapshot(SnapshotBase):
+
+    """ A snapshot whose fields are views into a single buffer
+
+        Instances have no __dict__: the positions are a shared reference
+        (so all the snapshots from one Observations share one array), and
+        each field is a slice of the rows of `buffer`, given by `layout`.
+        The buffer can be a view into a bigger block (e.g. the block read
+        by `Observations.iter_snapshots`), so holding lots of snapshots
+        costs little more than the field data itself.
+
+        Fields can be read and written like attributes, as for Snapshot,
+        but new fields can't be added. Use `copy` to get a snapshot which
+        doesn't share its buffer.
+
+        :param position: The sample positions
+        :type position: array of shape (n_dimensions, n_samples)
+        :param buffer: The values for every field
+        :type buffer: array of shape (n_components, n_samples)
+        :param layout: The rows of the buffer for each field, as a slice
+            for vector fields or an integer for scalar fields
+        :type layout: dict
+        :param time: The time of the snapshot. Optional.
+        :type time: float
+        :param properties: Properties shared with other snapshots. Optional.
+        :type properties: dict
+    """
+
+    __slots__ = ('position', 'time', 'properties', 'buffer', 'layout')
+
+    def __init__(self, position, buffer, layout, time=None,
+                 properties=None):
+        set_slot = super(CompactSnapshot, self).__setattr__
+        set_slot('layout', layout)
+        set_slot('position', position)
+        set_slot('buffer', buffer)
+        set_slot('time', time)
+        set_slot('properties', properties)
+
+    @classmethod
+    def layout_for(cls, vectors, scalars, n_dimensions):
+        """ Work out a buffer layout for some fields
+
+            :param vectors: The names of the vector fields
+            :param scalars: The names of the scalar fields
+            :param n_dimensions: The number of components in each vector
+            :returns: the layout, and the number of rows in the buffer
+        """
+        layout, n_components = {}, 0
+        for name in vectors:
+            layout[name] = slice(n_components, n_components + n_dimensions)
+            n_components += n_dimensions
+        for name in scalars:
+            layout[name] = n_components
+            n_components += 1
+        return layout, n_components
+
+    @property
+    def n_dimensions(self):
+        return len(self.position)
+
+    @property
+    def fields(self):
+        """ The names of the fields in the snapshot
+        """
+        return tuple(self.layout)
+
+    def __getattr__(self, name):
+        # Only called for names which aren't slots, i.e. fields
+        try:
+            layout = super(CompactSnapshot, self).__getattribute__('layout')
+        except AttributeError:
+            raise AttributeError(name)
+        if name not in layout:
+            raise AttributeError("Snapshot has no field '{0}'".format(name))
+        return self.buffer[layout[name]]
+
+    def __setattr__(self, name, value):
+        if name in self.layout:
+            self.buffer[self.layout[name]] = value
+        else:
+            super(CompactSnapshot, self).__setattr__(name, value)
+
+    def __reduce__(self):
+        return (CompactSnapshot, (self.position, self.buffer, self.layout,
+                                  self.time, self.properties))
+
+    def copy(self):
+        """ Return a copy of the snapshot with its own buffer
+        """
+        return CompactSnapshot(self.position, numpy.array(self.buffer),
+                               self.layout, time=self.time,
+                               properties=self.properties)
+
+    def to_snapshot(self):
+        """ Return an ordinary pydym.Snapshot with its own copy of the
+            positions, fields and properties
+        """
+        snapshot = Snapshot(numpy.array(self.position), **dict(
+            (name, numpy.array(getattr(self, name))) for name in self.layout))
+        snapshot.time = self.time
+        snapshot.properties = None if self.properties is None \
+            else dict(self.properties)
+        return snapshot
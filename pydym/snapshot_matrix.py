@@ -0,0 +1,395 @@
+""" file:   snapshot_matrix.py (pydym)
+
+    description: Lazy views of the snapshot matrix
+"""
+
+from __future__ import division
+
+import numpy
+
+from .pod import FactoredMatrix
+
+
+def index_into(rng, key):
+    """ Index a range with an integer, slice or array of indices
+
+        Integers and slices give back an integer or a range, so views of
+        views stay lazy. Anything else gives back a numpy array of indices.
+    """
+    if isinstance(key, (int, numpy.integer)):
+        return int(rng[int(key)])
+    elif isinstance(key, slice):
+        return rng[key]
+    return numpy.asarray(rng)[key]
+
+
+def index_runs(index):
+    """ Split a sorted array of unique indices into runs of consecutive
+        values
+
+        :returns: a list of (start, stop) pairs, one for each run
+    """
+    index = numpy.asarray(index, dtype=int)
+    if len(index) == 0:
+        return []
+    breaks = numpy.flatnonzero(numpy.diff(index) != 1) + 1
+    starts = index[numpy.r_[0, breaks]]
+    stops = index[numpy.r_[breaks - 1, len(index) - 1]] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def read_rows(source, index, columns=None):
+    """ Read the given rows from a dataset
+
+        The rows are coalesced into runs of consecutive indices, and each
+        run is read as a single contiguous (hyperslab) read.
+
+        :param source: The dataset to read from
+        :param index: A sorted array of unique row indices
+        :param columns: The columns to read - anything h5py accepts as an
+            index. Optional, if None then source is treated as 1D.
+    """
+    if columns is None:
+        blocks = [numpy.asarray(source[start:stop])
+                  for start, stop in index_runs(index)]
+    else:
+        blocks = [numpy.asarray(source[start:stop, columns])
+                  for start, stop in index_runs(index)]
+    if not blocks:
+        if columns is None:
+            return numpy.empty((0,), dtype=source.dtype)
+        return numpy.asarray(source[0:0, columns])
+    return numpy.concatenate(blocks, axis=0)
+
+
+def _as_selection(index):
+    """ Convert an index into something we can pass to h5py, along with a
+        function to rearrange the result into the order asked for
+    """
+    if isinstance(index, int):
+        return index, None
+    elif isinstance(index, range):
+        if len(index) == 0:
+            return slice(0, 0), None
+        elif index.step > 0:
+            return slice(index.start, index.stop, index.step), None
+        # Read in increasing order and flip afterwards
+        rev = index[::-1]
+        return (slice(rev.start, rev.stop, rev.step),
+                lambda block, axis: numpy.flip(block, axis))
+
+    # h5py needs a sorted list of unique indices
+    index = numpy.asarray(index)
+    unique, inverse = numpy.unique(index, return_inverse=True)
+    if len(unique) == len(index) and numpy.all(unique == index):
+        return unique.tolist(), None
+    return (unique.tolist(),
+            lambda block, axis: numpy.take(block, inverse, axis=axis))
+
+
+def read_block(source, rows, columns):
+    """ Read a block from a 2D dataset given the rows and columns to read
+
+        :param source: The dataset to read from
+        :param rows: The rows to read - an integer, range or sequence of
+            indices
+        :param columns: The columns to read, as for rows
+
+        Ranges with positive steps are mapped onto strided (hyperslab) reads
+        so that only the data we need comes off the disk. Sources which set
+        `fancy_indexing` get lists of rows directly rather than as runs.
+    """
+    row_key, row_fix = _as_selection(rows)
+    column_key, column_fix = _as_selection(columns)
+    if isinstance(row_key, list) \
+            and not getattr(source, 'fancy_indexing', False):
+        block = read_rows(source, row_key, column_key)
+    else:
+        block = numpy.asarray(source[row_key, column_key])
+    column_axis = 0 if isinstance(rows, int) else 1
+    if row_fix is not None:
+        block = row_fix(block, 0)
+    if column_fix is not None:
+        block = column_fix(block, column_axis)
+    return block
+
+
+def _as_index(key, length):
+    """ Convert an integer, slice or list of indices into an integer, range
+        or array of indices
+    """
+    if isinstance(key, (int, numpy.integer)):
+        return int(key)
+    elif isinstance(key, slice):
+        return range(*key.indices(length))
+    return numpy.asarray(key, dtype=int)
+
+
+class InterleavedMatrix(object):
+
+    """ A lazy view of several datasets interleaved row by row
+
+        Row `i * n_components + j` of the matrix is row `i` of component `j`,
+        which is the layout of the snapshot matrix. Nothing is copied - each
+        block is read from the component datasets when the matrix is
+        indexed, so this can be used as the source for a SnapshotMatrix when
+        we can't (or don't want to) store an interleaved copy.
+
+        :param read: A function read(key, rows, columns) which reads a block
+            from one of the component datasets, where rows and columns are
+            integers, ranges or sorted arrays of indices
+        :param keys: The names of the component datasets, in the order they
+            are interleaved
+        :type keys: sequence of strings
+        :param shape: The shape of each component dataset, as (n_samples,
+            n_snapshots)
+        :type shape: tuple
+    """
+
+    # Any selection of rows can be read at once
+    fancy_indexing = True
+
+    def __init__(self, read, keys, shape):
+        super(InterleavedMatrix, self).__init__()
+        self._read = read
+        self.keys = tuple(keys)
+        self.n_samples, self.n_snapshots = shape
+
+    @property
+    def shape(self):
+        return (len(self.keys) * self.n_samples, self.n_snapshots)
+
+    @property
+    def dtype(self):
+        return numpy.dtype(float)
+
+    @property
+    def ndim(self):
+        return 2
+
+    def __len__(self):
+        return self.shape[0]
+
+    def read(self, rows, columns):
+        """ Read the given block of the matrix
+
+            :param rows: The rows to read - an integer, slice or sorted array
+                of indices
+            :param columns: The columns to read, as for rows
+        """
+        n_components = len(self.keys)
+        columns = _as_index(columns, self.n_snapshots)
+        rows = _as_index(rows, self.shape[0])
+        if isinstance(rows, int):
+            samples, component = divmod(rows, n_components)
+            return numpy.asarray(self._read(self.keys[component], samples,
+                                            columns), dtype=float)
+
+        # Read the rows for each component in one go
+        rows = numpy.asarray(rows, dtype=int)
+        n_columns = 1 if isinstance(columns, int) else len(columns)
+        block = numpy.empty((len(rows), n_columns), dtype=float)
+        samples, components = numpy.divmod(rows, n_components)
+        for component, key in enumerate(self.keys):
+            select = components == component
+            if not select.any():
+                continue
+            index = samples[select]
+            if index[-1] - index[0] + 1 == len(index):
+                # Consecutive samples can be read as a single slab
+                index = range(index[0], index[-1] + 1)
+            values = self._read(key, index, columns)
+            block[select] = numpy.reshape(values, (len(index), n_columns))
+        if isinstance(columns, int):
+            return block[:, 0]
+        return block
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        return self.read(*key)
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.read(slice(None), slice(None))
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+
+class SnapshotMatrix(object):
+
+    """ A lazy view of a snapshot matrix
+
+        The snapshot matrix has one row per measurement (samples x
+        components) and one column per snapshot. A SnapshotMatrix wraps a 2D
+        array-like source (an HDF5 dataset, memory-mapped array or numpy
+        array) and a selection of its rows and columns. Selecting a time
+        window or thinning the snapshots just makes a new view, and data is
+        only read from the source when the view is indexed.
+
+        :param source: The full snapshot matrix
+        :type source: 2D array-like
+        :param columns: The columns of the source in this view. Optional,
+            defaults to all columns.
+        :type columns: range
+        :param keys: The names of the components interleaved in each row.
+            Optional.
+        :type keys: sequence of strings
+        :param rows: The rows of the source in this view. Optional, defaults
+            to all rows.
+        :type rows: range or sorted array of indices
+        :param offset: A value to subtract from each row of the source as it
+            is read (e.g. the temporal mean). Optional.
+        :type offset: array with one entry per row of the source
+        :param scale: A value to divide each row of the source by as it is
+            read (after subtracting offset). Optional.
+        :type scale: array with one entry per row of the source
+    """
+
+    def __init__(self, source, columns=None, keys=None, rows=None,
+                 offset=None, scale=None):
+        super(SnapshotMatrix, self).__init__()
+        self.source = source
+        n_rows, n_columns = source.shape
+        self.rows = range(n_rows) if rows is None else rows
+        self.columns = range(n_columns) if columns is None else columns
+        self.keys = keys
+        self.offset, self.scale = offset, scale
+
+    def _view(self, rows=None, columns=None, offset=False, scale=False):
+        """ Return a new view of the same source, changing the given
+            properties
+        """
+        return SnapshotMatrix(
+            self.source,
+            columns=self.columns if columns is None else columns,
+            keys=self.keys,
+            rows=self.rows if rows is None else rows,
+            offset=self.offset if offset is False else offset,
+            scale=self.scale if scale is False else scale)
+
+    @property
+    def shape(self):
+        return (len(self.rows), len(self.columns))
+
+    @property
+    def dtype(self):
+        return self.source.dtype
+
+    @property
+    def ndim(self):
+        return 2
+
+    def __len__(self):
+        return len(self.rows)
+
+    def select(self, start=None, stop=None, stride=None):
+        """ Select a window of snapshots
+
+            Indices are relative to this view, so selections can be chained.
+            No data is read or copied.
+
+            :param start: The first snapshot to include. Optional, defaults
+                to the first snapshot.
+            :type start: int
+            :param stop: The snapshot to stop before. Optional, defaults to
+                including everything up to the last snapshot.
+            :type stop: int
+            :param stride: Take every `stride`th snapshot. Optional,
+                defaults to 1.
+            :type stride: int
+            :returns: a new SnapshotMatrix
+        """
+        return self._view(columns=self.columns[start:stop:stride])
+
+    def select_samples(self, index):
+        """ Restrict the view to the rows for the given samples
+
+            :param index: A sorted array of sample indices. The rows for all
+                the components of each sample are kept.
+            :returns: a new SnapshotMatrix
+        """
+        n_components = len(self.keys) if self.keys else 1
+        rows = (numpy.asarray(index, dtype=int)[:, None] * n_components
+                + numpy.arange(n_components)).ravel()
+        return self._view(rows=numpy.asarray(self.rows)[rows])
+
+    def normalize(self, offset=None, scale=None):
+        """ Return a view which subtracts offset from each row and divides by
+            scale as the data is read
+
+            The data in the source isn't changed, and no normalized copy is
+            made - each block is normalized as it's read.
+
+            :param offset: The value to subtract from each row of the source.
+                Optional, None means no offset.
+            :param scale: The value to divide each row of the source by.
+                Optional, None means no scaling.
+            :returns: a new SnapshotMatrix
+        """
+        return self._view(offset=offset, scale=scale)
+
+    def factors(self):
+        """ Return the truncated SVD factors of this view, if the source is
+            stored in factored form
+
+            Factors are only available for views of all the rows of a
+            FactoredMatrix without any normalization applied.
+
+            :returns: a tuple (U, sigma, V) such that the view is
+                U diag(sigma) V^H, or None
+        """
+        if not isinstance(self.source, FactoredMatrix):
+            return None
+        elif self.offset is not None or self.scale is not None:
+            return None
+        elif not (isinstance(self.rows, range)
+                  and self.rows == range(self.source.shape[0])):
+            return None
+        source = self.source
+        return source.U, source.sigma, source.V[numpy.asarray(self.columns)]
+
+    def __getitem__(self, key):
+        """ Read a block of the snapshot matrix into a numpy array
+        """
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        if len(key) != 2:
+            raise IndexError('SnapshotMatrix only has two dimensions')
+        row_key, column_key = key
+        rows = index_into(self.rows, row_key)
+        columns = index_into(self.columns, column_key)
+        block = read_block(self.source, rows, columns)
+        if self.offset is None and self.scale is None:
+            return block
+
+        # Apply the normalization, broadcasting the row values along the
+        # columns of the block
+        row_index = rows if isinstance(rows, int) else numpy.asarray(rows)
+        if isinstance(columns, int):
+            expand = lambda values: values
+        else:
+            expand = lambda values: numpy.asarray(values)[..., None]
+        block = numpy.asarray(block, dtype=float)
+        if self.offset is not None:
+            block = block - expand(self.offset[row_index])
+        if self.scale is not None:
+            block = block / expand(self.scale[row_index])
+        return block
+
+    def __array__(self, dtype=None, copy=None):
+        values = self[:, :]
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+    def iter_blocks(self, block_size=64):
+        """ Iterate over the snapshots in blocks of columns
+
+            :param block_size: The number of snapshots in each block
+            :type block_size: int
+            :returns: an iterator over (start, block) pairs, where start is
+                the index of the first snapshot in the block
+        """
+        for start in range(0, self.shape[1], block_size):
+            yield start, self[:, start:start + block_size]
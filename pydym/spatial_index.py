@@ -0,0 +1,174 @@
+""" file:   spatial_index.py (pydym)
+
+    description: Spatial index over sample positions
+
+    Samples are bucketed into a regular grid of cells, with about
+    LEAF_SIZE samples in each cell. The index is just a few plain arrays
+    (the samples sorted by cell and the offset of each cell in that order),
+    so it can be stored alongside the data and read back without trusting
+    anything but numbers.
+"""
+
+from __future__ import division
+
+import hashlib
+from itertools import product
+
+import numpy
+
+# The average number of samples in each cell
+LEAF_SIZE = 8
+
+
+def positions_checksum(positions):
+    """ Return a checksum for some sample positions, so we can tell whether
+        anything cached for them is out of date
+    """
+    positions = numpy.ascontiguousarray(positions, dtype=float)
+    return hashlib.sha1(positions.tobytes()).hexdigest()
+
+
+class GridIndex(object):
+
+    """ A nearest-neighbour index which buckets samples into grid cells
+
+        Use `GridIndex.build` to make a new index, or pass in stored arrays
+        to load one.
+
+        :param positions: The sample positions
+        :type positions: array with shape (n_dimensions, n_samples)
+        :param lower: The lower corner of the grid
+        :type lower: array with one entry per dimension
+        :param cell_size: The size of the cells along each dimension
+        :type cell_size: array with one entry per dimension
+        :param shape: The number of cells along each dimension
+        :type shape: tuple
+        :param order: The samples sorted by the (C-order) cell they're in
+        :type order: array of ints
+        :param offsets: The start of each cell in order, with an extra
+            entry at the end for the number of samples
+        :type offsets: array of ints
+    """
+
+    # The arrays which make up the index
+    ARRAYS = ('lower', 'cell_size', 'shape', 'order', 'offsets')
+
+    def __init__(self, positions, lower, cell_size, shape, order, offsets):
+        super(GridIndex, self).__init__()
+        self.data = numpy.asarray(positions, dtype=float).T
+        self.lower = numpy.asarray(lower, dtype=float)
+        self.cell_size = numpy.asarray(cell_size, dtype=float)
+        self.shape = tuple(int(n) for n in shape)
+        self.order = numpy.asarray(order, dtype=int)
+        self.offsets = numpy.asarray(offsets, dtype=int)
+        n_samples, n_dimensions = self.data.shape
+        if not (len(self.lower) == len(self.cell_size) == len(self.shape)
+                == n_dimensions) \
+                or numpy.any(self.cell_size <= 0) \
+                or len(self.offsets) != numpy.prod(self.shape) + 1 \
+                or len(self.order) != n_samples \
+                or self.offsets[-1] != n_samples \
+                or numpy.any(numpy.diff(self.offsets) < 0):
+            raise ValueError("Spatial index doesn't match the positions")
+
+    @classmethod
+    def build(cls, positions, leaf_size=LEAF_SIZE):
+        """ Bucket some sample positions into a grid
+
+            :param positions: The sample positions
+            :type positions: array with shape (n_dimensions, n_samples)
+            :param leaf_size: The average number of samples in each cell
+            :type leaf_size: int
+            :returns: a new GridIndex
+        """
+        positions = numpy.asarray(positions, dtype=float)
+        n_samples = positions.shape[1]
+        lower = positions.min(axis=1)
+        span = positions.max(axis=1) - lower
+
+        # Aim for roughly square cells. Flat dimensions just get one cell
+        flat = span <= 0
+        n_cells = max(n_samples / leaf_size, 1)
+        if flat.all():
+            size = 1.
+        else:
+            size = (numpy.prod(span[~flat]) / n_cells) \
+                ** (1 / numpy.count_nonzero(~flat))
+        shape = numpy.where(flat, 1, numpy.ceil(span / size)).astype(int)
+        shape = numpy.maximum(shape, 1)
+        cell_size = numpy.where(flat, 1., span / shape)
+
+        # Sort the samples by cell
+        cells = cls._cells(positions, lower, cell_size, shape)
+        order = numpy.argsort(cells, kind='stable')
+        offsets = numpy.searchsorted(cells[order],
+                                     numpy.arange(numpy.prod(shape) + 1))
+        return cls(positions, lower, cell_size, shape, order, offsets)
+
+    @staticmethod
+    def _cells(positions, lower, cell_size, shape):
+        """ Return the flat index of the cell each position is in
+        """
+        coords = numpy.floor((positions - lower[:, None])
+                             / cell_size[:, None]).astype(int)
+        coords = numpy.clip(coords, 0, numpy.asarray(shape)[:, None] - 1)
+        return numpy.ravel_multi_index(tuple(coords), tuple(shape))
+
+    def query(self, points):
+        """ Find the nearest sample to each point
+
+            This matches scipy.spatial.cKDTree.query with k=1.
+
+            :param points: The points to look up
+            :type points: array with shape (n_points, n_dimensions)
+            :returns: the distance to the nearest sample and the index of
+                that sample, for each point
+        """
+        points = numpy.atleast_2d(numpy.asarray(points, dtype=float))
+        distances = numpy.empty(len(points))
+        samples = numpy.empty(len(points), dtype=int)
+        for idx, point in enumerate(points):
+            distances[idx], samples[idx] = self._nearest(point)
+        return distances, samples
+
+    def _nearest(self, point):
+        """ Find the nearest sample to a single point
+
+            We search rings of cells around the point's cell, stopping once
+            nothing in the next ring can be closer than the best so far.
+        """
+        shape = numpy.asarray(self.shape)
+        centre = numpy.clip(numpy.floor((point - self.lower)
+                                        / self.cell_size).astype(int),
+                            0, shape - 1)
+        best, best_sample = numpy.inf, -1
+        for ring in range(int(shape.max())):
+            if best <= (ring - 1) * self.cell_size.min():
+                break
+            candidates = self._ring_samples(centre, ring)
+            if len(candidates) == 0:
+                continue
+            dists = numpy.sqrt(((self.data[candidates] - point) ** 2)
+                               .sum(axis=1))
+            closest = numpy.argmin(dists)
+            if dists[closest] < best or (dists[closest] == best
+                                         and candidates[closest]
+                                         < best_sample):
+                best, best_sample = dists[closest], candidates[closest]
+        return best, best_sample
+
+    def _ring_samples(self, centre, ring):
+        """ Return the samples in cells exactly `ring` cells away from the
+            centre cell (in the max norm)
+        """
+        ranges = [range(max(c - ring, 0), min(c + ring + 1, n))
+                  for c, n in zip(centre, self.shape)]
+        cells = [cell for cell in product(*ranges)
+                 if max(abs(numpy.subtract(cell, centre))) == ring]
+        if not cells:
+            return numpy.empty(0, dtype=int)
+        flat = numpy.ravel_multi_index(tuple(numpy.transpose(cells)),
+                                       self.shape)
+        return numpy.concatenate([
+            self.order[self.offsets[cell]:self.offsets[cell + 1]]
+            for cell in flat])
@@ -0,0 +1,55 @@
+""" file:   summary.py (pydym)
+
+    description: Summary statistics for indexing snapshot data
+"""
+
+from __future__ import division
+
+import numpy
+
+# The statistics stored for each snapshot
+STATISTICS = ('min', 'max', 'mean', 'l2')
+
+
+def summarise(values, axis=None):
+    """ Calculate summary statistics for some values
+
+        :param values: The values to summarise
+        :type values: array-like
+        :param axis: The axis to summarise along. Optional, defaults to
+            summarising all the values. Use axis=0 to summarise each column
+            (i.e. each snapshot) of a block of a snapshot dataset.
+        :returns: a dictionary mapping each of STATISTICS to a value (or an
+            array of values if axis is given)
+    """
+    values = numpy.asarray(values, dtype=float)
+    return {
+        'min': values.min(axis=axis),
+        'max': values.max(axis=axis),
+        'mean': values.mean(axis=axis),
+        'l2': numpy.sqrt((values ** 2).sum(axis=axis))
+    }
+
+
+def combine(statistics):
+    """ Combine per-snapshot statistics into statistics for the whole dataset
+
+        Snapshots which haven't been set yet (marked by NaNs) are ignored.
+        Since every snapshot has the same number of samples, the overall
+        mean is just the mean of the snapshot means.
+
+        :param statistics: The per-snapshot statistics
+        :type statistics: a dictionary mapping each of STATISTICS to an
+            array with one value per snapshot
+        :returns: a dictionary mapping each of STATISTICS to a value
+    """
+    stats = dict((k, numpy.asarray(v, dtype=float))
+                 for k, v in statistics.items())
+    if numpy.all(numpy.isnan(stats['min'])):
+        return dict((k, numpy.nan) for k in STATISTICS)
+    return {
+        'min': numpy.nanmin(stats['min']),
+        'max': numpy.nanmax(stats['max']),
+        'mean': numpy.nanmean(stats['mean']),
+        'l2': numpy.sqrt(numpy.nansum(stats['l2'] ** 2))
+    }
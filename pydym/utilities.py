@@ -10,30 +10,74 @@ from __future__ import division, print_function
 
 import sys
 import numpy
-from matplotlib import mlab
 from collections import OrderedDict
+from functools import reduce
 
 
 AXIS_LABELS = OrderedDict(zip(('x', 'y', 'z'), range(3)))
 
 
-def interpolate(position, values, decimate_by=None):
-    """ Return the given attribute interpolated over a regular grid
+def interpolate(position, values, decimate_by=None, shape=None):
+    """ Return the given values interpolated over a regular grid
+
+        Interpolation is linear over a Delaunay triangulation of the
+        positions. The triangulation is cached, so interpolating several
+        fields at the same positions only builds it once.
+
+        :param position: The sample positions
+        :type position: array of shape (2, n_samples)
+        :param values: The values at each sample. Several fields can be
+            interpolated at once by stacking them along extra axes.
+        :type values: array of shape (n_samples, ...)
+        :param decimate_by: Only use every `decimate_by`th sample. Optional.
+        :type decimate_by: int
+        :param shape: The grid shape as (n_y, n_x). Optional, defaults to
+            about as many grid points as there are samples.
+        :type shape: tuple
+        :returns: the grid coordinates along x and y, and the interpolated
+            values as a masked array of shape (n_y, n_x, ...)
     """
-    # Generate a position grid
-    xval, yval = position[0], position[1]
+    # Keep scipy out of the core imports
+    from .interpolation import get_grid_interpolator
+
+    position, values = numpy.asarray(position), numpy.asarray(values)
     if decimate_by:
-        xval, yval = xval[::decimate_by], yval[::decimate_by]
+        position = position[:, ::decimate_by]
         values = values[::decimate_by]
-    xlim = xval.min(), xval.max()
-    ylim = yval.min(), yval.max()
-    nxs, nys = len(xval), len(yval)
+    interpolator = get_grid_interpolator(position, shape=shape)
+    return (interpolator.xgrid, interpolator.ygrid,
+            interpolator.interpolate(values))
+
+
+def in_box(points, left=0, right=1, top=1, bottom=0):
+    """ Return the subset of points in the given rectangle
+    """
+    return reduce(numpy.logical_and,
+                  (points[..., 0] > left, points[..., 0] < right,
+                   points[..., 1] < top, points[..., 1] > bottom))
+
 
-    # Generate and return interpolation
-    xgrid = numpy.linspace(*xlim, num=nxs)
-    ygrid = numpy.linspace(*ylim, num=nys)
-    zgrid = mlab.griddata(xval, yval, values, xgrid, ygrid, interp='linear')
-    return xgrid, ygrid, zgrid
+def in_polygon(points, vertices):
+    """ Return a mask for the points which lie inside a polygon
+
+        Uses the even-odd (ray casting) rule, vectorized over the points.
+
+        :param points: The points to test, with x and y in the first two
+            columns
+        :type points: array of shape (n_points, 2)
+        :param vertices: The vertices of the polygon, in order
+        :type vertices: array of shape (n_vertices, 2)
+    """
+    points, vertices = numpy.asarray(points), numpy.asarray(vertices)
+    xpts, ypts = points[..., 0], points[..., 1]
+    inside = numpy.zeros(xpts.shape, dtype=bool)
+    for (x0, y0), (x1, y1) in zip(vertices, numpy.roll(vertices, -1, axis=0)):
+        # Does a horizontal ray from the point cross this edge?
+        crosses = (y0 > ypts) != (y1 > ypts)
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            xcross = x0 + (ypts - y0) * (x1 - x0) / (y1 - y0)
+        inside ^= crosses & (xpts < xcross)
+    return inside
 
 
 def herm_transpose(array):
@@ -42,6 +86,63 @@ def herm_transpose(array):
     return array.conj().transpose()
 
 
+def bounded_map(func, arguments, workers=None, max_pending=None,
+                initializer=None, initargs=()):
+    """ Apply a function to each set of arguments, using a pool of worker
+        processes
+
+        Only `max_pending` tasks are submitted to the pool at once, so
+        results which are waiting to be consumed don't pile up in memory.
+        Results come back in the order they finish, along with the index of
+        the arguments that produced them.
+
+        :param func: The function to call. This needs to be picklable (e.g.
+            defined at the top level of a module) if workers > 1.
+        :param arguments: The arguments for each call
+        :type arguments: iterable of tuples
+        :param workers: The number of worker processes. Optional, if None or
+            1 then everything runs in this process, in order.
+        :type workers: int
+        :param max_pending: The maximum number of tasks submitted but not
+            yet consumed. Optional, defaults to twice the number of workers.
+        :type max_pending: int
+        :param initializer: A function to call once in each worker process
+            when it starts, e.g. to hand over large arguments which every
+            task needs. Optional, and only used if workers > 1.
+        :param initargs: The arguments for initializer
+        :type initargs: tuple
+        :returns: an iterator over (index, result) pairs
+    """
+    if workers is None or workers <= 1:
+        for idx, args in enumerate(arguments):
+            yield idx, func(*args)
+        return
+
+    # Only import this if we need it
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    max_pending = max_pending or 2 * workers
+    tasks = enumerate(arguments)
+    with ProcessPoolExecutor(max_workers=workers, initializer=initializer,
+                             initargs=initargs) as pool:
+        pending = {}
+        for idx, args in tasks:
+            pending[pool.submit(func, *args)] = idx
+            if len(pending) < max_pending:
+                continue
+
+            # Wait for some tasks to finish before submitting more
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+        # Drain the remaining tasks
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
 class ProgressBar:
 
     """ A progress bar class which will work in Python and IPython
@@ -0,0 +1,140 @@
+""" file:   test_animate.py (pydym tests)
+
+    description: Unit tests for rendering animation frames
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from matplotlib import image
+
+from pydym import Observations, Snapshot
+from pydym.plotting.animate import render_frames, encode_video, _field_limits
+
+
+class TestRenderFrames(unittest.TestCase):
+
+    """ Unit tests for rendering frames
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'data.hdf5')
+        rng = numpy.random.RandomState(50)
+        self.position = rng.uniform(size=(2, 200))
+        self.n_snapshots = 10
+        with Observations(self.filename, n_samples=200,
+                          scalar_datasets=('pressure',)) as data:
+            for idx in range(self.n_snapshots):
+                phase = 0.5 * idx
+                data.append(Snapshot(
+                    position=self.position,
+                    velocity=numpy.vstack([
+                        numpy.cos(3 * self.position[0] + phase),
+                        numpy.sin(2 * self.position[1] - phase)]),
+                    pressure=self.position[0] * idx), time=0.1 * idx)
+        self.settings = dict(shape=(20, 20), figsize=(3, 2), dpi=40)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def frames(self, name):
+        return os.path.join(self.tempdir, name)
+
+    def test_render(self):
+        """ Frames should be written in order with the same size
+        """
+        with Observations(self.filename, mode='r') as data:
+            filenames = render_frames(data, self.frames('serial'),
+                                      **self.settings)
+        self.assertEqual(len(filenames), self.n_snapshots)
+        self.assertEqual([os.path.basename(f) for f in filenames],
+                         ['frame_{0:05d}.png'.format(i)
+                          for i in range(self.n_snapshots)])
+        shapes = set(image.imread(f).shape for f in filenames)
+        self.assertEqual(shapes, set([(80, 120, 4)]))
+
+        # Frames should change over time
+        self.assertFalse(numpy.array_equal(image.imread(filenames[0]),
+                                           image.imread(filenames[5])))
+
+    def test_range(self):
+        """ We should be able to render a range of snapshots and fields
+        """
+        filenames = render_frames(self.filename, self.frames('range'),
+                                  field='pressure', start=2, stop=6,
+                                  prefix='pressure', **self.settings)
+        self.assertEqual([os.path.basename(f) for f in filenames],
+                         ['pressure_{0:05d}.png'.format(i) for i in range(4)])
+
+    def test_parallel(self):
+        """ Rendering in parallel should give the same frames
+        """
+        serial = render_frames(self.filename, self.frames('serial'),
+                               **self.settings)
+        parallel = render_frames(self.filename, self.frames('parallel'),
+                                 workers=2, **self.settings)
+        self.assertEqual(len(parallel), self.n_snapshots)
+        for first, second in zip(serial, parallel):
+            self.assertTrue(numpy.array_equal(image.imread(first),
+                                              image.imread(second)))
+
+    def test_writable(self):
+        """ Writable observations can't be rendered in other processes
+        """
+        with Observations(self.filename) as data:
+            self.assertRaises(IOError, render_frames, data,
+                              self.frames('writable'), workers=2,
+                              **self.settings)
+
+    def test_region_limits(self):
+        """ Default colour limits should only cover the region of interest
+        """
+        with Observations(self.filename, mode='r') as data:
+            field = 'pressure'
+            everywhere = _field_limits(data, field, 0, self.n_snapshots)
+            self.assertTrue(numpy.allclose(
+                everywhere, (0, (self.n_snapshots - 1)
+                             * self.position[0].max())))
+
+            mask = self.position[0] < 0.5
+            data.set_region(mask=mask)
+            expected = (0, (self.n_snapshots - 1)
+                        * self.position[0][mask].max())
+            self.assertTrue(numpy.allclose(
+                _field_limits(data, field, 0, self.n_snapshots), expected))
+            filenames = render_frames(data, self.frames('region'),
+                                      field=field, **self.settings)
+            self.assertEqual(len(filenames), self.n_snapshots)
+
+    def test_arrays(self):
+        """ Arrays of values should be rendered with fixed colour limits
+        """
+        values = numpy.outer(self.position[0], numpy.arange(6))
+        self.assertRaises(ValueError, render_frames, values,
+                          self.frames('arrays'))
+        filenames = render_frames(values, self.frames('arrays'),
+                                  position=self.position, workers=2,
+                                  limits=(0, 5), **self.settings)
+        self.assertEqual(len(filenames), 6)
+        self.assertTrue(all(os.path.exists(f) for f in filenames))
+
+    def test_video(self):
+        """ Frames should be encoded with ffmpeg if it's available
+        """
+        directory = self.frames('video')
+        render_frames(self.filename, directory, stop=4, **self.settings)
+        video = os.path.join(self.tempdir, 'movie.mp4')
+        try:
+            encode_video(directory, video, fps=5)
+        except IOError:
+            self.skipTest('ffmpeg is not available')
+        self.assertTrue(os.path.getsize(video) > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
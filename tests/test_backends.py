@@ -0,0 +1,169 @@
+""" file:   test_backends.py (pydym tests)
+
+    description: Unit tests for Observations storage backends
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import os
+import tempfile
+import shutil
+import numpy
+
+from pydym import Observations, Snapshot
+from pydym.backends import get_backend, NpyBackend, MemoryBackend
+
+
+def make_snapshots(n_samples, n_snapshots):
+    """ Generate some random snapshots
+    """
+    rng = numpy.random.RandomState(42)
+    position = rng.uniform(size=(2, n_samples))
+    return [Snapshot(position=position,
+                     velocity=rng.normal(size=(2, n_samples)),
+                     pressure=rng.normal(size=n_samples))
+            for _ in range(n_snapshots)]
+
+
+class BackendTests(object):
+
+    """ Tests which should pass for every backend
+    """
+
+    backend = None
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.location = os.path.join(self.tempdir, 'data')
+        self.n_samples = 11
+        self.snapshots = make_snapshots(self.n_samples, 10)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def make_observations(self):
+        """ Make an observations object and fill it with snapshots
+        """
+        data = Observations(self.location, n_samples=self.n_samples,
+                            scalar_datasets=('pressure',),
+                            backend=self.backend)
+        for snapshot in self.snapshots:
+            data.append(snapshot)
+        return data
+
+    def test_store(self):
+        """ Groups and datasets should behave like h5py
+        """
+        store = get_backend(self.backend)(self.location, 'w')
+        dset = store.require_dataset('group/values', shape=(3, 2),
+                                     maxshape=(3, None), dtype=float)
+        self.assertTrue(store.is_group(store['group']))
+        self.assertTrue(store.is_dataset(store['group/values']))
+        self.assertEqual(list(store['group'].keys()), ['values'])
+        dset[:, 1] = 5
+        dset.resize((3, 5))
+        dset = store['group/values']
+        self.assertEqual(dset.shape, (3, 5))
+        self.assertTrue(numpy.allclose(dset[:, 1], 5))
+        self.assertTrue(numpy.allclose(dset[:, 2:], 0))
+        dset.resize((3, 1))
+        self.assertEqual(store['group/values'].shape, (3, 1))
+        store['scalar'] = 3
+        self.assertEqual(store['scalar'][()], 3)
+        store['scalar'][()] = 4
+        self.assertEqual(store['scalar'][()], 4)
+        dset.attrs['keys'] = 'a,b'
+        self.assertEqual(store['group/values'].attrs['keys'], 'a,b')
+        del store['group']
+        self.assertFalse('group' in store)
+        store.close()
+
+    def test_observations(self):
+        """ Observations should work the same way on any backend
+        """
+        data = self.make_observations()
+        self.assertEqual(data.n_snapshots, len(self.snapshots))
+        for idx, expected in enumerate(self.snapshots):
+            snapshot = data[idx]
+            self.assertTrue(numpy.allclose(snapshot.velocity,
+                                           expected.velocity))
+            self.assertTrue(numpy.allclose(snapshot.pressure,
+                                           expected.pressure))
+        expected = numpy.empty((2 * self.n_samples, len(self.snapshots)))
+        expected[0::2] = numpy.transpose([s.velocity[0]
+                                          for s in self.snapshots])
+        expected[1::2] = numpy.transpose([s.velocity[1]
+                                          for s in self.snapshots])
+        self.assertTrue(numpy.allclose(data.snapshots[:], expected))
+        data.close()
+
+
+class TestHDF5Backend(BackendTests, unittest.TestCase):
+
+    backend = 'hdf5'
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+
+    backend = 'memory'
+
+    def test_no_filename(self):
+        """ Memory observations shouldn't need a filename
+        """
+        data = Observations(None, n_samples=3, backend=MemoryBackend)
+        self.assertIsNone(data.filename)
+        self.assertEqual(data.shape, (3, 0))
+
+
+class TestNpyBackend(BackendTests, unittest.TestCase):
+
+    backend = 'npy'
+
+    def test_reload(self):
+        """ npy observations should be memory mapped on reload
+        """
+        self.make_observations().close()
+        self.assertTrue(NpyBackend.exists(self.location))
+        with Observations(self.location, backend='npy', mode='r') as data:
+            self.assertEqual(data.backend_name, 'npy')
+            self.assertEqual(data.n_snapshots, len(self.snapshots))
+            values = data['velocity/x']
+            self.assertTrue(isinstance(values[:], numpy.memmap))
+            self.assertTrue(values[:].flags.f_contiguous)
+            self.assertTrue(numpy.allclose(data[3].velocity,
+                                           self.snapshots[3].velocity))
+
+    def test_unrelated_directory(self):
+        """ Directories which aren't npy stores should never be replaced
+        """
+        os.makedirs(self.location)
+        precious = os.path.join(self.location, 'results.txt')
+        with open(precious, 'w') as fhandle:
+            fhandle.write('important')
+        self.assertFalse(NpyBackend.exists(self.location))
+        with self.assertRaises(IOError):
+            Observations(self.location, n_samples=self.n_samples,
+                         backend='npy', update=True)
+        with self.assertRaises(IOError):
+            NpyBackend(self.location, mode='w')
+        with open(precious) as fhandle:
+            self.assertEqual(fhandle.read(), 'important')
+
+        # Our own stores can be replaced though
+        self.location = os.path.join(self.tempdir, 'store')
+        self.make_observations().close()
+        Observations(self.location, n_samples=self.n_samples, backend='npy',
+                     update=True).close()
+        with Observations(self.location, backend='npy', mode='r') as data:
+            self.assertEqual(data.n_snapshots, 0)
+
+    def test_unknown_backend(self):
+        """ Unknown backends should raise an error
+        """
+        with self.assertRaises(ValueError):
+            get_backend('foo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,7 +10,9 @@ from __future__ import division, print_function
 
 import unittest
 import os
+import numpy
 import pydym
+from pydym.dynamic_decomposition import time_step
 
 
 class TestDynamicDecomposition(unittest.TestCase):
@@ -38,6 +40,66 @@ class TestDynamicDecomposition(unittest.TestCase):
         self.assertEqual(len(result.amplitudes), n_modes)
         self.assertEqual(result.eigenvectors.shape, (n_modes, n_modes))
 
+    def test_window(self):
+        """ Decomposition should work on a lazy window of the snapshots
+        """
+        result = pydym.dynamic_decomposition(self.data, burn=1, stride=2)
+        self.assertEqual(result.snapshots.shape[1], 5)
+        self.assertEqual(len(result.eigenvalues), 4)
+
+        # Passing the window directly should give the same answer
+        window = self.data.snapshots.select(1, None, 2)
+        other = pydym.dynamic_decomposition(window)
+        self.assertTrue(numpy.allclose(sorted(abs(result.eigenvalues)),
+                                       sorted(abs(other.eigenvalues))))
+
+    def test_frequencies(self):
+        """ Frequencies and growth rates should use the snapshot times
+        """
+        # Three damped oscillators sampled every 0.1 time units
+        dt, n_samples = 0.1, 20
+        frequencies = numpy.array([0.5, 1.2, 2.0])
+        growth_rates = numpy.array([-0.1, -0.3, 0.05])
+        rng = numpy.random.RandomState(3)
+        shapes = rng.normal(size=(len(frequencies), 2, 2, n_samples))
+        position = rng.uniform(size=(2, n_samples))
+        data = pydym.Observations(None, n_samples=n_samples,
+                                  backend='memory')
+        for step in range(7):
+            time = 1 + step * dt
+            phase = 2 * numpy.pi * frequencies * time
+            velocity = sum(
+                numpy.exp(rate * time) * (numpy.cos(p) * s[0]
+                                          + numpy.sin(p) * s[1])
+                for rate, p, s in zip(growth_rates, phase, shapes))
+            data.append(pydym.Snapshot(position=position, velocity=velocity),
+                        time=time)
+        self.assertTrue(numpy.allclose(data.times, 1 + numpy.arange(7) * dt))
+
+        result = pydym.dynamic_decomposition(data)
+        self.assertAlmostEqual(result.dt, dt)
+        self.assertTrue(numpy.allclose(
+            sorted(abs(result.frequencies)),
+            sorted(numpy.r_[frequencies, frequencies])))
+        self.assertTrue(numpy.allclose(
+            sorted(result.growth_rates),
+            sorted(numpy.r_[growth_rates, growth_rates])))
+
+        # Uneven times should raise an error
+        data['time'][3] += dt / 2
+        self.assertRaises(ValueError, pydym.dynamic_decomposition, data)
+        data.close()
+
+    def test_time_step(self):
+        """ Time steps should be checked for even spacing
+        """
+        self.assertAlmostEqual(time_step([0.1, 0.3, 0.5]), 0.2)
+        self.assertEqual(time_step([1]), None)
+        self.assertRaises(ValueError, time_step, [0, 1, 3])
+
+    def tearDown(self):
+        self.data.close()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -11,6 +11,10 @@ from __future__ import division, print_function
 import unittest
 import os
 import subprocess
+import tempfile
+import shutil
+import sys
+import warnings
 import numpy
 
 import pydym
@@ -66,9 +70,12 @@ class GerrisTest(unittest.TestCase):
             output = os.path.join(GERRIS_DATA_DIR, output_name)
             self.assertTrue(os.path.exists(output))
 
-            # Load up the processed data
+            # Load up the processed data. Bookkeeping groups (the index,
+            # manifest etc) aren't in the expected data
             data = pydym.Observations(output)
             for key in data.keys():
+                if key in pydym.observations.RESERVED_GROUPS:
+                    continue
                 self.assertTrue(key in expected_data.keys())
                 self.assertIsNotNone(data[key])
             data.close()
@@ -79,6 +86,24 @@ class GerrisTest(unittest.TestCase):
                 os.remove(output_name)
             self.assertFalse(os.path.exists(output_name))
 
+    def test_process_directory_parallel(self):
+        """ Processing with several workers should give the same snapshots
+        """
+        output_name = os.path.join(GERRIS_DATA_DIR, 'test_parallel.hdf5')
+        try:
+            self.reader.process_directory(GERRIS_DATA_DIR,
+                                          output_name=output_name,
+                                          update=True, clean=False,
+                                          show_progress=False, workers=3)
+            with pydym.Observations(output_name, mode='r') as data:
+                self.assertTrue(numpy.all(numpy.diff(data.times) > 0))
+                for key in data.snapshot_datasets:
+                    self.assertTrue(numpy.allclose(
+                        data[key][:], self.expected_data[key][:]))
+        finally:
+            if os.path.exists(output_name):
+                os.remove(output_name)
+
     def test_make_vertex_file(self):
         """ Test that we can make a vertex file OK
         """
@@ -103,5 +128,322 @@ class GerrisTest(unittest.TestCase):
         self.assertTrue(numpy.allclose(subset, expected_vertices))
 
 
+class TestVertices(unittest.TestCase):
+
+    """ Unit tests for generating vertex lists
+    """
+
+    def setUp(self):
+        self.boxes = pydym.io.gerris.boxes_from_gfsfile(
+            os.path.join(GERRIS_DATA_DIR, 'chaos-1.0.64.10.gfs'))
+        self.boxes[..., 2] = 1
+
+    def test_boxes(self):
+        """ Boxes should be read from text and binary simulation files
+        """
+        self.assertEqual(self.boxes.shape, (16, 3))
+        binary = pydym.io.gerris.boxes_from_gfsfile(
+            os.path.join(GERRIS_DATA_DIR, 'simulation_00005.000.gfs'))
+        self.assertEqual(sorted(map(tuple, binary[:, :2])),
+                         sorted(map(tuple, self.boxes[:, :2])))
+
+    def test_double_resolution(self):
+        """ Refining several levels at once should match refining one level
+            at a time
+        """
+        boxes = self.boxes
+        for _ in range(3):
+            boxes = pydym.io.gerris.double_resolution(boxes)
+        self.assertTrue(numpy.array_equal(
+            boxes, pydym.io.gerris.double_resolution(self.boxes, levels=3)))
+        self.assertEqual(boxes.shape, (16 * 4 ** 3, 3))
+        self.assertTrue(numpy.all(boxes[:, 2] == 4))
+
+    def test_vertex_list(self):
+        """ Vertices should be unique and sorted by y, x then level
+        """
+        boxes = pydym.io.gerris.double_resolution(self.boxes, levels=2)
+        vertices = pydym.io.gerris.make_vertex_list(boxes)
+        self.assertTrue(len(boxes) < len(vertices) < 4 * len(boxes))
+        order = numpy.lexsort(vertices[:, [2, 0, 1]].T)
+        self.assertTrue(numpy.all(order == numpy.arange(len(vertices))))
+        self.assertEqual(len(numpy.unique(vertices, axis=0)), len(vertices))
+
+        # Streaming the vertices should give the same answer
+        blocks = list(pydym.io.gerris.iter_vertex_list(boxes, block_size=10))
+        self.assertTrue(len(blocks) > 1)
+        self.assertTrue(numpy.array_equal(numpy.concatenate(blocks),
+                                          vertices))
+
+        # Boxes which aren't on a power-of-two lattice still work
+        boxes = numpy.array([[0.1, 0.1, 0], [0.1, 1.3, 0], [1.3, 0.1, 0],
+                             [0.1, 0.1, 0]])
+        vertices = pydym.io.gerris.make_vertex_list(boxes)
+        self.assertEqual(len(vertices), 12)
+        order = numpy.lexsort(vertices[:, [2, 0, 1]].T)
+        self.assertTrue(numpy.all(order == numpy.arange(len(vertices))))
+
+    def test_vertex_file(self):
+        """ The test vertex file should be reproducible without Gerris
+        """
+        boxes = pydym.io.gerris.double_resolution(self.boxes, levels=4)
+        mask = pydym.io.gerris.in_box(
+            boxes, top=0.75, bottom=-0.5, left=-0.6, right=1.6)
+        subset = boxes[mask]
+        subset[..., 2] = 0
+        self.assertTrue(numpy.allclose(
+            subset, numpy.loadtxt(os.path.join(TEST_DATA_DIR,
+                                               'vertices.csv'))))
+
+
+class TestNativeReader(unittest.TestCase):
+
+    """ Unit tests for processing simulations without Gerris
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.reader = pydym.io.gerris.GerrisReader(
+            vertex_file=os.path.join(TEST_DATA_DIR, 'vertices.csv'),
+            native=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_process_directory(self):
+        """ Reading the simulation files directly should give snapshots
+            close to the ones sampled by Gerris
+        """
+        output_name = os.path.join(self.tempdir, 'native.hdf5')
+        self.reader.process_directory(GERRIS_DATA_DIR,
+                                      output_name=output_name,
+                                      show_progress=False, workers=2)
+        self.assertEqual(list(self.reader.report), ['read', 'write'])
+        expected = pydym.Observations(os.path.join(TEST_DATA_DIR,
+                                                   'simulations.hdf5'))
+        with pydym.Observations(output_name, mode='r') as data, expected:
+            self.assertEqual(data.n_snapshots, expected.n_snapshots)
+            self.assertTrue(numpy.allclose(data.times, numpy.arange(11) * 5))
+            self.assertTrue(numpy.allclose(data['position/x'][:],
+                                           expected['position/x'][:]))
+            self.assertTrue(numpy.allclose(data['velocity/x'][:],
+                                           expected['velocity/x'][:],
+                                           atol=0.05))
+
+
+# A stand-in for gerris2D which writes an output file for the OutputLocation
+# event, with values depending on the simulation time
+FAKE_GERRIS = """#!{python}
+import re, sys
+output = sys.argv[2].split()[6]
+time = float(re.findall(r'output_([.0-9]*)[.]dat', output)[0])
+with open(output, 'w') as fhandle:
+    fhandle.write('# 1:t 2:x 3:y 4:z 5:P 6:Pmac 7:U 8:V 9:T\\n')
+    for x in range(3):
+        fhandle.write('{{0}} {{1}} 0 0 {{2}} 0 {{0}} 1 0\\n'.format(
+            time, x, time * x))
+"""
+
+
+class TestGerrisPipeline(unittest.TestCase):
+
+    """ Unit tests for processing simulations with Gerris, using a stand-in
+        for gerris2D
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        gerris = os.path.join(self.tempdir, 'fake_gerris')
+        with open(gerris, 'w') as fhandle:
+            fhandle.write(FAKE_GERRIS.format(python=sys.executable))
+        os.chmod(gerris, 0o755)
+        self.reader = pydym.io.gerris.GerrisReader(
+            vertex_file=os.path.join(TEST_DATA_DIR, 'vertices.csv'),
+            native=True, gerris=gerris)
+        self.reader.native = False
+        self.times = [1, 2, 3, 4, 5]
+        for time in self.times:
+            open(os.path.join(self.tempdir, 'simulation_{0:.3f}.gfs'.format(
+                time)), 'w').close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_stages(self):
+        """ Gerris extraction, parsing and writing should be separate stages
+        """
+        output_name = os.path.join(self.tempdir, 'gerris.hdf5')
+        n_processed = self.reader.process_directory(
+            self.tempdir, output_name=output_name, show_progress=False,
+            workers=2, clean=True)
+        self.assertEqual(n_processed, len(self.times))
+        report = self.reader.report
+        self.assertEqual(list(report), ['extract', 'parse', 'write'])
+        for stats in report.values():
+            self.assertEqual(stats['items'], len(self.times))
+        self.assertEqual(report['parse']['workers'], 2)
+        self.assertFalse([f for f in os.listdir(self.tempdir)
+                          if f.startswith('output_')])
+        with pydym.Observations(output_name, mode='r') as data:
+            self.assertTrue(numpy.allclose(data.times, self.times))
+            self.assertTrue(numpy.allclose(data['velocity/x'][0],
+                                           self.times))
+            self.assertTrue(numpy.allclose(data['pressure'][2],
+                                           2 * numpy.asarray(self.times)))
+
+
+class TestIncrementalIngest(unittest.TestCase):
+
+    """ Unit tests for resuming and watching simulation directories
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.output_name = os.path.join(self.tempdir, 'ingest.hdf5')
+        self.reader = pydym.io.gerris.GerrisReader(
+            vertex_file=os.path.join(TEST_DATA_DIR, 'vertices.csv'),
+            native=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def add_files(self, *times):
+        """ Copy simulation files for the given times into the directory
+        """
+        for time in times:
+            name = 'simulation_{0:09.3f}.gfs'.format(time)
+            shutil.copy(os.path.join(GERRIS_DATA_DIR, name), self.tempdir)
+
+    def process(self, **kwargs):
+        """ Process the directory, returning the number of files processed
+        """
+        return self.reader.process_directory(
+            self.tempdir, output_name=self.output_name, show_progress=False,
+            **kwargs)
+
+    def test_resume(self):
+        """ Rerunning should only process new or changed files
+        """
+        self.add_files(0, 10)
+        self.assertEqual(self.process(), 2)
+        self.assertEqual(self.process(), 0)
+
+        # New files get appended, files earlier than the existing
+        # snapshots are skipped
+        self.add_files(5, 15, 20)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(self.process(batch_size=1), 2)
+        self.assertEqual(len(caught), 1)
+        self.assertTrue('simulation_00005.000.gfs' in str(caught[0].message))
+        with pydym.Observations(self.output_name, mode='r') as data:
+            self.assertTrue(numpy.allclose(data.times, [0, 10, 15, 20]))
+            manifest = data.manifest
+            self.assertEqual(manifest['simulation_00020.000.gfs']['index'], 3)
+            self.assertFalse('simulation_00005.000.gfs' in manifest)
+            first = data['velocity/x'][:, 1]
+
+        # Changed files are reprocessed in place
+        shutil.copy(os.path.join(GERRIS_DATA_DIR, 'simulation_00050.000.gfs'),
+                    os.path.join(self.tempdir, 'simulation_00010.000.gfs'))
+        self.assertEqual(self.process(), 1)
+        with pydym.Observations(self.output_name, mode='r') as data:
+            self.assertEqual(data.n_snapshots, 4)
+            self.assertFalse(numpy.allclose(data['velocity/x'][:, 1], first))
+
+        # Updating starts again from scratch
+        self.assertEqual(self.process(update=True), 5)
+        with pydym.Observations(self.output_name, mode='r') as data:
+            self.assertTrue(numpy.allclose(data.times, [0, 5, 10, 15, 20]))
+
+    def test_watch(self):
+        """ Watching should pick up the files that are there, then stop
+            once no new ones turn up
+        """
+        self.add_files(0, 5)
+        total = self.reader.watch(self.tempdir, output_name=self.output_name,
+                                  interval=0.01, timeout=0, min_age=0)
+        self.assertEqual(total, 2)
+
+        # Files which are still being written are left alone
+        self.add_files(10)
+        self.assertEqual(self.process(min_age=60), 0)
+
+
+class TestExtractSnapshot(unittest.TestCase):
+
+    """ Unit tests for reading Gerris output, using a stand-in for Gerris
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.output = os.path.join(self.tempdir, 'output_1.000.dat')
+        lines = ['# 1:t 2:x 3:y 4:z 5:P 6:Pmac 7:U 8:V 9:T',
+                 '1 0 0 0 0.5 0 1 2 0.1',
+                 '1 1 0 0 0.6 0 3 4 0.2']
+        self.command = 'printf "{0}\\n" > {1}'.format(
+            '\\n'.join(lines), self.output)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_extract(self):
+        """ Extracting a snapshot should run the command and read the output
+        """
+        snapshot = pydym.io.gerris.extract_snapshot(self.command,
+                                                    self.output)
+        self.assertTrue(numpy.allclose(snapshot.velocity, [[1, 3], [2, 4]]))
+        self.assertTrue(numpy.allclose(snapshot.tracer, [0.1, 0.2]))
+        self.assertTrue(os.path.exists(self.output))
+
+        # Existing output is reused unless we're updating
+        snapshot = pydym.io.gerris.extract_snapshot('false', self.output,
+                                                    clean=True)
+        self.assertTrue(numpy.allclose(snapshot.pressure, [0.5, 0.6]))
+        self.assertFalse(os.path.exists(self.output))
+
+    def test_read_output_file(self):
+        """ Output files should parse to the same values as numpy.loadtxt
+        """
+        rng = numpy.random.RandomState(40)
+        expected = rng.normal(size=(50, 12))
+        header = ('# 1:t 2:x 3:y 4:z 5:P 6:Pmac 7:U 8:V 9:T_x 10:T_y '
+                  '11:T_alpha 12:T')
+        numpy.savetxt(self.output, expected, header=header[2:])
+        snapshot = pydym.io.gerris.read_output_file(self.output)
+        self.assertTrue(numpy.allclose(snapshot.position, expected[:, 1:3].T))
+        self.assertTrue(numpy.allclose(snapshot.velocity, expected[:, 6:8].T))
+        self.assertTrue(numpy.allclose(snapshot.pressure, expected[:, 4]))
+        self.assertTrue(numpy.allclose(snapshot.tracer, expected[:, 11]))
+
+        # Truncated files should raise an error
+        with open(self.output, 'a') as fhandle:
+            fhandle.write('1 2 3\n')
+        self.assertRaises(ValueError, pydym.io.gerris.read_output_file,
+                          self.output)
+
+    def test_write_ready(self):
+        """ Snapshots should be written in consecutive batches
+        """
+        snapshot = pydym.io.gerris.extract_snapshot(self.command,
+                                                    self.output)
+        times = [0.1 * idx for idx in range(5)]
+        with pydym.Observations(None, n_samples=2, backend='memory',
+                                scalar_datasets=('pressure', 'tracer')) \
+                as data:
+            # Nothing gets written until we have a full run from the start
+            pending = {1: snapshot, 2: snapshot}
+            start = pydym.io.gerris.write_ready(data, pending, 0, times, 2)
+            self.assertEqual((start, data.n_snapshots), (0, 0))
+            pending[0] = snapshot
+            start = pydym.io.gerris.write_ready(data, pending, 0, times, 2)
+            self.assertEqual((start, sorted(pending)), (2, [2]))
+            pending.update({3: snapshot, 4: snapshot})
+            start = pydym.io.gerris.write_ready(data, pending, start, times,
+                                                len(pending))
+            self.assertEqual((start, pending), (5, {}))
+            self.assertTrue(numpy.allclose(data.times, times))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,96 @@
+""" file:   test_gfs.py (pydym tests)
+
+    description: Unit tests for reading binary Gerris simulation files
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import os
+import numpy
+
+import pydym
+from pydym.io.gfs import GfsFile
+from pydym.interpolation import Resampler
+
+# location of test data files
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), "resources")
+GERRIS_DATA_DIR = os.path.join(TEST_DATA_DIR, "simulations")
+
+
+class TestGfsFile(unittest.TestCase):
+
+    """ Unit tests for the native .gfs reader
+    """
+
+    def setUp(self):
+        self.gfs = GfsFile(os.path.join(GERRIS_DATA_DIR,
+                                        'simulation_00005.000.gfs'))
+
+    def test_header(self):
+        """ The simulation header should be read
+        """
+        self.assertEqual(self.gfs.variables,
+                         ['P', 'Pmac', 'U', 'V', 'T', 'T_x', 'T_y', 'T_alpha'])
+        self.assertEqual(self.gfs.time, 5)
+        self.assertEqual(self.gfs.rootlevel, 1)
+        self.assertEqual(self.gfs.boxes.shape, (2, 16))
+
+    def test_cells(self):
+        """ Leaf cells should tile the boxes without overlapping
+        """
+        gfs = self.gfs
+        for values in gfs.values.values():
+            self.assertEqual(len(values), len(gfs))
+        self.assertTrue(numpy.all((gfs.values['T'] >= 0)
+                                  & (gfs.values['T'] <= 1)))
+
+        # The leaf cell areas should add up to the area of the boxes
+        leaves = gfs.leaves()
+        area = (0.5 ** gfs.level[leaves]) ** 2
+        self.assertAlmostEqual(area.sum(), 16 * 0.5 ** 2)
+
+        # Each leaf cell centre should be found in that cell
+        self.assertTrue(numpy.all(gfs.locate(gfs.position[:, leaves])
+                                  == leaves))
+        self.assertEqual(gfs.locate([[10], [10]])[0], -1)
+
+    def test_snapshot(self):
+        """ Sampling the cells should give values close to Gerris' own
+        """
+        with pydym.Observations(os.path.join(TEST_DATA_DIR,
+                                             'simulations.hdf5')) as data:
+            position = numpy.vstack([data['position/x'][:],
+                                     data['position/y'][:]])
+            expected = data.get_snapshot(1)
+        snapshot = self.gfs.snapshot(position)
+        self.assertEqual(snapshot.time, 5)
+        self.assertTrue(numpy.allclose(snapshot.position, position))
+        for attribute in ('pressure', 'tracer'):
+            self.assertTrue(numpy.corrcoef(
+                getattr(snapshot, attribute),
+                getattr(expected, attribute))[0, 1] > 0.99)
+        self.assertTrue(numpy.allclose(snapshot.velocity,
+                                       expected.velocity, atol=0.05))
+
+        # Interpolating between cells should be closer still
+        resampler = Resampler(position)
+        interpolated = self.gfs.snapshot(resampler=resampler)
+        self.assertTrue(numpy.allclose(interpolated.velocity,
+                                       expected.velocity, atol=0.02))
+        self.gfs.snapshot(resampler=resampler)
+        self.assertEqual(resampler.hits, 1)
+
+        # Without points we get the leaf cells
+        self.assertEqual(len(self.gfs.snapshot()), len(self.gfs.leaves()))
+        self.assertRaises(ValueError, self.gfs.snapshot, [[10], [10]])
+
+    def test_not_binary(self):
+        """ Text simulation files should be rejected
+        """
+        self.assertRaises(IOError, GfsFile,
+                          os.path.join(GERRIS_DATA_DIR, 'chaos-1.0.64.10.gfs'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+""" file:   test_imports.py (pydym tests)
+
+    description: Unit tests for lazy imports
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import subprocess
+import sys
+import os
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+
+def loaded_modules(statement, modules=('h5py', 'scipy', 'matplotlib')):
+    """ Run a statement in a new interpreter and return which of the given
+        modules it imported
+    """
+    check = ('import sys\n{0}\n'
+             'print(",".join(m for m in {1!r} if m in sys.modules))')
+    output = subprocess.check_output(
+        [sys.executable, '-c', check.format(statement, modules)],
+        cwd=PACKAGE_DIR)
+    return [m for m in output.decode('utf-8').strip().split(',') if m]
+
+
+class TestImports(unittest.TestCase):
+
+    def test_import(self):
+        "Importing pydym shouldn't import heavy dependencies"
+        self.assertEqual(loaded_modules('import pydym'), [])
+
+    def test_core(self):
+        "The core classes should be usable without heavy dependencies"
+        statement = ('import pydym, numpy\n'
+                     'data = pydym.Observations(None, n_samples=3, '
+                     'backend="memory")\n'
+                     'pydym.dynamic_decomposition, pydym.SnapshotMatrix')
+        self.assertEqual(loaded_modules(statement), [])
+
+    def test_lazy(self):
+        "Subpackages and backends should be imported on first use"
+        self.assertEqual(loaded_modules('import pydym; pydym.plotting'),
+                         ['matplotlib'])
+        self.assertEqual(
+            loaded_modules('import pydym.backends as b; b.HDF5Backend'),
+            ['h5py'])
+        statement = 'import pydym; pydym.io.gerris.GerrisReader'
+        self.assertEqual(loaded_modules(statement), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
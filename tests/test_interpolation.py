@@ -0,0 +1,128 @@
+""" file:   test_interpolation.py (pydym tests)
+
+    description: Unit tests for sparse resampling
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym import Snapshot
+from pydym.interpolation import (resampling_matrix, Resampler, grid_shape,
+                                 GridInterpolator, get_grid_interpolator)
+from pydym.utilities import interpolate
+
+
+class TestResampling(unittest.TestCase):
+
+    """ Unit tests for resampling matrices
+    """
+
+    def setUp(self):
+        rng = numpy.random.RandomState(44)
+        corners = numpy.array([[0, 0, 1, 1], [0, 1, 0, 1]])
+        self.source = numpy.hstack([corners, rng.uniform(size=(2, 200))])
+        self.target = rng.uniform(0.05, 0.95, size=(2, 50))
+        self.linear = lambda points: 1 + 2 * points[0] - 3 * points[1]
+
+    def test_linear(self):
+        """ Linear functions should be reproduced exactly
+        """
+        matrix = resampling_matrix(self.source, self.target)
+        self.assertEqual(matrix.shape, (50, 204))
+        self.assertTrue(numpy.allclose(matrix.sum(axis=1), 1))
+        self.assertTrue(numpy.all(matrix.getnnz(axis=1) <= 3))
+        self.assertTrue(numpy.allclose(matrix.dot(self.linear(self.source)),
+                                       self.linear(self.target)))
+
+    def test_outside(self):
+        """ Points outside the source points should get the nearest value
+        """
+        matrix = resampling_matrix(self.source, [[2, -1], [2, -1]])
+        values = numpy.arange(self.source.shape[1], dtype=float)
+        self.assertTrue(numpy.allclose(matrix.dot(values), [3, 0]))
+
+    def test_resampler(self):
+        """ Matrices should be cached by layout
+        """
+        resampler = Resampler(numpy.vstack([self.target,
+                                            numpy.zeros(50)]), max_cached=1)
+        fields = numpy.column_stack([self.linear(self.source),
+                                     2 * self.linear(self.source)])
+        result = resampler.resample(self.source, fields)
+        self.assertEqual(result.shape, (50, 2))
+        self.assertTrue(numpy.allclose(result[:, 1],
+                                       2 * self.linear(self.target)))
+        resampler.resample(self.source.copy(), fields[:, 0])
+        self.assertEqual((resampler.hits, resampler.misses), (1, 1))
+
+        # Only the most recent layout is kept
+        resampler.resample(self.source[:, :-1], fields[:-1])
+        resampler.resample(self.source, fields)
+        self.assertEqual((resampler.hits, resampler.misses), (1, 3))
+
+
+class TestGridInterpolator(unittest.TestCase):
+
+    """ Unit tests for interpolating onto regular grids
+    """
+
+    def setUp(self):
+        rng = numpy.random.RandomState(47)
+        self.position = rng.uniform(size=(2, 1000)) * [[1], [2]]
+        self.linear = lambda x, y: 1 + 2 * x - 3 * y
+
+    def test_grid_shape(self):
+        """ Grids should have about as many points as there are samples,
+            with square cells
+        """
+        n_y, n_x = grid_shape(self.position)
+        self.assertTrue(abs(n_x * n_y - 1000) < 50)
+        self.assertEqual(round(n_y / n_x), 2)
+        self.assertEqual(grid_shape(self.position, 200), (20, 10))
+        self.assertRaises(ValueError, grid_shape, [[0, 1, 2], [1, 1, 1]])
+
+    def test_interpolate(self):
+        """ Linear fields should be reproduced, with points outside the
+            samples masked
+        """
+        interpolator = GridInterpolator(self.position, shape=(30, 20))
+        self.assertEqual(len(interpolator.xgrid), 20)
+        self.assertEqual(len(interpolator.ygrid), 30)
+        values = self.linear(*self.position)
+        gridded = interpolator(numpy.column_stack([values, 2 * values]))
+        self.assertEqual(gridded.shape, (30, 20, 2))
+        xgrid, ygrid = numpy.meshgrid(interpolator.xgrid, interpolator.ygrid)
+        expected = self.linear(xgrid, ygrid)
+        self.assertTrue(numpy.ma.allclose(gridded[..., 0], expected))
+        self.assertTrue(numpy.ma.allclose(gridded[..., 1], 2 * expected))
+        self.assertTrue(gridded.mask[0, 0, 0])
+        self.assertFalse(gridded.mask[15, 10, 0])
+        numpy.ma.masked_invalid(gridded, copy=False)  # as matplotlib does
+        self.assertRaises(ValueError, interpolator, values[:10])
+
+    def test_cache(self):
+        """ Interpolators should be reused for the same positions
+        """
+        first = get_grid_interpolator(self.position)
+        self.assertTrue(get_grid_interpolator(self.position.copy()) is first)
+        self.assertFalse(get_grid_interpolator(self.position, shape=(5, 5))
+                         is first)
+
+        # Snapshot.interpolate should use the cache too
+        snapshot = Snapshot(self.position,
+                            velocity=numpy.vstack([self.position[1],
+                                                   self.position[0]]))
+        xgrid, _, velocity = snapshot.interpolate('velocity')
+        _, _, xvel = interpolate(self.position, self.position[1])
+        self.assertTrue(numpy.all(xgrid == first.xgrid))
+        self.assertEqual(velocity.shape, first.shape + (2,))
+        self.assertTrue(numpy.ma.allclose(velocity[..., 0], xvel))
+        _, _, decimated = snapshot.interpolate('velocity', 'y',
+                                               decimate_by=2)
+        self.assertEqual(decimated.ndim, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+""" file:   test_matlab.py (pydym tests)
+
+    description: Unit tests for MATLAB I/O
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import os
+import shutil
+import tempfile
+import numpy
+from scipy import io
+
+import pydym
+from pydym.io import matlab
+
+
+class TestMatlab(unittest.TestCase):
+
+    """ Tests for reading and writing .mat files
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        rng = numpy.random.RandomState(45)
+        self.variables = {
+            'x': numpy.linspace(0, 1, 40),
+            'y': numpy.linspace(0, 2, 40) ** 2,
+            'u': rng.normal(size=(40, 12)),
+            'v': rng.normal(size=(40, 12)),
+            'p': rng.normal(size=(40, 12)),
+            't': 0.5 * numpy.arange(12)}
+        self.v5_file = os.path.join(self.tempdir, 'v5.mat')
+        self.v73_file = os.path.join(self.tempdir, 'v73.mat')
+        io.savemat(self.v5_file, self.variables)
+        matlab.write_v73(self.v73_file, self.variables, block_size=5)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_examples(self):
+        """ The example files should be readable
+        """
+        current_dir = os.path.dirname(os.path.realpath(__file__))
+        example = os.path.join(current_dir, '..', 'examples', 'cylinder.mat')
+        self.assertEqual(matlab.list_variables(example),
+                         {'S': (100, 100), 'UstarX1': (100, 100),
+                          'V': (100, 100)})
+        self.assertFalse(matlab.is_v73(example))
+
+    def test_v73(self):
+        """ v7.3 files should look like v7.3 files to MATLAB, and read back
+            with MATLAB shapes
+        """
+        self.assertTrue(matlab.is_v73(self.v73_file))
+        self.assertEqual(io.matlab.matfile_version(self.v73_file), (2, 0))
+        shapes = matlab.list_variables(self.v73_file)
+        self.assertEqual(shapes['u'], (40, 12))
+        self.assertEqual(shapes['t'], (12, 1))
+        self.assertTrue(numpy.allclose(
+            matlab.read_variable(self.v73_file, 'u'), self.variables['u']))
+        self.assertRaises(KeyError, matlab.read_variable, self.v73_file, 'w')
+
+        # Complex values should survive the round trip
+        values = numpy.exp(1j * numpy.arange(6)).reshape(3, 2)
+        matlab.write_v73(self.v73_file, {'z': values})
+        self.assertTrue(numpy.allclose(
+            matlab.read_variable(self.v73_file, 'z'), values))
+
+    def test_load_observations(self):
+        """ Snapshots should be copied over in blocks from either format
+        """
+        for fname in (self.v5_file, self.v73_file):
+            output = os.path.join(self.tempdir, 'output.hdf5')
+            with matlab.load_observations(
+                    fname, output, scalars={'pressure': 'p'}, times='t',
+                    block_size=5) as data:
+                self.assertEqual(data.n_snapshots, 12)
+                self.assertTrue(numpy.allclose(data['position/y'],
+                                               self.variables['y']))
+                self.assertTrue(numpy.allclose(data['velocity/x'][:, :12],
+                                               self.variables['u']))
+                self.assertTrue(numpy.allclose(data['pressure'][:, :12],
+                                               self.variables['p']))
+                self.assertTrue(numpy.allclose(data.times,
+                                               self.variables['t']))
+
+        # Mismatched snapshot counts should be caught
+        self.variables['p'] = self.variables['p'][:, :3]
+        io.savemat(self.v5_file, self.variables)
+        self.assertRaises(ValueError, matlab.load_observations, self.v5_file,
+                          output, scalars=['p'])
+
+    def test_save_decomposition(self):
+        """ DMD results should be saved in either format
+        """
+        output = os.path.join(self.tempdir, 'output.hdf5')
+        with matlab.load_observations(self.v5_file, output) as data:
+            result = pydym.dynamic_decomposition(data)
+            for v73 in (False, True):
+                fname = os.path.join(self.tempdir, 'dmd.mat')
+                matlab.save_decomposition(fname, result, v73=v73,
+                                          block_size=3)
+                self.assertEqual(matlab.is_v73(fname), v73)
+                self.assertTrue(numpy.allclose(
+                    matlab.read_variable(fname, 'modes'), result.modes))
+                self.assertTrue(numpy.allclose(
+                    numpy.ravel(matlab.read_variable(fname, 'eigenvalues')),
+                    result.eigenvalues))
+                self.assertTrue(numpy.allclose(
+                    numpy.ravel(matlab.read_variable(fname, 'x')),
+                    self.variables['x']))
+
+
+if __name__ == '__main__':
+    unittest.main()
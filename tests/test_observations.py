@@ -11,9 +11,13 @@ from __future__ import division, print_function
 import unittest
 import os
 import subprocess
+import tempfile
+import shutil
 import numpy
 
-from pydym import Observations
+from pydym import (Observations, Snapshot, CompactSnapshot,
+                   dynamic_decomposition)
+from pydym.snapshot_matrix import InterleavedMatrix
 
 
 # location of test data files
@@ -59,15 +63,938 @@ class TestObservations(unittest.TestCase):
         self.assertIsNotNone(self.data['snapshots/velocity'])
         self.assertIsNotNone(numpy.allclose(self.data.snapshots, old_snapshot))
 
+    def test_thin_and_window(self):
+        """ Thinning and time windows should be views of the snapshots
+        """
+        full = self.data.snapshots[:, :]
+        self.data.set_snapshot_properties(thin_by=2, window=(1, 9))
+        snapshots = self.data.snapshots
+        self.assertEqual(snapshots.shape, (full.shape[0], 4))
+        self.assertTrue(numpy.allclose(snapshots[:, :], full[:, 1:9:2]))
+        self.assertTrue(numpy.allclose(snapshots[:, -1], full[:, 7]))
+        self.assertTrue(numpy.allclose(snapshots[10:20, ::-1],
+                                       full[10:20, 7:0:-2]))
+        self.assertTrue(numpy.allclose(snapshots.select(stride=2)[:, :],
+                                       full[:, 1:9:4]))
+        self.assertEqual(list(self.data['snapshots'].keys()),
+                         ['pressure_velocity', 'velocity'])
+
     def test_get_item(self):
         """ Check that we can return simulation stuff
         """
         for attr in ('velocity', 'position', 'pressure', 'tracer'):
             self.assertIsNotNone(self.data[attr])
 
+    def test_iter_snapshots(self):
+        """ Iterating should give snapshots matching get_snapshot
+        """
+        snapshots = list(self.data)
+        compact = list(self.data.iter_snapshots())
+        self.assertEqual(len(snapshots), self.data.n_snapshots)
+        self.assertEqual(len(compact), self.data.n_snapshots)
+        for idx in (0, 5, self.data.n_snapshots - 1):
+            expected = self.data.get_snapshot(idx)
+            self.assertTrue(isinstance(snapshots[idx], Snapshot))
+            for snapshot in (snapshots[idx], compact[idx],
+                             self.data.get_snapshot(idx, compact=True)):
+                self.assertEqual(snapshot.time, expected.time)
+                for field in ('position', 'velocity', 'pressure', 'tracer'):
+                    self.assertTrue(numpy.allclose(getattr(snapshot, field),
+                                                   getattr(expected, field)))
+            self.assertTrue(isinstance(compact[idx], CompactSnapshot))
+
+        # Plain iteration gives independent snapshots we can modify
+        snapshots[0].position[0, 0] += 1
+        snapshots[0].foo = 'bar'
+        snapshots[0].properties['foo'] = 'bar'
+        self.assertFalse('foo' in snapshots[1].properties)
+        self.assertFalse(numpy.allclose(snapshots[0].position,
+                                        snapshots[1].position))
+
+        # Compact positions should be shared, and blocks should be views,
+        # but properties aren't shared
+        self.assertTrue(compact[0].position is compact[-1].position)
+        self.assertFalse(compact[0].position.flags.writeable)
+        self.assertFalse(compact[0].properties is compact[1].properties)
+        part = list(self.data.iter_snapshots(2, 7, block_size=2))
+        self.assertEqual([s.time for s in part],
+                         list(self.data.times[2:7]))
+        self.assertTrue(part[0].buffer.base is part[1].buffer.base)
+
+        # Regions should be respected
+        self.data.set_region(box=(0, 0.5, 0.5, 0))
+        for snapshot in (next(iter(self.data)),
+                         next(self.data.iter_snapshots())):
+            self.assertEqual(len(snapshot), len(self.data.region))
+            self.assertTrue(numpy.allclose(
+                snapshot.velocity, self.data.get_snapshot(0).velocity))
+
     def tearDown(self):
         # Close references to HDF5 file
         self.data.close()
 
         # Reload HDF5 file from git
         subprocess.call('git checkout -- {0}'.format(TEST_DATAFILE), shell=True)
+
+
+def random_snapshot(n_samples, seed=None):
+    """ Generate a snapshot with random data for testing
+    """
+    rng = numpy.random.RandomState(seed)
+    position = numpy.vstack([numpy.linspace(0, 1, n_samples),
+                             numpy.linspace(1, 2, n_samples)])
+    return Snapshot(position=position,
+                    velocity=rng.normal(size=(2, n_samples)),
+                    pressure=rng.normal(size=n_samples))
+
+
+class TestAppendObservations(unittest.TestCase):
+
+    """ Unit tests for resizable observations
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'append.hdf5')
+        self.n_samples = 13
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_append(self):
+        """ Appending snapshots should grow the observations
+        """
+        snapshots = [random_snapshot(self.n_samples, seed)
+                     for seed in range(20)]
+        with Observations(self.filename, n_samples=self.n_samples,
+                          scalar_datasets=('pressure',)) as data:
+            self.assertEqual(data.n_snapshots, 0)
+            for idx, snapshot in enumerate(snapshots):
+                self.assertEqual(data.append(snapshot), idx)
+                self.assertEqual(data.n_snapshots, idx + 1)
+                self.assertEqual(data['properties/n_snapshots'][()], idx + 1)
+                self.assertEqual(tuple(data['properties/shape']),
+                                 (self.n_samples, idx + 1))
+
+            # Capacity should grow geometrically
+            self.assertEqual(data.capacity, 32)
+            self.assertEqual(data.snapshots.shape, (2 * self.n_samples, 20))
+
+        # Spare capacity is trimmed on close, and we can keep appending
+        with Observations(self.filename) as data:
+            self.assertEqual(data.capacity, 20)
+            self.assertEqual(data['pressure'].shape, (self.n_samples, 20))
+            data.append(random_snapshot(self.n_samples, 20))
+            self.assertEqual(data.n_snapshots, 21)
+            for idx, expected in enumerate(snapshots):
+                self.assertTrue(numpy.allclose(
+                    data['pressure'][:, idx], expected.pressure))
+                self.assertTrue(numpy.allclose(
+                    data['velocity/y'][:, idx], expected.velocity[1]))
+
+    def test_close_errors(self):
+        """ Errors when trimming on close should be raised, not swallowed
+        """
+        data = Observations(self.filename, n_samples=self.n_samples)
+        data.append(random_snapshot(self.n_samples, 0))
+
+        def trim():
+            raise IOError('disk full')
+
+        data.trim = trim
+        self.assertRaises(IOError, data.close)
+
+        # ... but the file should still be closed, and closing it again
+        # is fine
+        self.assertFalse(data._store.is_open)
+        data.close()
+
+    def test_set_snapshots(self):
+        """ Writing a batch of snapshots should match writing them one by one
+        """
+        snapshots = [random_snapshot(self.n_samples, seed)
+                     for seed in range(5)]
+        times = [0.5 * idx for idx in range(5)]
+        with Observations(None, n_samples=self.n_samples, backend='memory',
+                          scalar_datasets=('pressure',)) as batched, \
+                Observations(None, n_samples=self.n_samples, backend='memory',
+                             scalar_datasets=('pressure',)) as single:
+            batched.set_snapshots(0, snapshots[:3], times=times[:3])
+            batched.set_snapshots(3, snapshots[3:], times=times[3:])
+            for idx, snapshot in enumerate(snapshots):
+                single.set_snapshot(idx, snapshot, time=times[idx])
+
+            self.assertEqual(batched.n_snapshots, 5)
+            self.assertTrue(numpy.allclose(batched.times, times))
+            self.assertTrue(numpy.allclose(batched.snapshots[:, :],
+                                           single.snapshots[:, :]))
+            for field in ('velocity/magnitude', 'pressure'):
+                self.assertTrue(numpy.allclose(
+                    batched.snapshot_statistics(field, 'max'),
+                    single.snapshot_statistics(field, 'max')))
+
+    def test_manifest(self):
+        """ Source files recorded in the manifest should be kept in the file
+        """
+        with Observations(self.filename, n_samples=self.n_samples) as data:
+            self.assertEqual(data.manifest, {})
+            data.append(random_snapshot(self.n_samples, 0))
+            data.record_sources({'a.gfs': {'index': 0, 'size': 10}})
+            data.record_sources({'b.gfs': {'index': 1, 'size': 20},
+                                 'a.gfs': {'index': 0, 'size': 11}})
+        with Observations(self.filename, mode='r') as data:
+            self.assertEqual(data.manifest,
+                             {'a.gfs': {'index': 0, 'size': 11},
+                              'b.gfs': {'index': 1, 'size': 20}})
+            self.assertRaises(IOError, data.record_sources, {'c.gfs': {}})
+
+    def test_fixed_size_not_resizable(self):
+        """ Appending to a fixed size file should fail
+        """
+        with Observations(TEST_DATAFILE) as data:
+            with self.assertRaises(ValueError):
+                data.resize(data.n_snapshots + 1)
+
+
+class TestObservationModes(unittest.TestCase):
+
+    """ Unit tests for read-only and SWMR access
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'swmr.hdf5')
+        self.n_samples = 7
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_read_only(self):
+        """ Read-only observations should be readable but not writable
+        """
+        with Observations(TEST_DATAFILE, mode='r') as data, \
+                Observations(TEST_DATAFILE, mode='r') as other:
+            self.assertFalse(data.writable)
+            self.assertEqual(data.snapshots.shape, other.snapshots.shape)
+            self.assertTrue(numpy.allclose(data.snapshots[:],
+                                           other['snapshots/velocity']))
+            with self.assertRaises(IOError):
+                data.set_snapshot(0, data[0])
+
+    def test_read_only_lazy(self):
+        """ Read-only snapshots should be read from the datasets, not copied
+        """
+        with Observations(TEST_DATAFILE, mode='r') as data:
+            expected = data['snapshots/velocity'][:]
+            snapshots = data.snapshots
+            self.assertIsInstance(snapshots.source, InterleavedMatrix)
+            self.assertTrue(numpy.allclose(snapshots[:, :], expected))
+            self.assertTrue(numpy.allclose(snapshots[3, 2:9:3],
+                                           expected[3, 2:9:3]))
+            self.assertTrue(numpy.allclose(snapshots[[1, 4, 5], 2],
+                                           expected[[1, 4, 5], 2]))
+
+            # Regions and windows just read the rows and columns we need
+            mask = numpy.zeros(data.n_samples, dtype=bool)
+            mask[[0, 2, 3, 10]] = True
+            data.set_region(mask=mask)
+            rows = (numpy.flatnonzero(mask)[:, None] * 2
+                    + numpy.arange(2)).ravel()
+            self.assertTrue(numpy.allclose(data.snapshots.select(1, 6)[:, :],
+                                           expected[rows, 1:6]))
+
+    def test_missing_file_read_only(self):
+        """ We can't create a new file in read-only mode
+        """
+        with self.assertRaises(IOError):
+            Observations(self.filename, n_samples=self.n_samples, mode='r')
+
+    def test_swmr(self):
+        """ SWMR readers should see snapshots appended by the writer
+        """
+        writer = Observations(self.filename, n_samples=self.n_samples,
+                              scalar_datasets=('pressure',), swmr=True)
+        try:
+            for seed in range(3):
+                writer.append(random_snapshot(self.n_samples, seed))
+            with Observations(self.filename, mode='r', swmr=True) as reader:
+                self.assertEqual(reader.n_snapshots, 3)
+                for seed in range(3, 12):
+                    writer.append(random_snapshot(self.n_samples, seed))
+                self.assertEqual(reader.refresh(), 9)
+                self.assertEqual(reader.n_snapshots, 12)
+                self.assertEqual(reader.snapshots.shape,
+                                 (2 * self.n_samples, 12))
+                expected = random_snapshot(self.n_samples, 11)
+                self.assertTrue(numpy.allclose(reader[11].pressure,
+                                               expected.pressure))
+                self.assertEqual(reader.refresh(), 0)
+        finally:
+            writer.close()
+
+
+class TestRegion(unittest.TestCase):
+
+    """ Unit tests for regions of interest
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'region.hdf5')
+        shutil.copy(TEST_DATAFILE, self.filename)
+        self.data = Observations(self.filename)
+        self.points = numpy.column_stack([self.data['position/x'][:],
+                                          self.data['position/y'][:]])
+        self.box = dict(left=-0.2, right=0.6, top=0.5, bottom=-0.3)
+
+    def tearDown(self):
+        self.data.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_box(self):
+        """ Setting a box region should restrict snapshots to that box
+        """
+        full_snapshot = self.data[3]
+        full_matrix = self.data.snapshots[:, :]
+        index = self.data.set_region(box=self.box)
+        expected = numpy.flatnonzero(
+            (self.points[:, 0] > -0.2) & (self.points[:, 0] < 0.6)
+            & (self.points[:, 1] > -0.3) & (self.points[:, 1] < 0.5))
+        self.assertTrue(len(expected) > 0)
+        self.assertTrue(numpy.all(index == expected))
+
+        # Snapshots and the snapshot matrix only include the region
+        snapshot = self.data[3]
+        self.assertEqual(len(snapshot), len(expected))
+        self.assertTrue(numpy.allclose(self.data.positions,
+                                       self.points[expected].T))
+        self.assertTrue(numpy.allclose(snapshot.position,
+                                       full_snapshot.position[:, expected]))
+        self.assertTrue(numpy.allclose(snapshot.tracer,
+                                       full_snapshot.tracer[expected]))
+        rows = (2 * expected[:, None] + numpy.arange(2)).ravel()
+        self.assertEqual(self.data.snapshots.shape,
+                         (len(rows), self.data.n_snapshots))
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, :],
+                                       full_matrix[rows]))
+
+        # Region persists on reload
+        self.data.close()
+        self.data = Observations(self.filename)
+        self.assertTrue(numpy.all(self.data.region == expected))
+        self.data.clear_region()
+        self.assertIsNone(self.data.region)
+        self.assertEqual(len(self.data[0]), self.data.n_samples)
+
+    def test_polygon_and_mask(self):
+        """ Polygons and masks should give the same regions as boxes
+        """
+        expected = self.data.set_region(box=self.box)
+        polygon = [(-0.2, -0.3), (0.6, -0.3), (0.6, 0.5), (-0.2, 0.5)]
+        self.assertTrue(numpy.all(
+            self.data.set_region(polygon=polygon) == expected))
+        mask = numpy.zeros(self.data.n_samples, dtype=bool)
+        mask[expected] = True
+        self.assertTrue(numpy.all(self.data.set_region(mask=mask) == expected))
+        with self.assertRaises(ValueError):
+            self.data.set_region(box=self.box, mask=mask)
+
+
+class TestPreprocessing(unittest.TestCase):
+
+    """ Unit tests for centering and normalizing snapshots
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'preprocessing.hdf5')
+        shutil.copy(TEST_DATAFILE, self.filename)
+        self.data = Observations(self.filename)
+
+    def tearDown(self):
+        self.data.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_center_and_normalize(self):
+        "Normalized snapshots should match doing it by hand"
+        raw = numpy.asarray(self.data.snapshots)
+        stats = self.data.set_preprocessing(block_size=3)
+        mean = raw.mean(axis=1)
+        self.assertTrue(numpy.allclose(stats['mean'], mean))
+        self.assertTrue(numpy.allclose(stats['variance'], raw.var(axis=1)))
+
+        # Velocity components share a scale
+        self.assertEqual(len(stats['scale']), 2)
+        self.assertAlmostEqual(stats['scale'][0], stats['scale'][1])
+        expected = (raw - mean[:, None]) / stats['scale'][0]
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, :], expected))
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, 2:5],
+                                       expected[:, 2:5]))
+
+        # The stored data isn't changed
+        key = 'snapshots/' + self.data.snapshot_dataset_key
+        self.assertTrue(numpy.allclose(self.data[key][:], raw))
+
+    def test_stored(self):
+        "Preprocessing statistics should persist in the file"
+        self.data.set_preprocessing(normalize=False)
+        expected = self.data.snapshots[:, :]
+        self.data.close()
+        self.data = Observations(self.filename)
+        self.assertIsNotNone(self.data.preprocessing)
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, :], expected))
+
+        self.data.clear_preprocessing()
+        self.assertIsNone(self.data.preprocessing)
+        self.assertFalse(numpy.allclose(self.data.snapshots[:, :], expected))
+
+    def test_read_only(self):
+        "Preprocessing should survive regenerating read-only snapshots"
+        self.data.close()
+        writer = Observations(os.path.join(self.tempdir, 'swmr.hdf5'),
+                              n_samples=7, swmr=True)
+        try:
+            for seed in range(5):
+                writer.append(random_snapshot(7, seed))
+            with Observations(writer.filename, mode='r', swmr=True) as reader:
+                stats = reader.set_preprocessing(normalize=False)
+                for seed in range(5, 8):
+                    writer.append(random_snapshot(7, seed))
+                self.assertEqual(reader.refresh(), 3)
+                self.assertIsNotNone(reader.preprocessing)
+                self.assertTrue(numpy.allclose(reader.preprocessing['mean'],
+                                               stats['mean']))
+                raw = numpy.asarray(reader.snapshots.source)
+                self.assertEqual(raw.shape, (14, 8))
+                self.assertTrue(numpy.allclose(
+                    reader.snapshots[:, :], raw - stats['mean'][:, None]))
+
+                reader.clear_preprocessing()
+                reader.refresh()
+                self.assertIsNone(reader.preprocessing)
+        finally:
+            writer.close()
+
+    def test_with_window(self):
+        "Preprocessing should work with windows and regions"
+        raw = numpy.asarray(self.data.snapshots)
+        stats = self.data.set_preprocessing(normalize=False)
+        self.data.set_snapshot_properties(window=(2, 6))
+        expected = raw[:, 2:6] - stats['mean'][:, None]
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, :], expected))
+
+
+class TestIndex(unittest.TestCase):
+
+    """ Unit tests for the summary statistics index
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'index.hdf5')
+        self.n_samples = 17
+        self.snapshots = [random_snapshot(self.n_samples, seed)
+                          for seed in range(11)]
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def check_index(self, data):
+        "Check the index against the snapshot data"
+        maxes = [s.velocity[1].max() for s in self.snapshots]
+        self.assertTrue(numpy.allclose(
+            data.snapshot_statistics('velocity/y', 'max'), maxes))
+        speeds = [numpy.sqrt((s.velocity ** 2).sum(axis=0))
+                  for s in self.snapshots]
+        self.assertTrue(numpy.allclose(
+            data.snapshot_statistics('velocity/magnitude', 'l2'),
+            [numpy.linalg.norm(s) for s in speeds]))
+        pressure = numpy.vstack([s.pressure for s in self.snapshots])
+        summary = data.summary('pressure')
+        self.assertAlmostEqual(summary['min'], pressure.min())
+        self.assertAlmostEqual(summary['max'], pressure.max())
+        self.assertAlmostEqual(summary['mean'], pressure.mean())
+        self.assertAlmostEqual(summary['l2'], numpy.linalg.norm(pressure))
+
+        # Query by value
+        threshold = numpy.median(maxes)
+        self.assertEqual(
+            data.find_snapshots('velocity/y', above=threshold).tolist(),
+            [i for i, m in enumerate(maxes) if m > threshold])
+
+    def test_index_on_write(self):
+        "The index should be updated as snapshots are written"
+        with Observations(self.filename, n_samples=self.n_samples,
+                          scalar_datasets=('pressure',)) as data:
+            for snapshot in self.snapshots:
+                data.append(snapshot)
+            self.check_index(data)
+        with Observations(self.filename, mode='r') as data:
+            self.assertEqual(data['index/pressure/max'].shape, (11,))
+            self.assertEqual(data.scalars, ['pressure'])
+            self.check_index(data)
+
+    def test_build_index(self):
+        "We should be able to build an index for older files"
+        with Observations(self.filename, n_samples=self.n_samples,
+                          scalar_datasets=('pressure',)) as data:
+            for snapshot in self.snapshots:
+                data.append(snapshot)
+            del data._store['index']
+        with Observations(self.filename, mode='r') as data:
+            self.assertFalse('index' in data._store)
+            self.check_index(data)
+        with Observations(self.filename) as data:
+            data.build_index(block_size=4)
+            self.check_index(data)
+
+    def test_unknown_field(self):
+        "Unknown fields should raise an error"
+        with Observations(self.filename, n_samples=self.n_samples) as data:
+            self.assertRaises(KeyError, data.snapshot_statistics, 'foo')
+            self.assertRaises(KeyError, data.snapshot_statistics,
+                              'velocity/x', 'median')
+
+
+class TestTime(unittest.TestCase):
+
+    """ Unit tests for the time coordinate
+    """
+
+    def setUp(self):
+        self.n_samples = 5
+        self.data = Observations(None, n_samples=self.n_samples,
+                                 scalar_datasets=('pressure',),
+                                 backend='memory')
+        self.expected = [0, 0.5, 1.0, 2.0, 2.5, 4.0, 7.0]
+        for idx, time in enumerate(self.expected):
+            snapshot = random_snapshot(self.n_samples, idx)
+            if idx % 2:
+                snapshot.time = time
+                self.data.append(snapshot)
+            else:
+                self.data.append(snapshot, time=time)
+
+    def tearDown(self):
+        self.data.close()
+
+    def test_times(self):
+        "Times should be stored with each snapshot"
+        self.assertTrue(numpy.allclose(self.data.times, self.expected))
+        self.assertEqual(self.data.get_snapshot(3).time, 2.0)
+        self.assertEqual(list(self.data.scalars), ['pressure'])
+
+    def test_select(self):
+        "Selecting by time should set the snapshot window"
+        selected = self.data.select(0.5, 2.5)
+        self.assertTrue(selected is self.data)
+        self.assertEqual(self.data.window, (1, 5))
+        self.assertEqual(self.data.snapshots.shape[1], 4)
+        self.assertTrue(numpy.allclose(self.data.times, [0.5, 1, 2, 2.5]))
+        self.assertTrue(numpy.allclose(self.data.snapshot_times,
+                                       self.expected))
+        self.data.select(stop_time=0.9)
+        self.assertTrue(numpy.allclose(self.data.times, [0, 0.5]))
+        self.data.select(3)
+        self.assertTrue(numpy.allclose(self.data.times, [4, 7]))
+
+        # Times must be sorted to search them
+        self.data['time'][2] = 10
+        self.assertRaises(ValueError, self.data.select, 1, 2)
+
+    def test_default_times(self):
+        "Files without times should use the snapshot interval"
+        with Observations(TEST_DATAFILE, mode='r') as data:
+            self.assertTrue(numpy.allclose(
+                data.times, numpy.arange(data.n_snapshots)
+                * data.snapshot_interval))
+
+
+class TestProbe(unittest.TestCase):
+
+    """ Unit tests for the spatial index and point probes
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'probe.hdf5')
+        shutil.copy(TEST_DATAFILE, self.filename)
+        self.data = Observations(self.filename)
+        self.positions = numpy.column_stack([self.data['position/x'][:],
+                                             self.data['position/y'][:]])
+
+    def tearDown(self):
+        self.data.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_nearest(self):
+        "Nearest samples should match a brute-force search"
+        points = numpy.random.RandomState(5).uniform(
+            self.positions.min(axis=0), self.positions.max(axis=0),
+            size=(10, 2))
+        _, samples = self.data.nearest(points)
+        distances = ((self.positions[None, :, :]
+                      - points[:, None, :]) ** 2).sum(axis=-1)
+        self.assertEqual(samples.tolist(),
+                         numpy.argmin(distances, axis=1).tolist())
+
+    def test_stored(self):
+        "The index should be stored as plain arrays and reused"
+        index = self.data.spatial_index
+        self.assertTrue(self.data.spatial_index is index)
+        grp = self.data['spatial_index']
+        for name in ('order', 'offsets'):
+            self.assertTrue(numpy.issubdtype(grp[name].dtype, numpy.integer))
+        checksum = grp.attrs['checksum']
+        self.data.close()
+
+        # Reloading should use the stored arrays
+        self.data = Observations(self.filename, mode='r')
+        order = self.data['spatial_index/order'][:]
+        loaded = self.data._load_spatial_index(self.positions.T, checksum)
+        self.assertIsNotNone(loaded)
+        self.assertTrue(numpy.all(loaded.order == order))
+        self.assertTrue(numpy.all(self.data.spatial_index.order == order))
+
+        # Changing the positions should make us rebuild the index
+        self.data.close()
+        self.data = Observations(self.filename)
+        self.data['position/x'][0] += 10
+        self.data._tree = None
+        self.assertTrue(numpy.allclose(self.data.spatial_index.data[0],
+                                       self.positions[0] + [10, 0]))
+        self.assertEqual(self.data.nearest([self.positions[0] + [10, 0]])[1],
+                         [0])
+
+    def test_corrupt(self):
+        "Stored arrays which don't fit the positions should be ignored"
+        self.assertFalse('spatial_index' in self.data._store)
+        self.assertIsNotNone(self.data.spatial_index)
+        del self.data._store['spatial_index/offsets']
+        self.data._store['spatial_index/offsets'] = numpy.arange(3)
+        self.data.close()
+        self.data = Observations(self.filename, mode='r')
+        points = self.positions[[4, 20]] + 1e-6
+        self.assertEqual(self.data.nearest(points)[1].tolist(), [4, 20])
+
+    def test_probe(self):
+        "Probing should return the time series at the nearest samples"
+        samples = [10, 3, 10, 57]
+        points = self.positions[samples] + 1e-6
+        result = self.data.probe(points)
+        self.assertEqual(result['sample'].tolist(), samples)
+        expected = self.data['velocity/x'][:][samples]
+        self.assertTrue(numpy.allclose(result['velocity/x'], expected))
+        self.assertEqual(result['pressure'].shape,
+                         (4, self.data.n_snapshots))
+
+        # Select some times
+        times = self.data.times
+        result = self.data.probe(points, times=[times[5], times[2] + 1e-3],
+                                 datasets=['velocity/y'])
+        self.assertTrue(numpy.allclose(result['time'], times[[5, 2]]))
+        expected = self.data['velocity/y'][:][samples][:, [5, 2]]
+        self.assertTrue(numpy.allclose(result['velocity/y'], expected))
+        self.assertFalse('pressure' in result)
+        self.assertRaises(KeyError, self.data.probe, points, datasets=['foo'])
+
+
+class TestCompression(unittest.TestCase):
+
+    """ Unit tests for POD-compressed observations
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tempdir, 'compressed.hdf5')
+        self.n_samples, self.n_snapshots = 30, 25
+
+        # Low rank velocity data with a bit of noise
+        rng = numpy.random.RandomState(7)
+        modes = rng.normal(size=(4, 2, self.n_samples))
+        weights = rng.normal(size=(self.n_snapshots, 4))
+        self.data = Observations(self.filename, n_samples=self.n_samples,
+                                 scalar_datasets=('pressure',))
+        for idx in range(self.n_snapshots):
+            snapshot = random_snapshot(self.n_samples, idx)
+            snapshot.velocity = numpy.tensordot(weights[idx], modes, 1) \
+                + 1e-4 * rng.normal(size=(2, self.n_samples))
+            self.data.append(snapshot)
+        self.expected = numpy.asarray(self.data.snapshots)
+        self.pressure = self.data['pressure'][:]
+
+    def tearDown(self):
+        self.data.close()
+        shutil.rmtree(self.tempdir)
+
+    def test_compress(self):
+        "Compressed snapshots should be within the tolerance"
+        error = self.data.compress(tolerance=1e-3, block_size=6)
+        self.assertTrue(error <= 1e-3)
+        self.assertEqual(self.data['pod/velocity/sigma'].shape, (4,))
+        self.assertFalse('velocity' in self.data._store)
+
+        # The snapshot matrix and snapshots come from the factors
+        snapshots = self.data.snapshots[:, :]
+        actual = (numpy.linalg.norm(snapshots - self.expected)
+                  / numpy.linalg.norm(self.expected))
+        self.assertAlmostEqual(actual, error)
+        snapshot = self.data.get_snapshot(3)
+        self.assertTrue(numpy.allclose(snapshot.velocity[1],
+                                       self.expected[1::2, 3], atol=1e-3))
+        self.assertTrue(numpy.allclose(snapshot.pressure, self.pressure[:, 3]))
+        self.assertRaises(IOError, self.data.append,
+                          random_snapshot(self.n_samples))
+
+        # ... even after reloading
+        self.data.close()
+        self.data = Observations(self.filename, mode='r')
+        self.assertTrue('velocity' in self.data.vectors)
+        self.assertTrue(numpy.allclose(self.data.snapshots[:, :], snapshots))
+        result = self.data.probe(self.data.get_snapshot(0).position[:, :2].T)
+        self.assertTrue(numpy.allclose(result['velocity/x'],
+                                       snapshots[[0, 2], :]))
+
+    def test_decomposition(self):
+        "DMD should reuse the stored factors"
+        dense = dynamic_decomposition(self.data)
+        self.data.compress(tolerance=0)
+        self.assertTrue(self.data.snapshots.factors() is not None)
+        factored = dynamic_decomposition(self.data)
+        self.assertTrue(numpy.allclose(sorted(abs(dense.eigenvalues)),
+                                       sorted(abs(factored.eigenvalues))))
+        self.assertTrue(numpy.allclose(dense.pod_modes[1],
+                                       factored.pod_modes[1]))
+
+    def test_keep_datasets(self):
+        "We should be able to keep the full datasets"
+        self.data.compress(tolerance=1e-2, keep_datasets=True)
+        self.assertTrue('velocity/x' in self.data._store)
+        self.assertTrue(numpy.allclose(
+            self.data.get_snapshot(1).velocity[0], self.expected[::2, 1]))
+        self.assertRaises(ValueError, self.data.compress)
+
+
+class TestQuantization(unittest.TestCase):
+
+    """ Unit tests for quantized observations
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.n_samples = 500
+        self.quantization = {'velocity': {'digits': 3},
+                             'pressure': 'float16',
+                             'tracer': {'bits': 8, 'range': (0, 1)}}
+        rng = numpy.random.RandomState(11)
+        self.snapshots = []
+        for idx in range(20):
+            snapshot = random_snapshot(self.n_samples, idx)
+            snapshot.tracer = rng.uniform(size=self.n_samples)
+            self.snapshots.append(snapshot)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def make_observations(self, name, quantization=None):
+        "Make some observations with the test snapshots"
+        filename = os.path.join(self.tempdir, name)
+        with Observations(filename, n_samples=self.n_samples,
+                          scalar_datasets=('pressure', 'tracer'),
+                          quantization=quantization) as data:
+            for snapshot in self.snapshots:
+                data.append(snapshot)
+        return filename
+
+    def test_round_trip(self):
+        "Quantized data should be dequantized on read"
+        filename = self.make_observations('quantized.hdf5',
+                                          self.quantization)
+        with Observations(filename, mode='r') as data:
+            self.assertEqual(data['tracer'].dtype, numpy.uint8)
+            snapshot = data.get_snapshot(4)
+            self.assertTrue(numpy.allclose(
+                snapshot.velocity, self.snapshots[4].velocity, atol=5e-4))
+            self.assertTrue(numpy.allclose(
+                snapshot.tracer, self.snapshots[4].tracer, atol=0.5 / 255))
+            self.assertTrue(numpy.allclose(
+                snapshot.pressure, self.snapshots[4].pressure, rtol=1e-3))
+            self.assertTrue(numpy.allclose(
+                data.snapshots[1::2, 7], self.snapshots[7].velocity[1],
+                atol=5e-4))
+
+            # Errors should be reported
+            report = data.quantization_report()
+            self.assertEqual(sorted(report.keys()),
+                             ['pressure', 'tracer', 'velocity/x',
+                              'velocity/y'])
+            self.assertEqual(report['tracer']['bytes_per_value'], 1)
+            self.assertTrue(0 < report['velocity/x']['max_error'] <= 5e-4)
+            self.assertTrue(report['tracer']['max_error'] <= 0.5 / 255)
+
+    def test_smaller(self):
+        "Quantized files should be smaller"
+        full = self.make_observations('full.hdf5')
+        quantized = self.make_observations('quantized.hdf5',
+                                           self.quantization)
+        self.assertTrue(os.path.getsize(quantized)
+                        < os.path.getsize(full) / 2)
+
+    def test_unknown_dataset(self):
+        "Quantizing an unknown dataset should raise an error"
+        self.assertRaises(ValueError, Observations, None, n_samples=10,
+                          backend='memory', quantization={'foo': 'float16'})
+
+
+class TestBulkIngest(unittest.TestCase):
+
+    """ Unit tests for creating observations from arrays and files
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        rng = numpy.random.RandomState(46)
+        self.position = rng.uniform(size=(2, 300))
+        self.velocity = rng.normal(size=(2, 300, 20))
+        self.pressure = rng.normal(size=(300, 20))
+        self.times = 0.25 * numpy.arange(20)
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def check(self, data):
+        "Check observations match the test arrays"
+        self.assertEqual(data.n_snapshots, 20)
+        self.assertTrue(numpy.allclose(data['position/x'], self.position[0]))
+        self.assertTrue(numpy.allclose(data['velocity/y'][:, :20],
+                                       self.velocity[1]))
+        self.assertTrue(numpy.allclose(data['pressure'][:, :20],
+                                       self.pressure))
+        self.assertTrue(numpy.allclose(data.times, self.times))
+        self.assertTrue(numpy.allclose(
+            data.snapshot_statistics('pressure', 'max'),
+            self.pressure.max(axis=0)))
+
+    def test_set_arrays(self):
+        "Blocks of arrays should be written in place"
+        data = Observations(None, n_samples=300, backend='memory',
+                            scalar_datasets=('pressure',))
+        self.assertRaises(ValueError, data.set_arrays, 0,
+                          {'pressure': self.pressure})
+        data.set_arrays(0, {'pressure': self.pressure,
+                            'velocity': self.velocity},
+                        times=self.times, position=self.position)
+        self.check(data)
+        self.assertRaises(ValueError, data.set_arrays, 20,
+                          {'pressure': self.pressure[:10]})
+        self.assertRaises(KeyError, data.set_arrays, 20,
+                          {'tracer': self.pressure})
+        self.assertRaises(ValueError, data.set_arrays, 20,
+                          {'pressure': self.pressure},
+                          position=self.position + 1)
+
+    def test_from_arrays(self):
+        "Observations should be created from (memory-mapped) arrays"
+        directory = os.path.join(self.tempdir, 'stacks')
+        os.mkdir(directory)
+        for name in ('position', 'velocity', 'pressure'):
+            numpy.save(os.path.join(directory, name + '.npy'),
+                       getattr(self, name))
+        numpy.save(os.path.join(directory, 'time.npy'), self.times)
+        filename = os.path.join(self.tempdir, 'arrays.hdf5')
+        with Observations.from_npy_directory(filename, directory,
+                                             block_size=10) as data:
+            self.check(data)
+            self.assertEqual(data.vectors, ['velocity'])
+        with Observations(filename, mode='r') as data:
+            self.check(data)
+
+        # Everything needs the same number of snapshots
+        self.assertRaises(ValueError, Observations.from_arrays, None,
+                          self.position, {'pressure': self.pressure,
+                                          'velocity': self.velocity[..., :4]},
+                          backend='memory')
+
+    def test_from_text_dumps(self):
+        "Observations should be created from text dumps"
+        files = []
+        for idx in range(20):
+            fname = os.path.join(self.tempdir, 'dump_{0}.dat'.format(idx))
+            table = numpy.column_stack([
+                numpy.repeat(self.times[idx], 300), self.position.T,
+                self.pressure[:, idx], self.velocity[..., idx].T])
+            numpy.savetxt(fname, table, fmt='%.17g',
+                          header='1:t 2:x 3:y 4:P 5:U 6:V')
+            files.append(fname)
+        for workers in (None, 2):
+            data = Observations.from_text_dumps(
+                None, files, scalars={'pressure': 'P'}, workers=workers,
+                block_size=6, backend='memory')
+            self.check(data)
+
+        # Missing columns should be caught
+        self.assertRaises(ValueError, Observations.from_text_dumps, None,
+                          files, backend='memory')
+
+
+class TestRegrid(unittest.TestCase):
+
+    """ Unit tests for regridding observations
+    """
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        rng = numpy.random.RandomState(48)
+        self.position = rng.uniform(size=(2, 400))
+        times = numpy.arange(10)
+        self.velocity = numpy.array([
+            self.position[0, :, None] + times,
+            self.position[1, :, None] - times])
+        self.pressure = 2 * self.position[0, :, None] * times
+        self.filename = os.path.join(self.tempdir, 'regrid.hdf5')
+        Observations.from_arrays(
+            self.filename, self.position,
+            {'velocity': self.velocity, 'pressure': self.pressure}).close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def test_regrid(self):
+        "Every snapshot should be interpolated onto the grid"
+        with Observations(self.filename, mode='r') as data:
+            self.assertIsNone(data.gridded)
+        for workers in (None, 2):
+            with Observations(self.filename) as data:
+                grp = data.regrid(shape=(12, 10), block_size=3,
+                                  workers=workers)
+                self.assertEqual(grp['pressure'].shape, (12, 10, 10))
+            with Observations(self.filename, mode='r') as data:
+                self.assertEqual(data.vectors, ['position', 'velocity'])
+                grp = data.gridded
+                xgrid, ygrid = numpy.meshgrid(grp['x'][:], grp['y'][:])
+                inside = ~numpy.asarray(grp['mask'][:])
+                self.assertTrue(inside.sum() > 60)
+                for time in (0, 4, 9):
+                    gridded = grp['velocity/y'][:, :, time]
+                    self.assertTrue(numpy.allclose(gridded[inside],
+                                                   ygrid[inside] - time))
+                    self.assertTrue(numpy.all(numpy.isnan(gridded[~inside])))
+                    self.assertTrue(numpy.allclose(
+                        grp['pressure'][:, :, time][inside],
+                        2 * xgrid[inside] * time))
+
+    def test_fields(self):
+        "Only the requested fields should be regridded"
+        data = Observations.from_arrays(None, self.position,
+                                        {'pressure': self.pressure},
+                                        backend='memory')
+        self.assertRaises(KeyError, data.regrid, fields=['tracer'])
+        grp = data.regrid(fields=['pressure'])
+        self.assertEqual(grp.attrs['fields'], 'pressure')
+        self.assertEqual(grp['pressure'].shape[2], 10)
+        with Observations(self.filename, mode='r') as data:
+            self.assertRaises(IOError, data.regrid)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+""" file:   test_pipeline.py (pydym tests)
+
+    description: Unit tests for streaming pipelines
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import os
+import time
+
+from pydym.io.pipeline import Pipeline
+
+
+def process_id(_, value):
+    """ Return the item along with the id of the process handling it
+    """
+    time.sleep(0.05)
+    return value, os.getpid()
+
+
+class TestPipeline(unittest.TestCase):
+
+    """ Unit tests for the threaded pipeline
+    """
+
+    def test_run(self):
+        """ Items should come out of the pipeline with their indices
+        """
+        pipeline = Pipeline(maxsize=2)
+        pipeline.add_stage('double', lambda _, x: 2 * x, workers=3)
+        pipeline.add_stage('offset', lambda idx, x: x + idx)
+        results = dict(pipeline.run(range(20), consumer='collect'))
+        self.assertEqual(results, dict((i, 3 * i) for i in range(20)))
+
+        report = pipeline.report()
+        self.assertEqual(list(report), ['double', 'offset', 'collect'])
+        for stats in report.values():
+            self.assertEqual(stats['items'], 20)
+        self.assertEqual(report['double']['workers'], 3)
+        self.assertTrue('bottleneck' in pipeline.format_report())
+
+    def test_no_stages(self):
+        """ A pipeline without stages should just pass the items through
+        """
+        self.assertEqual(list(Pipeline().run('abc')),
+                         [(0, 'a'), (1, 'b'), (2, 'c')])
+
+    def test_backpressure(self):
+        """ A slow stage should be the bottleneck, and block the stages
+            upstream of it
+        """
+        def slow(_, value):
+            time.sleep(0.02)
+            return value
+
+        pipeline = Pipeline(maxsize=1)
+        pipeline.add_stage('fast', lambda _, x: x)
+        pipeline.add_stage('slow', slow)
+        self.assertEqual(len(list(pipeline.run(range(10)))), 10)
+        self.assertEqual(pipeline.bottleneck, 'slow')
+        report = pipeline.report()
+        self.assertTrue(report['fast']['blocked'] > report['slow']['blocked'])
+        self.assertTrue(report['write']['starved'] > 0.5)
+
+    def test_processes(self):
+        """ Process stages should spread their items over worker processes
+        """
+        pipeline = Pipeline(maxsize=2)
+        pipeline.add_stage('work', process_id, workers=3, processes=True)
+        results = dict(pipeline.run(range(12)))
+        self.assertEqual(sorted(v for v, _ in results.values()),
+                         list(range(12)))
+        pids = set(pid for _, pid in results.values())
+        self.assertEqual(len(pids), 3)
+        self.assertFalse(os.getpid() in pids)
+
+        # A single worker just runs in a thread
+        pipeline = Pipeline()
+        pipeline.add_stage('work', process_id, processes=True)
+        pids = set(pid for _, (_, pid) in pipeline.run(range(3)))
+        self.assertEqual(pids, set([os.getpid()]))
+
+    def test_error(self):
+        """ Errors in a stage should stop the pipeline and be raised
+        """
+        def fail(idx, value):
+            if idx == 3:
+                raise RuntimeError('stage failed')
+            return value
+
+        pipeline = Pipeline()
+        pipeline.add_stage('fail', fail)
+        with self.assertRaises(RuntimeError):
+            list(pipeline.run(range(100)))
+        self.assertRaises(ValueError, pipeline.add_stage, 'fail', fail)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+""" file:   test_pod.py (pydym tests)
+
+    description: Unit tests for streaming POD
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym.pod import incremental_svd, shift_factors, FactoredMatrix
+
+
+def low_rank_matrix(n_rows, n_columns, rank, noise=0, seed=None):
+    """ Generate a random matrix with the given rank plus some noise
+    """
+    rng = numpy.random.RandomState(seed)
+    matrix = numpy.dot(rng.normal(size=(n_rows, rank)),
+                       rng.normal(size=(rank, n_columns)))
+    return matrix + noise * rng.normal(size=(n_rows, n_columns))
+
+
+def blocks(matrix, block_size):
+    "Split a matrix into blocks of columns"
+    return (matrix[:, i:i + block_size]
+            for i in range(0, matrix.shape[1], block_size))
+
+
+class TestPOD(unittest.TestCase):
+
+    def test_exact(self):
+        "Incremental SVD should match the full SVD"
+        matrix = low_rank_matrix(50, 30, 30, seed=1)
+        U, sigma, V, error = incremental_svd(blocks(matrix, 7),
+                                             tolerance=0)
+        expected = numpy.linalg.svd(matrix, compute_uv=False)
+        self.assertTrue(numpy.allclose(sigma, expected))
+        self.assertTrue(numpy.allclose(numpy.dot(U * sigma, V.T), matrix))
+        self.assertEqual(error, 0)
+
+    def test_tolerance(self):
+        "Truncation should keep the error within the tolerance"
+        matrix = low_rank_matrix(200, 60, 5, noise=1e-3, seed=2)
+        for tolerance in (1e-2, 1e-4):
+            U, sigma, V, error = incremental_svd(blocks(matrix, 8),
+                                                 tolerance=tolerance)
+            actual = (numpy.linalg.norm(matrix - numpy.dot(U * sigma, V.T))
+                      / numpy.linalg.norm(matrix))
+            self.assertTrue(actual <= tolerance)
+            self.assertAlmostEqual(actual, error)
+        self.assertEqual(len(incremental_svd(blocks(matrix, 8), 1e-2)[1]), 5)
+
+        # Limiting the rank
+        _, sigma, _, _ = incremental_svd(blocks(matrix, 8), 0, max_rank=3)
+        self.assertEqual(len(sigma), 3)
+
+    def test_shift_factors(self):
+        "Shifted factors should match decomposing the past snapshots"
+        matrix = low_rank_matrix(40, 12, 12, seed=3)
+        U, sigma, Vstar = numpy.linalg.svd(matrix, full_matrices=False)
+        U_past, sigma_past, V_past, projected = \
+            shift_factors(U, sigma, Vstar.T)
+        self.assertTrue(numpy.allclose(
+            numpy.dot(U_past * sigma_past, V_past.T), matrix[:, :-1]))
+        self.assertTrue(numpy.allclose(
+            sigma_past, numpy.linalg.svd(matrix[:, :-1], compute_uv=False)))
+        self.assertTrue(numpy.allclose(
+            projected, numpy.dot(U_past.T, matrix[:, 1:])))
+
+    def test_factored_matrix(self):
+        "Factored matrices should reconstruct blocks as they're read"
+        matrix = low_rank_matrix(20, 10, 10, seed=4)
+        U, sigma, Vstar = numpy.linalg.svd(matrix, full_matrices=False)
+        factored = FactoredMatrix(U, sigma, Vstar.T)
+        self.assertEqual(factored.shape, (20, 10))
+        self.assertTrue(numpy.allclose(factored[3:7, [1, 4]],
+                                       matrix[3:7, [1, 4]]))
+        self.assertTrue(numpy.allclose(factored[5, 2], matrix[5, 2]))
+        self.assertTrue(numpy.allclose(numpy.asarray(factored), matrix))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+""" file:   test_preprocessing.py (pydym tests)
+
+    description: Unit tests for streaming statistics
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym.preprocessing import running_moments, component_scales
+
+
+class TestPreprocessing(unittest.TestCase):
+
+    def test_running_moments(self):
+        "Blocked moments should match numpy"
+        values = numpy.random.RandomState(42).normal(5, 3, size=(20, 103))
+        blocks = (values[:, i:i + 10] for i in range(0, 103, 10))
+        count, mean, variance = running_moments(blocks)
+        self.assertEqual(count, 103)
+        self.assertTrue(numpy.allclose(mean, values.mean(axis=1)))
+        self.assertTrue(numpy.allclose(variance, values.var(axis=1)))
+
+    def test_no_blocks(self):
+        "Empty input should raise an error"
+        self.assertRaises(ValueError, running_moments, iter([]))
+
+    def test_component_scales(self):
+        "Vector components should share a scale"
+        keys = ('velocity/x', 'velocity/y', 'pressure')
+        mean = numpy.zeros(6)
+        variance = numpy.array([1, 9, 4, 1, 9, 4])
+        scales = component_scales(mean, variance, keys)
+        self.assertTrue(numpy.allclose(scales, [numpy.sqrt(5)] * 2 + [2]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+""" file:   test_quantization.py (pydym tests)
+
+    description: Unit tests for quantized storage
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym.quantization import Quantizer
+
+
+class TestQuantizer(unittest.TestCase):
+
+    def setUp(self):
+        self.values = numpy.random.RandomState(0).uniform(-2, 2, size=100)
+
+    def test_digits(self):
+        "Fixed-point values should be within half a step"
+        quantizer = Quantizer.from_spec({'digits': 3})
+        encoded = quantizer.encode(self.values)
+        self.assertEqual(encoded.dtype, numpy.int32)
+        max_error, relative_error = \
+            quantizer.round_trip_error(self.values, encoded)
+        self.assertTrue(0 < max_error <= 5e-4)
+        self.assertTrue(relative_error < 1e-3)
+
+    def test_column_errors(self):
+        "Relative errors by column should pick out the worst column"
+        quantizer = Quantizer.from_spec({'digits': 1})
+        values = numpy.column_stack([100 + self.values,
+                                     0.01 * self.values])
+        _, overall = quantizer.round_trip_error(values)
+        _, worst = quantizer.round_trip_error(values, axis=0)
+        self.assertTrue(overall < 1e-2)
+        self.assertTrue(worst > 0.5)
+        _, single = quantizer.round_trip_error(values[:, 1])
+        self.assertAlmostEqual(worst, single)
+
+    def test_bits(self):
+        "Values outside the range should be clipped"
+        quantizer = Quantizer.from_spec({'bits': 8, 'range': (0, 1)})
+        self.assertEqual(quantizer.dtype, numpy.uint8)
+        decoded = quantizer.decode(quantizer.encode(self.values))
+        self.assertTrue(numpy.allclose(
+            decoded, numpy.clip(self.values, 0, 1), atol=0.5 / 255))
+        self.assertEqual(
+            Quantizer.from_spec({'bits': 12, 'range': (0, 1)}).dtype,
+            numpy.uint16)
+
+    def test_float(self):
+        "Small floats should keep about three significant figures"
+        quantizer = Quantizer.from_spec('float16')
+        decoded = quantizer.decode(quantizer.encode(self.values))
+        self.assertEqual(decoded.dtype, numpy.float64)
+        self.assertTrue(numpy.allclose(decoded, self.values, rtol=1e-3))
+
+    def test_bad_spec(self):
+        "Unknown specifications should raise an error"
+        for spec in ('int8', {'bits': 8, 'range': (1, 0)}, {'foo': 1}):
+            self.assertRaises(ValueError, Quantizer.from_spec, spec)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+""" file:   test_snapshot.py (pydym tests)
+
+    description: Unit tests for snapshots
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import pickle
+import numpy
+
+from pydym import Observations, Snapshot, CompactSnapshot
+
+
+class TestCompactSnapshot(unittest.TestCase):
+
+    """ Unit tests for compact snapshots
+    """
+
+    def setUp(self):
+        rng = numpy.random.RandomState(49)
+        self.position = rng.uniform(size=(2, 50))
+        self.layout, n_components = CompactSnapshot.layout_for(
+            ['velocity'], ['pressure', 'tracer'], 2)
+        self.block = rng.normal(size=(3, n_components, 50))
+        self.snapshot = CompactSnapshot(self.position, self.block[1],
+                                        self.layout, time=1.5)
+
+    def test_fields(self):
+        """ Fields should be views into the buffer
+        """
+        self.assertEqual(self.snapshot.fields,
+                         ('velocity', 'pressure', 'tracer'))
+        self.assertEqual(len(self.snapshot), 50)
+        self.assertEqual(self.snapshot.n_dimensions, 2)
+        self.assertTrue(numpy.all(self.snapshot.velocity == self.block[1, :2]))
+        self.assertTrue(numpy.all(self.snapshot['tracer'] == self.block[1, 3]))
+        self.assertTrue(numpy.shares_memory(self.snapshot.pressure,
+                                            self.block))
+        self.assertRaises(AttributeError, getattr, self.snapshot, 'density')
+
+        # Writes go through to the buffer, but new fields can't be added
+        self.snapshot.pressure = 0
+        self.assertTrue(numpy.all(self.block[1, 2] == 0))
+        self.assertRaises(AttributeError, setattr, self.snapshot, 'density',
+                          self.position[0])
+        self.assertFalse(hasattr(self.snapshot, '__dict__'))
+
+    def test_copy(self):
+        """ Copies and pickles shouldn't share the buffer
+        """
+        for other in (self.snapshot.copy(),
+                      pickle.loads(pickle.dumps(self.snapshot))):
+            self.assertEqual(other.time, 1.5)
+            self.assertTrue(numpy.all(other.velocity == self.snapshot.velocity))
+            other.tracer = 1
+            self.assertFalse(numpy.any(self.block[1, 3] == 1))
+
+    def test_to_snapshot(self):
+        """ Converting to a Snapshot should copy everything
+        """
+        self.snapshot.properties = {'n_snapshots': 3}
+        snapshot = self.snapshot.to_snapshot()
+        self.assertTrue(isinstance(snapshot, Snapshot))
+        self.assertEqual(snapshot.time, 1.5)
+        self.assertTrue(numpy.all(snapshot.velocity == self.snapshot.velocity))
+        self.assertTrue(numpy.all(snapshot.pressure == self.snapshot.pressure))
+        snapshot.position[0] = -1
+        snapshot.tracer[:] = 1
+        snapshot.properties['n_snapshots'] = 4
+        self.assertFalse(numpy.any(self.position[0] == -1))
+        self.assertFalse(numpy.any(self.block[1, 3] == 1))
+        self.assertEqual(self.snapshot.properties['n_snapshots'], 3)
+
+    def test_observations(self):
+        """ Compact snapshots should be accepted by Observations
+        """
+        data = Observations(None, n_samples=50, backend='memory',
+                            scalar_datasets=('pressure', 'tracer'))
+        data.append(self.snapshot)
+        data.append(Snapshot(self.position, velocity=self.block[0, :2],
+                             pressure=self.block[0, 2],
+                             tracer=self.block[0, 3]))
+        self.assertEqual(list(data.times), [1.5, 1])
+        for snapshot, expected in zip(data.iter_snapshots(),
+                                      self.block[[1, 0]]):
+            self.assertTrue(numpy.allclose(snapshot.buffer, expected))
+
+    def test_interpolate(self):
+        """ Compact snapshots should interpolate like snapshots
+        """
+        xgrid, ygrid, values = self.snapshot.interpolate('velocity', 'y',
+                                                         shape=(5, 6))
+        self.assertEqual(values.shape, (5, 6))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+""" file:   test_summary.py (pydym tests)
+
+    description: Unit tests for summary statistics
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym.summary import summarise, combine
+
+
+class TestSummary(unittest.TestCase):
+
+    def test_combine(self):
+        "Combined per-column statistics should match the whole array"
+        values = numpy.random.RandomState(1).normal(size=(10, 7))
+        stats = summarise(values, axis=0)
+        self.assertEqual(stats['max'].shape, (7,))
+        combined, expected = combine(stats), summarise(values)
+        for key in expected:
+            self.assertAlmostEqual(combined[key], expected[key])
+
+    def test_unset_snapshots(self):
+        "NaNs mark unset snapshots and should be ignored"
+        stats = summarise(numpy.arange(6.).reshape(2, 3), axis=0)
+        for key in stats:
+            stats[key] = numpy.r_[stats[key], numpy.nan]
+        self.assertEqual(combine(stats)['max'], 5)
+        empty = dict((k, [numpy.nan]) for k in stats)
+        self.assertTrue(numpy.isnan(combine(empty)['min']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+""" file:   test_utilities.py (pydym tests)
+
+    description: Unit tests for utility functions
+"""
+
+from __future__ import division, print_function
+
+import unittest
+import numpy
+
+from pydym.utilities import in_box, in_polygon, bounded_map
+from pydym.snapshot_matrix import index_runs, read_rows
+from pydym.spatial_index import GridIndex
+
+# Set in each worker process by set_base
+BASE = None
+
+
+def set_base(base):
+    "Initialize a worker process for the bounded_map tests"
+    global BASE  # pylint: disable=W0603
+    BASE = base
+
+
+def power_of_base(exponent):
+    "Raise the worker's base to a power"
+    return BASE ** exponent
+
+
+class TestUtilities(unittest.TestCase):
+
+    """ Unit tests for utility functions
+    """
+
+    def test_in_polygon(self):
+        """ Points in a polygon should be found
+        """
+        points = numpy.random.RandomState(1).uniform(-1, 2, size=(200, 2))
+        square = [(0, 0), (1, 0), (1, 1), (0, 1)]
+        self.assertTrue(numpy.all(in_polygon(points, square)
+                                  == in_box(points)))
+        triangle = [(0, 0), (1, 0), (0, 1)]
+        expected = ((points[:, 0] > 0) & (points[:, 1] > 0)
+                    & (points[:, 0] + points[:, 1] < 1))
+        self.assertTrue(numpy.all(in_polygon(points, triangle) == expected))
+
+    def test_index_runs(self):
+        """ Sorted indices should be split into contiguous runs
+        """
+        index = [0, 1, 2, 5, 7, 8]
+        self.assertEqual(index_runs(index), [(0, 3), (5, 6), (7, 9)])
+        self.assertEqual(index_runs([]), [])
+        values = numpy.arange(40).reshape(10, 4)
+        self.assertTrue(numpy.all(read_rows(values, index, slice(1, 3))
+                                  == values[index, 1:3]))
+
+    def test_grid_index(self):
+        """ Nearest samples from the grid index should match a brute-force
+            search, including points outside the samples
+        """
+        rng = numpy.random.RandomState(34)
+        clustered = numpy.vstack([rng.normal(size=(2, 300)) ** 3,
+                                  rng.uniform(size=(1, 300))])
+        flat = numpy.vstack([rng.uniform(size=300), numpy.zeros(300)])
+        for positions in (clustered, flat, clustered[:, :1]):
+            index = GridIndex.build(positions)
+            lower, upper = positions.min(axis=1), positions.max(axis=1)
+            points = rng.uniform(lower - 1, upper + 1,
+                                 size=(50, len(positions)))
+            distances, samples = index.query(points)
+            brute = numpy.sqrt(((positions.T[None, :, :]
+                                 - points[:, None, :]) ** 2).sum(axis=-1))
+            self.assertTrue(numpy.allclose(distances, brute.min(axis=1)))
+            self.assertTrue(numpy.allclose(
+                brute[numpy.arange(len(points)), samples],
+                brute.min(axis=1)))
+
+        # Arrays which don't match the positions should be rejected
+        arrays = [getattr(index, name) for name in GridIndex.ARRAYS]
+        self.assertRaises(ValueError, GridIndex, clustered, *arrays)
+
+    def test_bounded_map(self):
+        """ Mapping over a process pool should give the same results as
+            running serially
+        """
+        arguments = [(2, i) for i in range(20)]
+        expected = list(bounded_map(pow, arguments))
+        self.assertEqual(expected, [(i, 2 ** i) for i in range(20)])
+        for workers, max_pending in ((2, None), (3, 1)):
+            results = bounded_map(pow, arguments, workers=workers,
+                                  max_pending=max_pending)
+            self.assertEqual(sorted(results), expected)
+
+        # Shared arguments can be handed to each worker once
+        results = bounded_map(power_of_base, [(i,) for i in range(20)],
+                              workers=2, initializer=set_base, initargs=(2,))
+        self.assertEqual(sorted(results), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()